@@ -0,0 +1,173 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+BUCKET_HOURS = {"hour": 1, "day": 24}
+PERCENTILES = (50, 95)
+NO_STOP = -1
+NO_DELAY = -1
+
+
+def to_hour(value: datetime) -> int:
+    # Naive UTC datetime -> whole hours since the epoch
+    return int((value - EPOCH).total_seconds() // 3600)
+
+
+def from_hour(hour: int) -> datetime:
+    return EPOCH + timedelta(hours=int(hour))
+
+
+def weighted_percentiles(values: np.ndarray, counts: np.ndarray, percentiles) -> np.ndarray:
+    """Percentiles of ``values`` repeated ``counts`` times, without materializing the repeats.
+
+    Matches ``np.percentile``'s default linear interpolation.
+    """
+    order = np.argsort(values, kind="stable")
+    values = values[order]
+    cumulative = np.cumsum(counts[order])
+    ranks = np.asarray(percentiles, dtype=float) / 100 * (cumulative[-1] - 1)
+    lower = np.floor(ranks)
+    upper = np.ceil(ranks)
+    lower_values = values[np.searchsorted(cumulative, lower, side="right")]
+    upper_values = values[np.searchsorted(cumulative, upper, side="right")]
+    return lower_values + (upper_values - lower_values) * (ranks - lower)
+
+
+class DelayRollups:
+    """Hourly incident rollups held as columnar NumPy arrays.
+
+    Each row is one (hour, route, stop, type, severity, delay_minutes) group with its
+    incident count. New incidents are appended to a small pending list and folded into
+    the arrays on the next query, so the write path stays O(1).
+    """
+
+    COLUMNS = ("hour", "route_id", "stop_id", "type_code", "severity_code", "delay", "count")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._arrays = self._empty()
+        self._pending: List[Tuple[int, ...]] = []
+        self._types: Dict[str, int] = {}
+        self._severities: Dict[str, int] = {}
+        self.loaded_at: Optional[float] = None
+
+    def _empty(self):
+        return {column: np.empty(0, dtype=np.int64) for column in self.COLUMNS}
+
+    @staticmethod
+    def _code(codes: Dict[str, int], name: str) -> int:
+        if name not in codes:
+            codes[name] = len(codes)
+        return codes[name]
+
+    def _row(self, reported_hour: int, route_id: int, stop_id: Optional[int], incident_type: str,
+             severity: str, delay_minutes: Optional[int], count: int):
+        return (
+            reported_hour,
+            route_id,
+            NO_STOP if stop_id is None else stop_id,
+            self._code(self._types, incident_type),
+            self._code(self._severities, severity),
+            NO_DELAY if delay_minutes is None else delay_minutes,
+            count,
+        )
+
+    def load(self, groups: Iterable[Tuple[datetime, int, Optional[int], str, str, Optional[int], int]]):
+        with self._lock:
+            self._types, self._severities = {}, {}
+            rows = [self._row(to_hour(hour), *rest) for hour, *rest in groups]
+            self._arrays = self._to_arrays(rows) if rows else self._empty()
+            self._pending = []
+            self.loaded_at = time.monotonic()
+
+    def is_stale(self, max_age_seconds: float) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > max_age_seconds
+
+    def record(self, reported_at: datetime, route_id: int, stop_id: Optional[int], incident_type: str,
+               severity: str, delay_minutes: Optional[int]):
+        if self.loaded_at is None:
+            return
+        with self._lock:
+            self._pending.append(self._row(to_hour(reported_at), route_id, stop_id, incident_type, severity, delay_minutes, 1))
+
+    def _to_arrays(self, rows):
+        columns = np.array(rows, dtype=np.int64).T
+        return dict(zip(self.COLUMNS, columns))
+
+    def _snapshot(self):
+        with self._lock:
+            if self._pending:
+                pending = self._to_arrays(self._pending)
+                self._arrays = {column: np.concatenate((self._arrays[column], pending[column])) for column in self.COLUMNS}
+                self._pending = []
+            types = {code: name for name, code in self._types.items()}
+            severities = {code: name for name, code in self._severities.items()}
+            return self._arrays, types, severities
+
+    def __len__(self):
+        return len(self._arrays["hour"]) + len(self._pending)
+
+    def query(self, start: datetime, end: datetime, bucket: str = "hour",
+              route_id: Optional[int] = None, stop_id: Optional[int] = None):
+        arrays, types, severities = self._snapshot()
+        bucket_hours = BUCKET_HOURS[bucket]
+        # Rollups are hourly, so the range widens to whole hours: the hours containing start and end are included
+        start_hour = to_hour(start)
+        end_hour = to_hour(end) + 1
+
+        mask = (arrays["hour"] >= start_hour) & (arrays["hour"] < end_hour)
+        if route_id is not None:
+            mask &= arrays["route_id"] == route_id
+        if stop_id is not None:
+            mask &= arrays["stop_id"] == stop_id
+        # Sort the matching rows by bucket once, then summarize each contiguous slice
+        buckets = arrays["hour"][mask] // bucket_hours * bucket_hours
+        order = np.argsort(buckets, kind="stable")
+        buckets = buckets[order]
+        selected = {column: values[mask][order] for column, values in arrays.items()}
+
+        starts, offsets = np.unique(buckets, return_index=True)
+        ends = np.append(offsets[1:], len(buckets))
+        results = []
+        for bucket_start, offset, end in zip(starts, offsets, ends):
+            results.append({
+                "bucket_start": from_hour(bucket_start),
+                **self._summarize({column: values[offset:end] for column, values in selected.items()}, types, severities),
+            })
+        return {"buckets": results, "total": self._summarize(selected, types, severities)}
+
+    @staticmethod
+    def _summarize(rows, types, severities):
+        counts = rows["count"]
+        delayed = rows["delay"] != NO_DELAY
+        delays = rows["delay"][delayed]
+        delay_counts = counts[delayed]
+        delayed_incidents = int(delay_counts.sum())
+
+        summary = {
+            "incidents": int(counts.sum()),
+            "delayed_incidents": delayed_incidents,
+            "mean_delay_minutes": None,
+            "p50_delay_minutes": None,
+            "p95_delay_minutes": None,
+        }
+        if delayed_incidents:
+            p50, p95 = weighted_percentiles(delays, delay_counts, PERCENTILES)
+            summary.update(
+                mean_delay_minutes=round(float((delays * delay_counts).sum() / delayed_incidents), 2),
+                p50_delay_minutes=round(float(p50), 2),
+                p95_delay_minutes=round(float(p95), 2),
+            )
+
+        by_type = np.bincount(rows["type_code"], weights=counts, minlength=len(types))
+        by_severity = np.bincount(rows["severity_code"], weights=counts, minlength=len(severities))
+        summary["by_type"] = dict(sorted((types[code], int(n)) for code, n in enumerate(by_type) if n))
+        summary["by_severity"] = dict(sorted((severities[code], int(n)) for code, n in enumerate(by_severity) if n))
+        return summary
+
+
+delay_rollups = DelayRollups()
@@ -0,0 +1,26 @@
+import argparse
+import sys
+
+import config
+from database import SessionLocal, init_db
+from crud import archive_resolved_incidents
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old resolved incidents and their verifications to the archive tables")
+    parser.add_argument("--days", type=float, default=config.ARCHIVE_AFTER_DAYS, help="archive incidents resolved more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=config.ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        result = archive_resolved_incidents(db, args.days, batch_size=args.batch_size, max_batches=sys.maxsize)
+        print(f"Archived {result['archived']} incident(s) in {result['batches']} batch(es)")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""Generate a synthetic production-scale database for benchmarks and load tests.
+
+Usage: python -m benchmarks.generator --db bench.db [--incidents 1000000] [--users 100000] [--seed 42]
+
+Columns are drawn as NumPy arrays and bulk-inserted in chunks. Route and reporter popularity
+follow a Zipf-like power law and reported_at follows a weekday rush-hour profile, so hot routes,
+power users and peak-hour bursts look like real traffic rather than uniform noise.
+
+The app modules are imported inside generate() and create_database() only: config binds
+DATABASE_URL when it is first imported, and callers set it to the benchmark database first.
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import create_engine, insert, text
+
+from benchmarks.workload import add_size_arguments, sizes
+
+CHUNK_SIZE = 20000
+
+TRANSPORT_TYPES = (("bus", 0.7), ("tram", 0.25), ("train", 0.05))
+INCIDENT_TYPES = (("delay", 0.55), ("cancellation", 0.1), ("breakdown", 0.12), ("crowding", 0.15), ("other", 0.08))
+SEVERITIES = (("low", 0.3), ("medium", 0.4), ("high", 0.2), ("critical", 0.1))
+
+# Share of reports per hour of a weekday: morning and afternoon rush hours dominate
+WEEKDAY_HOURS = np.array([
+    1, 0.5, 0.3, 0.3, 0.6, 2, 5, 9, 10, 6, 4, 4,
+    4.5, 4.5, 5, 6.5, 9, 10, 8, 5, 3.5, 2.5, 2, 1.5,
+])
+WEEKEND_HOURS = np.array([
+    1.5, 1, 0.6, 0.4, 0.4, 0.6, 1, 1.5, 2.5, 3.5, 4, 4.5,
+    4.5, 4.5, 4.5, 4.5, 4.5, 4.5, 4, 3.5, 3, 2.5, 2, 1.8,
+])
+WEEKEND_SHARE = 0.15
+
+# Open incidents are the recent ones; everything older than this has been resolved
+OPEN_HOURS = 6
+
+TITLES = {
+    "delay": ("Delay on {route}", "{route} running late", "Traffic jam slows down {route}", "Signal failure delays {route}"),
+    "cancellation": ("{route} cancelled", "Course of {route} did not run", "Missing driver, {route} cancelled"),
+    "breakdown": ("Vehicle breakdown on {route}", "{route} broke down", "Door failure on {route}"),
+    "crowding": ("{route} overcrowded", "No room to board {route}", "Crowded platform for {route}"),
+    "other": ("Heating not working on {route}", "Ticket machine broken on {route}", "Detour on {route}"),
+}
+DESCRIPTIONS = (
+    "Reported by passengers waiting at the stop.",
+    "Vehicle stuck in traffic near the city centre after an accident.",
+    "Roadworks on the main street, expect further delays during rush hour.",
+    "Driver announced a technical problem and asked everyone to leave.",
+    "Tram line blocked by a parked car, trams queueing behind it.",
+    "Snow and ice on the tracks, vehicles running at reduced speed.",
+)
+
+
+def _choice(rng, options, size):
+    values, weights = zip(*options)
+    return np.array(values, dtype=object)[rng.choice(len(values), size=size, p=np.array(weights) / sum(weights))]
+
+
+def _zipf_weights(rng, size: int, exponent: float):
+    # Power-law popularity over shuffled ids, so the hot ids are not simply the lowest ones
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def _report_times(rng, size: int, days: int, now: datetime):
+    day = rng.integers(0, days, size)
+    weekend = rng.random(size) < WEEKEND_SHARE
+    hour = np.where(
+        weekend,
+        rng.choice(24, size=size, p=WEEKEND_HOURS / WEEKEND_HOURS.sum()),
+        rng.choice(24, size=size, p=WEEKDAY_HOURS / WEEKDAY_HOURS.sum()),
+    )
+    seconds = rng.integers(0, 3600, size)
+    midnight = np.datetime64(now.replace(hour=0, minute=0, second=0, microsecond=0), "s")
+    reported = midnight - day.astype("timedelta64[D]") + (hour * 3600 + seconds).astype("timedelta64[s]")
+    # Today's rush hour may still be ahead; fold those reports into the past
+    future = reported > np.datetime64(now, "s")
+    reported[future] -= np.timedelta64(1, "D")
+    return np.sort(reported)
+
+
+def _route_stops(rng, routes: int, stops: int):
+    # Each route serves 10-40 distinct stops; returned as CSR offsets into one flat array
+    counts = rng.integers(10, 41, routes).clip(max=stops)
+    flat = np.concatenate([rng.choice(stops, size=count, replace=False) + 1 for count in counts])
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    return flat, offsets
+
+
+def _sqlite_values(values):
+    # Pre-formatted the way SQLAlchemy stores DateTime in SQLite, so rows can skip type processing
+    if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+        formatted = np.char.replace(np.datetime_as_string(values, unit="us"), "T", " ").astype(object)
+        formatted[np.isnat(values)] = None
+        return formatted
+    return values
+
+
+def _insert(conn, table, columns: dict, size: int, label: str):
+    # Arrays become Python values one chunk at a time, so memory stays bounded by CHUNK_SIZE rows.
+    # SQLite gets plain DBAPI executemany; other databases go through Core inserts.
+    names = list(columns)
+    sqlite = conn.dialect.name == "sqlite"
+    if sqlite:
+        columns = {name: _sqlite_values(values) for name, values in columns.items()}
+        statement = f"INSERT INTO {table.name} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+    for start in range(0, size, CHUNK_SIZE):
+        chunk = [
+            values[start:start + CHUNK_SIZE].tolist() if isinstance(values, np.ndarray) else values[start:start + CHUNK_SIZE]
+            for values in columns.values()
+        ]
+        if sqlite:
+            conn.exec_driver_sql(statement, list(zip(*chunk)))
+        else:
+            conn.execute(insert(table), [dict(zip(names, row)) for row in zip(*chunk)])
+    print(f"  {label}: {size}")
+
+
+def _datetimes(values):
+    return values.astype("datetime64[us]")
+
+
+def generate(bind, users: int = 100000, routes: int = 500, stops: int = 8000, incidents: int = 1000000,
+             verifications_per_incident: float = 1.5, days: int = 365, seed: int = 42):
+    """Fill an empty schema on ``bind`` with synthetic data; returns the row counts."""
+    from crud import REPORT_POINTS, VERIFICATION_POINTS
+    from database import (
+        Incident, Route, RouteIncidentCounter, RouteStop, Stop, StopIncidentCounter, User, Verification
+    )
+
+    rng = np.random.default_rng(seed)
+    now = datetime.utcnow()
+
+    # Routes and stops
+    route_numbers = np.array([f"{i + 1}" for i in range(routes)], dtype=object)
+    stop_flat, stop_offsets = _route_stops(rng, routes, stops)
+    route_weights = _zipf_weights(rng, routes, 1.1)
+
+    # Incidents, in reported_at order so ids grow with time as they do in production
+    reported_at = _report_times(rng, incidents, days, now)
+    route_index = rng.choice(routes, size=incidents, p=route_weights)
+    served = stop_offsets[route_index + 1] - stop_offsets[route_index]
+    stop_id = stop_flat[stop_offsets[route_index] + (rng.random(incidents) * served).astype(np.int64)]
+    has_stop = rng.random(incidents) < 0.75
+    reporter_id = rng.choice(users, size=incidents, p=_zipf_weights(rng, users, 0.8)) + 1
+    incident_type = _choice(rng, INCIDENT_TYPES, incidents)
+    severity = _choice(rng, SEVERITIES, incidents)
+    delay_minutes = np.clip(rng.lognormal(2.3, 0.7, incidents), 1, 999).astype(np.int64)
+    has_delay = (incident_type == "delay") | (rng.random(incidents) < 0.1)
+
+    age_hours = (np.datetime64(now, "s") - reported_at) / np.timedelta64(1, "h")
+    open_ = age_hours < OPEN_HOURS
+    status = np.where(open_, _choice(rng, (("active", 0.7), ("verified", 0.25), ("disputed", 0.05)), incidents),
+                      _choice(rng, (("resolved", 0.97), ("disputed", 0.03)), incidents))
+    resolved = status == "resolved"
+    resolved_at = reported_at + (rng.lognormal(3.5, 0.8, incidents) * 60).astype("timedelta64[s]")
+
+    # Verifications: busier incidents draw more of them; (incident, user) pairs are unique
+    popularity = np.minimum(route_weights[route_index] * routes, 4)
+    per_incident = rng.poisson(verifications_per_incident * (0.5 + popularity / 2))
+    verified_incident = np.repeat(np.arange(1, incidents + 1), per_incident)
+    verified_user = rng.integers(1, users + 1, verified_incident.size)
+    _, unique = np.unique(verified_incident * (users + 1) + verified_user, return_index=True)
+    verified_incident, verified_user = verified_incident[unique], verified_user[unique]
+    is_verified = rng.random(verified_incident.size) < 0.85
+    verified_at = reported_at[verified_incident - 1] + rng.integers(60, 3600, verified_incident.size).astype("timedelta64[s]")
+    verification_count = np.bincount(verified_incident[is_verified], minlength=incidents + 1)[1:]
+    dispute_count = np.bincount(verified_incident[~is_verified], minlength=incidents + 1)[1:]
+
+    # Points as the write paths would have awarded them
+    points = (np.bincount(reporter_id, minlength=users + 1) * REPORT_POINTS
+              + np.bincount(verified_user, minlength=users + 1) * VERIFICATION_POINTS)[1:]
+
+    titles = [
+        TITLES[kind][k % len(TITLES[kind])].format(route=f"line {route_numbers[r]}")
+        for kind, k, r in zip(incident_type.tolist(), rng.integers(0, 12, incidents).tolist(), route_index.tolist())
+    ]
+    descriptions = np.array(DESCRIPTIONS, dtype=object)[rng.integers(0, len(DESCRIPTIONS), incidents)]
+
+    active = status == "active"
+    route_active = np.bincount(route_index[active] + 1, minlength=routes + 1)
+    stop_active = np.bincount(stop_id[active & has_stop], minlength=stops + 1)
+
+    with bind.begin() as conn:
+        sqlite = conn.dialect.name == "sqlite"
+        if sqlite:
+            # The FTS index is rebuilt once at the end instead of row by row
+            conn.execute(text("DROP TRIGGER IF EXISTS incidents_fts_insert"))
+
+        _insert(conn, User.__table__, {
+            "username": np.array([f"user_{i + 1}" for i in range(users)], dtype=object),
+            "points": points,
+            "created_at": _datetimes(np.datetime64(now, "s") - rng.integers(0, days * 86400, users).astype("timedelta64[s]")),
+        }, users, "users")
+        _insert(conn, Route.__table__, {
+            "route_number": route_numbers,
+            "route_name": np.array([f"Line {number}" for number in route_numbers], dtype=object),
+            "transport_type": _choice(rng, TRANSPORT_TYPES, routes),
+        }, routes, "routes")
+        _insert(conn, Stop.__table__, {
+            "stop_name": np.array([f"Stop {i + 1}" for i in range(stops)], dtype=object),
+            "latitude": 50.0 + rng.random(stops) * 0.12,
+            "longitude": 19.8 + rng.random(stops) * 0.3,
+        }, stops, "stops")
+        # Every route runs both ways: direction 1 serves the same stops in reverse order
+        stop_counts = np.diff(stop_offsets)
+        positions = np.concatenate([np.arange(count) for count in stop_counts])
+        member_routes = np.repeat(np.arange(1, routes + 1), stop_counts)
+        _insert(conn, RouteStop.__table__, {
+            "route_id": np.concatenate([member_routes, member_routes]),
+            "direction_id": np.repeat([0, 1], stop_flat.size),
+            "stop_id": np.concatenate([stop_flat, stop_flat]),
+            "stop_sequence": np.concatenate([positions, np.repeat(stop_counts, stop_counts) - 1 - positions]),
+        }, 2 * stop_flat.size, "route stops")
+        _insert(conn, Incident.__table__, {
+            "title": titles,
+            "description": descriptions,
+            "incident_type": incident_type,
+            "severity": severity,
+            "status": status,
+            "route_id": route_index + 1,
+            "stop_id": np.where(has_stop, stop_id.astype(object), None),
+            "reporter_id": reporter_id,
+            "delay_minutes": np.where(has_delay, delay_minutes.astype(object), None),
+            "reported_at": _datetimes(reported_at),
+            "resolved_at": _datetimes(np.where(resolved, resolved_at, np.datetime64("NaT"))),
+            "verification_count": verification_count,
+            "dispute_count": dispute_count,
+        }, incidents, "incidents")
+        _insert(conn, Verification.__table__, {
+            "incident_id": verified_incident,
+            "user_id": verified_user,
+            "is_verified": is_verified,
+            "verified_at": _datetimes(verified_at),
+        }, verified_incident.size, "verifications")
+
+        routes_with_active = np.flatnonzero(route_active)
+        stops_with_active = np.flatnonzero(stop_active)
+        _insert(conn, RouteIncidentCounter.__table__, {
+            "route_id": routes_with_active, "active_incidents": route_active[routes_with_active],
+        }, routes_with_active.size, "route counters")
+        _insert(conn, StopIncidentCounter.__table__, {
+            "stop_id": stops_with_active, "active_incidents": stop_active[stops_with_active],
+        }, stops_with_active.size, "stop counters")
+
+        if sqlite:
+            from search import create_search_index
+            create_search_index(conn)
+        conn.execute(text("ANALYZE"))
+
+    return {
+        "users": users, "routes": routes, "stops": stops, "route_stops": 2 * int(stop_flat.size),
+        "incidents": incidents, "verifications": int(verified_incident.size),
+    }
+
+
+def create_database(url: str, **counts):
+    """Create the schema at ``url`` and fill it; the database must not exist yet."""
+    from database import Base
+    from migrations import run_migrations
+
+    bind = create_engine(url)
+    Base.metadata.create_all(bind)
+    run_migrations(bind, fresh=True)
+    try:
+        return generate(bind, **counts)
+    finally:
+        bind.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", required=True, help="path of the SQLite file to create")
+    add_size_arguments(parser, incidents=1000000)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} already exists")
+    # Anything reading config sees the new database, never ./delay_management.db
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.db}"
+    print(f"Generating into {args.db} ...")
+    started = time.perf_counter()
+    create_database(f"sqlite:///{args.db}", **sizes(args))
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Drive concurrent load against the API and report throughput and p50/p95/p99 latency.
+
+Usage: python -m benchmarks.load [--db bench.db | --incidents 200000] [--concurrency 32] [--duration 30]
+                                 [--url http://localhost:8000] [--reads-only]
+                                 [--output results.json] [--compare previous.json]
+
+Each of --concurrency clients sends the next request as soon as the previous one returns, picking
+endpoints with the weights in benchmarks.workload.ENDPOINTS. Without --url the app runs in-process
+on a private copy of the database. With --url requests go to a running server and --db must be
+that server's database (or a copy of it); it is only read, to pick existing ids.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+
+from benchmarks.workload import (
+    ENDPOINTS, add_database_arguments, compare, default_output, environment, load_result, pick_fixtures,
+    remove_database, save, start_app, summarize, use_database
+)
+
+
+async def _client_loop(client, endpoints, weights, fixtures, rng, counter, deadline, warmup_until, samples):
+    while True:
+        (name, _, build), = rng.choices(endpoints, weights)
+        method, url, params, body = build(rng, fixtures, next(counter))
+        started = time.perf_counter()
+        if started >= deadline:
+            return
+        try:
+            response = await client.request(method, url, params=params, json=body)
+            status = response.status_code
+        except Exception as exc:  # connection errors and timeouts count as failed requests
+            status = type(exc).__name__
+        finished = time.perf_counter()
+        if started >= warmup_until:
+            samples.append((name, (finished - started) * 1000, status))
+
+
+async def run_load(client, fixtures: dict, concurrency: int, duration: float, warmup: float, reads_only: bool,
+                   seed: int):
+    endpoints = [endpoint for endpoint in ENDPOINTS if not reads_only or endpoint[0].startswith("GET ")]
+    weights = [weight for _, weight, _ in endpoints]
+    counter = itertools.count()
+    samples = []
+    started = time.perf_counter()
+    warmup_until = started + warmup
+    deadline = warmup_until + duration
+    await asyncio.gather(*(
+        _client_loop(client, endpoints, weights, fixtures, random.Random(seed + i), counter, deadline, warmup_until,
+                     samples)
+        for i in range(concurrency)
+    ))
+    return samples
+
+
+def report(samples: list, duration: float) -> dict:
+    by_endpoint = {}
+    for name, elapsed, status in samples:
+        by_endpoint.setdefault(name, []).append((elapsed, status))
+
+    def failed(status):
+        return not isinstance(status, int) or status >= 500
+
+    def section(rows):
+        statuses = {}
+        for _, status in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return {
+            **summarize([elapsed for elapsed, _ in rows]),
+            "throughput_rps": round(len(rows) / duration, 2),
+            "errors": sum(1 for _, status in rows if failed(status)),
+            "statuses": statuses,
+        }
+
+    return {
+        "overall": section([(elapsed, status) for _, elapsed, status in samples]),
+        "endpoints": {name: section(rows) for name, rows in sorted(by_endpoint.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_database_arguments(parser, incidents=200000)
+    parser.add_argument("--url", help="base URL of a running server instead of the in-process app")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of load before measuring starts")
+    parser.add_argument("--reads-only", action="store_true", help="send GET requests only")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/load-<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    import httpx
+
+    result = {"environment": environment(args)}
+    if args.url:
+        if not args.db:
+            parser.error("--url needs --db to pick ids from the server's data")
+        path = None
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import Session
+        bind = create_engine(f"sqlite:///file:{args.db}?mode=ro&uri=true")
+        with Session(bind) as db:
+            fixtures = pick_fixtures(db)
+        bind.dispose()
+        client = httpx.AsyncClient(
+            base_url=args.url, timeout=args.timeout,
+            limits=httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency),
+        )
+    else:
+        path = use_database(args)
+        app = start_app()
+        from database import SessionLocal
+        with SessionLocal() as db:
+            fixtures = pick_fixtures(db)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=args.timeout)
+
+    async def run():
+        async with client:
+            return await run_load(
+                client, fixtures, args.concurrency, args.duration, args.warmup, args.reads_only, args.seed
+            )
+
+    print(f"Running {args.concurrency} clients for {args.warmup:g}s warm-up + {args.duration:g}s "
+          f"against {args.url or 'the in-process app'} ...")
+    try:
+        samples = asyncio.run(run())
+    finally:
+        if path:
+            remove_database(path, args)
+
+    result.update(report(samples, args.duration))
+    overall = result["overall"]
+    print(f"\n{overall['count']} requests, {overall['throughput_rps']:.1f} req/s, {overall['errors']} errors")
+    print(f"{'':<42} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+    for name, stats in [("overall", overall), *result["endpoints"].items()]:
+        print(f"{name:<42} {stats['throughput_rps']:>8.1f} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+              f"{stats['p99_ms']:>9.2f} {stats['errors']:>7}")
+
+    save(args.output or default_output("load"), result)
+    if args.compare:
+        previous = load_result(args.compare)
+        compare({"overall": previous.get("overall"), **previous.get("endpoints", {})},
+                {"overall": overall, **result["endpoints"]}, args.compare, "p95_ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Show query plans and latencies of the hot incident queries with and without the composite indexes.
+
+Usage: python -m benchmarks.query_plans [--incidents 200000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, text
+from sqlalchemy.orm import Session
+
+from database import Base, Incident, Route, Stop, User, Verification
+from migrations import MIGRATIONS
+
+# Indexes added by the migrations; dropped for the "before" run
+INDEX_NAMES = [
+    "ix_incidents_status_reported_at",
+    "ix_incidents_reported_at_id",
+    "ix_incidents_route_status",
+    "ix_incidents_stop_status",
+    "ix_incidents_type_severity_status",
+    "uq_verifications_incident_user",
+]
+
+INCIDENT_TYPES = ["delay", "delay", "delay", "cancellation", "breakdown", "crowding", "other"]
+SEVERITIES = ["low", "medium", "medium", "high", "critical"]
+# Mostly historical data: the active working set is a small fraction of the table
+STATUSES = ["resolved"] * 90 + ["active"] * 6 + ["verified"] * 3 + ["disputed"]
+
+
+def populate(bind, incidents: int, routes: int = 200, stops: int = 2000, users: int = 5000):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    with bind.begin() as conn:
+        conn.execute(insert(User), [{"username": f"user_{i}", "points": 0} for i in range(users)])
+        conn.execute(insert(Route), [
+            {"route_number": f"R{i}", "route_name": f"Route {i}", "transport_type": "bus"} for i in range(routes)
+        ])
+        conn.execute(insert(Stop), [
+            {"stop_name": f"Stop {i}", "latitude": 50 + rng.random() / 2, "longitude": 19.7 + rng.random() / 2}
+            for i in range(stops)
+        ])
+        batch = []
+        for i in range(incidents):
+            batch.append({
+                "title": f"Incident {i}",
+                "description": "Synthetic benchmark incident",
+                "incident_type": rng.choice(INCIDENT_TYPES),
+                "severity": rng.choice(SEVERITIES),
+                "status": rng.choice(STATUSES),
+                "route_id": rng.randint(1, routes),
+                "stop_id": rng.randint(1, stops) if rng.random() > 0.3 else None,
+                "reporter_id": rng.randint(1, users),
+                "reported_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 365)),
+                "verification_count": 0,
+                "dispute_count": 0,
+            })
+            if len(batch) == 10000:
+                conn.execute(insert(Incident), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Incident), batch)
+
+        pairs = {(rng.randint(1, incidents), rng.randint(1, users)) for _ in range(incidents // 2)}
+        conn.execute(insert(Verification), [
+            {"incident_id": incident_id, "user_id": user_id, "is_verified": True} for incident_id, user_id in pairs
+        ])
+
+
+def hot_queries(db: Session):
+    return {
+        "get_incidents(status=active)": db.query(Incident).filter(Incident.status == "active")
+        .order_by(Incident.reported_at.desc(), Incident.id.desc()).limit(100),
+        "get_incidents_by_route": db.query(Incident).filter(Incident.route_id == 17, Incident.status == "active"),
+        "active counts per stop": db.query(Incident.stop_id, func.count(Incident.id))
+        .filter(Incident.status == "active", Incident.stop_id.in_(range(1, 51))).group_by(Incident.stop_id),
+        "stats groups": db.query(Incident.incident_type, Incident.severity, Incident.status, func.count(Incident.id))
+        .group_by(Incident.incident_type, Incident.severity, Incident.status),
+        "verification duplicate check": db.query(Verification)
+        .filter(Verification.incident_id == 1234, Verification.user_id == 42),
+    }
+
+
+def measure(bind, repeat: int):
+    results = {}
+    with Session(bind) as db:
+        for name, query in hot_queries(db).items():
+            compiled = query.statement.compile(bind, compile_kwargs={"literal_binds": True})
+            plan = [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                query.all()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (plan, statistics.median(timings))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--incidents", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    bind = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind)
+    print(f"Populating {args.incidents} incidents in {path} ...")
+    populate(bind, args.incidents)
+
+    with bind.begin() as conn:
+        for name in INDEX_NAMES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        conn.execute(text("ANALYZE"))
+    before = measure(bind, args.repeat)
+
+    with bind.begin() as conn:
+        for _, _, migrate in MIGRATIONS:
+            migrate(conn)
+        conn.execute(text("ANALYZE"))
+    after = measure(bind, args.repeat)
+
+    for name in before:
+        plan_before, ms_before = before[name]
+        plan_after, ms_after = after[name]
+        print(f"\n== {name}")
+        print(f"  before: {ms_before:8.2f} ms   {' | '.join(plan_before)}")
+        print(f"  after:  {ms_after:8.2f} ms   {' | '.join(plan_after)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Time every public crud function and every API endpoint against a generated database.
+
+Usage: python -m benchmarks.suite [--db bench.db | --incidents 200000] [--repeat 20] [--only crud|api]
+                                  [--output results.json] [--compare previous.json]
+
+Endpoints are called through an in-process ASGI client, so timings include routing, validation,
+serialization and the response cache but no network. Writes go to a private copy of the database.
+"""
+import argparse
+import asyncio
+import inspect
+import random
+import time
+from datetime import timedelta
+
+from benchmarks.workload import (
+    ENDPOINTS, add_database_arguments, compare, default_output, environment, incident_report, load_result,
+    pick_fixtures, remove_database, save, start_app, summarize, use_database
+)
+
+# Cases that rebuild or scan whole tables run at most this many times
+HEAVY_REPEAT = 3
+
+
+def crud_cases(fixtures: dict):
+    """(name, heavy, call(db, rng, n)) for each crud function; write cases come after the reads."""
+    import config
+    import crud
+    from schemas import IncidentCreate, VerificationCreate
+
+    f = fixtures
+    latest = f["latest"]
+
+    def user(rng):
+        return rng.randint(1, f["max_user"])
+
+    def adjust_counters(db, rng, n):
+        crud.adjust_active_counters(db, f["hot_route"], f["hot_stop"], 1)
+        crud.adjust_active_counters(db, f["hot_route"], f["hot_stop"], -1)
+        db.rollback()
+
+    def export_day(db, rng, n):
+        for _ in crud.iter_incident_export(db, latest - timedelta(days=1), latest, chunk_size=config.EXPORT_CHUNK_SIZE):
+            pass
+
+    return [
+        ("get_user", False, lambda db, rng, n: crud.get_user(db, user(rng))),
+        ("get_user_by_username", False, lambda db, rng, n: crud.get_user_by_username(db, f"user_{user(rng)}")),
+        ("get_user_cached", False, lambda db, rng, n: crud.get_user_cached(db, user(rng))),
+        ("get_route_cached", False, lambda db, rng, n: crud.get_route_cached(db, rng.randint(1, f["max_route"]))),
+        ("get_stop_cached", False, lambda db, rng, n: crud.get_stop_cached(db, rng.randint(1, f["max_stop"]))),
+        ("get_leaderboard", False, lambda db, rng, n: crud.get_leaderboard(db, 20, rng.randint(0, 1000))),
+        ("get_leaderboard_around", False, lambda db, rng, n: crud.get_leaderboard_around(db, user(rng), 5)),
+        ("get_cache_stats", False, lambda db, rng, n: crud.get_cache_stats()),
+        ("get_routes", False, lambda db, rng, n: crud.get_routes(db, 0, 100)),
+        ("get_route", False, lambda db, rng, n: crud.get_route(db, rng.randint(1, f["max_route"]))),
+        ("get_routes_with_incident_counts", False, lambda db, rng, n: crud.get_routes_with_incident_counts(db, 0, 100)),
+        ("get_route_stops", False, lambda db, rng, n: crud.get_route_stops(db, f["hot_route"])),
+        ("get_affecting_incidents", False, lambda db, rng, n: crud.get_affecting_incidents(db, f["hot_stop"])),
+        ("get_stops", False, lambda db, rng, n: crud.get_stops(db, 0, 100)),
+        ("get_stop", False, lambda db, rng, n: crud.get_stop(db, rng.randint(1, f["max_stop"]))),
+        ("get_stops_with_incident_counts", False, lambda db, rng, n: crud.get_stops_with_incident_counts(db, 0, 100)),
+        ("get_stops_nearby", False, lambda db, rng, n: crud.get_stops_nearby(db, *f["location"], 500)),
+        ("get_incidents", False, lambda db, rng, n: crud.get_incidents(db, limit=50)),
+        ("get_incidents(status=active, expand)", False, lambda db, rng, n: crud.get_incidents(
+            db, limit=50, status="active", expand=("route", "stop"))),
+        ("get_incidents(include_archived)", False, lambda db, rng, n: crud.get_incidents(
+            db, limit=50, include_archived=True)),
+        ("get_incident", False, lambda db, rng, n: crud.get_incident(db, rng.randint(*f["recent_incidents"]))),
+        ("get_incident_detail", False, lambda db, rng, n: crud.get_incident_detail(db, rng.randint(*f["recent_incidents"]))),
+        ("get_incidents_by_route", False, lambda db, rng, n: crud.get_incidents_by_route(db, f["hot_route"])),
+        ("search_incidents", False, lambda db, rng, n: crud.search_incidents(db, rng.choice(f["search_terms"]), 20)),
+        ("iter_incident_export(1 day)", False, export_day),
+        ("get_verifications_by_incident", False, lambda db, rng, n: crud.get_verifications_by_incident(
+            db, rng.randint(*f["recent_incidents"]))),
+        ("get_delay_analytics", False, lambda db, rng, n: crud.get_delay_analytics(
+            db, latest - timedelta(days=1), latest, "hour", f["hot_route"])),
+        ("get_delay_analytics(day)", False, lambda db, rng, n: crud.get_delay_analytics(
+            db, latest - timedelta(days=90), latest, "day")),
+        ("get_incident_stats", False, lambda db, rng, n: crud.get_incident_stats(db)),
+        ("get_incident_stats(include_archived)", False, lambda db, rng, n: crud.get_incident_stats(db, True)),
+        ("check_incident_counters", True, lambda db, rng, n: crud.check_incident_counters(db)),
+        ("ensure_incident_counters", True, lambda db, rng, n: crud.ensure_incident_counters(db)),
+
+        ("create_user", False, lambda db, rng, n: crud.create_user(db, f"bench_{f['run_token']}_crud_{n}")),
+        ("update_user_points", False, lambda db, rng, n: crud.update_user_points(db, user(rng), 1)),
+        ("adjust_active_counters", False, adjust_counters),
+        ("create_incident", False, lambda db, rng, n: crud.create_incident(db, IncidentCreate(**incident_report(rng, f)))),
+        ("create_incidents_batch(20)", False, lambda db, rng, n: crud.create_incidents_batch(
+            db, [IncidentCreate(**incident_report(rng, f)) for _ in range(20)])),
+        ("update_incident_status", False, lambda db, rng, n: crud.update_incident_status(
+            db, rng.choice(f["open_incidents"]), "verified" if n % 2 else "active")),
+        ("create_verification", False, lambda db, rng, n: crud.create_verification(db, VerificationCreate(
+            incident_id=rng.choice(f["open_incidents"]), user_id=user(rng), is_verified=rng.random() < 0.85))),
+        ("invalidate_reference_caches", False, lambda db, rng, n: crud.invalidate_reference_caches()),
+
+        ("load_leaderboard", True, lambda db, rng, n: crud.load_leaderboard(db)),
+        ("load_topology", True, lambda db, rng, n: crud.load_topology(db)),
+        ("load_recent_incidents", True, lambda db, rng, n: crud.load_recent_incidents(db)),
+        ("load_delay_rollups", True, lambda db, rng, n: crud.load_delay_rollups(db)),
+        ("rebuild_stop_index", True, lambda db, rng, n: crud.rebuild_stop_index(db)),
+        ("rebuild_incident_counters", True, lambda db, rng, n: crud.rebuild_incident_counters(db)),
+        ("auto_resolve_stale_incidents", True, lambda db, rng, n: crud.auto_resolve_stale_incidents(
+            db, config.AUTO_RESOLVE_MAX_AGE_HOURS, max_batches=1)),
+        ("archive_resolved_incidents(1 batch)", True, lambda db, rng, n: crud.archive_resolved_incidents(
+            db, config.ARCHIVE_AFTER_DAYS, max_batches=1)),
+    ]
+
+
+def run_crud(fixtures: dict, repeat: int, seed: int):
+    import crud
+    from database import SessionLocal
+
+    rng = random.Random(seed)
+    results = {}
+    for name, heavy, call in crud_cases(fixtures):
+        runs = min(repeat, HEAVY_REPEAT) if heavy else repeat
+        samples = []
+        # One warm-up call, then a fresh session per call as a request would have
+        for n in range(runs + 1):
+            db = SessionLocal()
+            try:
+                started = time.perf_counter()
+                call(db, rng, n)
+                elapsed = (time.perf_counter() - started) * 1000
+            finally:
+                db.close()
+            if n:
+                samples.append(elapsed)
+        results[name] = summarize(samples)
+        print(f"  {name:<42} p50 {results[name]['p50_ms']:>10.3f} ms   p95 {results[name]['p95_ms']:>10.3f} ms")
+
+    covered = {name.split("(")[0] for name, _, _ in crud_cases(fixtures)}
+    public = {
+        name for name, member in inspect.getmembers(crud, inspect.isfunction)
+        if member.__module__ == "crud" and not name.startswith("_")
+    }
+    if public - covered:
+        print(f"  not benchmarked: {', '.join(sorted(public - covered))}")
+    return results
+
+
+async def run_api(app, fixtures: dict, repeat: int, seed: int):
+    import httpx
+
+    rng = random.Random(seed)
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for name, _, build in ENDPOINTS:
+            samples, statuses = [], {}
+            for n in range(repeat + 1):
+                method, url, params, body = build(rng, fixtures, n)
+                started = time.perf_counter()
+                response = await client.request(method, url, params=params, json=body)
+                elapsed = (time.perf_counter() - started) * 1000
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if n:
+                    samples.append(elapsed)
+            results[name] = {**summarize(samples), "statuses": statuses}
+            print(f"  {name:<42} p50 {results[name]['p50_ms']:>10.3f} ms   p95 {results[name]['p95_ms']:>10.3f} ms"
+                  f"   {statuses}")
+
+    covered = {name.split("?")[0] for name, _, _ in ENDPOINTS}
+    routes = {
+        f"{method} {route.path}" for route in app.routes if hasattr(route, "methods") and route.include_in_schema
+        for method in route.methods
+    }
+    missing = routes - covered - {"GET /incidents/stream"}
+    if missing:
+        print(f"  not benchmarked: {', '.join(sorted(missing))}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_database_arguments(parser, incidents=200000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", choices=("crud", "api"))
+    parser.add_argument("--output", help="result file (default: benchmarks/results/suite-<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    path = use_database(args)
+    result = {"environment": environment(args)}
+    try:
+        app = start_app()
+
+        from database import SessionLocal
+        with SessionLocal() as db:
+            fixtures = pick_fixtures(db)
+
+        # API first: the crud write and maintenance cases change the data the endpoints would read
+        if args.only != "crud":
+            print("\n== API endpoints")
+            result["api"] = asyncio.run(run_api(app, fixtures, args.repeat, args.seed))
+        if args.only != "api":
+            print("\n== crud functions")
+            result["crud"] = run_crud(fixtures, args.repeat, args.seed)
+    finally:
+        remove_database(path, args)
+
+    save(args.output or default_output("suite"), result)
+    if args.compare:
+        previous = load_result(args.compare)
+        for section in ("api", "crud"):
+            if section in result:
+                compare(previous.get(section, {}), result[section], f"{args.compare} [{section}]")
+
+
+if __name__ == "__main__":
+    main()
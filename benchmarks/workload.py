@@ -0,0 +1,252 @@
+"""Shared pieces of the benchmark suite and load driver: the database to run against, the ids
+requests are built from, the API request mix, and result files.
+
+Nothing here imports the application at module level: config is read at import time, so the app
+modules may only be imported after use_database() has pointed DATABASE_URL at the benchmark copy.
+"""
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+
+def add_size_arguments(parser, incidents: int):
+    parser.add_argument("--incidents", type=int, default=incidents)
+    parser.add_argument("--users", type=int, help="default: one per 10 incidents")
+    parser.add_argument("--routes", type=int, default=500)
+    parser.add_argument("--stops", type=int, default=8000)
+    parser.add_argument("--verifications-per-incident", type=float, default=1.5)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def sizes(args):
+    return {
+        "users": args.users or max(args.incidents // 10, 1000), "routes": args.routes, "stops": args.stops,
+        "incidents": args.incidents, "verifications_per_incident": args.verifications_per_incident,
+        "days": args.days, "seed": args.seed,
+    }
+
+
+def add_database_arguments(parser, incidents: int):
+    parser.add_argument("--db", help="database made by benchmarks.generator; it is copied, never modified. "
+                                     "Without it a database of --incidents is generated")
+    parser.add_argument("--keep", action="store_true", help="keep the working copy of the database")
+    add_size_arguments(parser, incidents)
+
+
+def use_database(args) -> str:
+    """Copy or generate the benchmark database and point DATABASE_URL at it."""
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    # Set before the generator imports any app module, so config is bound to the copy
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    # Every benchmark client shares one IP; measure the write paths rather than 429s
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    if args.db:
+        print(f"Copying {args.db} to {path} ...")
+        shutil.copyfile(args.db, path)
+    else:
+        from benchmarks.generator import create_database
+        print(f"Generating {args.incidents} incidents into {path} ...")
+        create_database(f"sqlite:///{path}", **sizes(args))
+    return path
+
+
+def remove_database(path: str, args):
+    if args.keep:
+        print(f"Database kept at {path}")
+    else:
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+def start_app():
+    # Runs the startup hook (migrations, in-memory indexes) without the background jobs, which
+    # would compete with the measured requests
+    import main
+    main.startup_event()
+    return main.app
+
+
+def pick_fixtures(db) -> dict:
+    """Ids and values requests are built from, chosen so that hot paths are exercised."""
+    from sqlalchemy import func, select
+    from database import Incident, Route, RouteStop, Stop, User
+
+    hot_route = db.execute(
+        select(Incident.route_id).group_by(Incident.route_id).order_by(func.count().desc()).limit(1)
+    ).scalar()
+    hot_stop = db.execute(
+        select(RouteStop.stop_id)
+        .where(RouteStop.route_id == hot_route, RouteStop.direction_id == 0)
+        .order_by(RouteStop.stop_sequence.desc())
+        .limit(1)
+    ).scalar()
+    stop = db.get(Stop, hot_stop) if hot_stop else None
+    max_incident = db.execute(select(func.max(Incident.id))).scalar() or 0
+    latest = db.execute(select(func.max(Incident.reported_at))).scalar() or datetime.utcnow()
+    open_ids = list(db.scalars(
+        select(Incident.id).where(Incident.status.in_(("active", "verified"))).order_by(Incident.id.desc()).limit(1000)
+    ))
+    return {
+        "hot_route": hot_route,
+        "hot_stop": hot_stop,
+        "location": (stop.latitude, stop.longitude) if stop else (50.06, 19.94),
+        "max_route": db.execute(select(func.max(Route.id))).scalar() or 0,
+        "max_stop": db.execute(select(func.max(Stop.id))).scalar() or 0,
+        "max_user": db.execute(select(func.max(User.id))).scalar() or 0,
+        "max_incident": max_incident,
+        # Recent incidents are the ones clients look at and verify
+        "recent_incidents": (max(1, max_incident - 10000), max_incident),
+        "open_incidents": open_ids or [max_incident],
+        "latest": latest,
+        "search_terms": ["breakdown", "delay tram", "signal fail*", "overcrowded line"],
+        # Unique per run so created usernames do not collide with an earlier run on the same copy
+        "run_token": format(int(time.time() * 1000) % 36 ** 6, "x"),
+    }
+
+
+def _recent_incident(rng, fixtures):
+    return rng.randint(*fixtures["recent_incidents"])
+
+
+def incident_report(rng, fixtures):
+    kind = rng.choice(["delay", "delay", "breakdown", "crowding", "cancellation"])
+    route_id = fixtures["hot_route"] if rng.random() < 0.3 else rng.randint(1, fixtures["max_route"])
+    return {
+        "title": f"Benchmark {kind} on line {route_id}",
+        "description": "Synthetic report sent by the benchmark workload.",
+        "incident_type": kind,
+        "severity": rng.choice(["low", "medium", "high"]),
+        "route_id": route_id,
+        "stop_id": rng.randint(1, fixtures["max_stop"]) if rng.random() < 0.7 else None,
+        "reporter_id": rng.randint(1, fixtures["max_user"]),
+        "delay_minutes": rng.randint(1, 60) if kind == "delay" else None,
+    }
+
+
+# (name, weight in the load mix, factory(rng, fixtures, n) -> (method, url, params, json body)).
+# The weights approximate production traffic: reads of the incident feed dominate, writes are rare.
+# /incidents/stream is left out: it is a long-lived SSE connection, not a request/response call.
+ENDPOINTS = [
+    ("GET /", 1, lambda rng, f, n: ("GET", "/", None, None)),
+    ("GET /users/leaderboard", 3, lambda rng, f, n: ("GET", "/users/leaderboard", {"limit": 20}, None)),
+    ("GET /users/leaderboard?around_user", 2, lambda rng, f, n: (
+        "GET", "/users/leaderboard", {"around_user": rng.randint(1, f["max_user"]), "limit": 5}, None)),
+    ("GET /users/{user_id}", 5, lambda rng, f, n: ("GET", f"/users/{rng.randint(1, f['max_user'])}", None, None)),
+    ("POST /users", 1, lambda rng, f, n: ("POST", "/users", None, {"username": f"bench_{f['run_token']}_{n}"})),
+    ("GET /routes", 4, lambda rng, f, n: ("GET", "/routes", {"limit": 100}, None)),
+    ("GET /routes/{route_id}", 4, lambda rng, f, n: ("GET", f"/routes/{rng.randint(1, f['max_route'])}", None, None)),
+    ("GET /routes/{route_id}/incidents", 6, lambda rng, f, n: ("GET", f"/routes/{f['hot_route']}/incidents", None, None)),
+    ("GET /routes/{route_id}/stops", 3, lambda rng, f, n: ("GET", f"/routes/{rng.randint(1, f['max_route'])}/stops", None, None)),
+    ("GET /stops", 3, lambda rng, f, n: ("GET", "/stops", {"limit": 100}, None)),
+    ("GET /stops/nearby", 8, lambda rng, f, n: ("GET", "/stops/nearby", {
+        "lat": f["location"][0] + rng.uniform(-0.01, 0.01), "lon": f["location"][1] + rng.uniform(-0.01, 0.01),
+        "radius_m": 500}, None)),
+    ("GET /stops/{stop_id}", 4, lambda rng, f, n: ("GET", f"/stops/{rng.randint(1, f['max_stop'])}", None, None)),
+    ("GET /stops/{stop_id}/affecting-incidents", 6, lambda rng, f, n: (
+        "GET", f"/stops/{f['hot_stop'] if rng.random() < 0.5 else rng.randint(1, f['max_stop'])}/affecting-incidents",
+        None, None)),
+    ("POST /incidents", 3, lambda rng, f, n: ("POST", "/incidents", None, incident_report(rng, f))),
+    ("POST /incidents/batch", 1, lambda rng, f, n: (
+        "POST", "/incidents/batch", None, {"incidents": [incident_report(rng, f) for _ in range(20)]})),
+    ("GET /incidents", 12, lambda rng, f, n: ("GET", "/incidents", {"limit": 50}, None)),
+    ("GET /incidents?status=active&expand", 8, lambda rng, f, n: (
+        "GET", "/incidents", {"status": "active", "expand": "route,stop", "limit": 50}, None)),
+    ("GET /incidents?include_archived", 1, lambda rng, f, n: (
+        "GET", "/incidents", {"include_archived": "true", "limit": 50}, None)),
+    ("GET /incidents/search", 4, lambda rng, f, n: (
+        "GET", "/incidents/search", {"q": rng.choice(f["search_terms"]), "limit": 20}, None)),
+    ("GET /incidents/{incident_id}", 8, lambda rng, f, n: ("GET", f"/incidents/{_recent_incident(rng, f)}", None, None)),
+    ("PUT /incidents/{incident_id}/status", 1, lambda rng, f, n: (
+        "PUT", f"/incidents/{rng.choice(f['open_incidents'])}/status", {"status": rng.choice(["active", "verified"])},
+        None)),
+    ("POST /verifications", 3, lambda rng, f, n: ("POST", "/verifications", None, {
+        "incident_id": rng.choice(f["open_incidents"]), "user_id": rng.randint(1, f["max_user"]),
+        "is_verified": rng.random() < 0.85})),
+    ("GET /incidents/{incident_id}/verifications", 4, lambda rng, f, n: (
+        "GET", f"/incidents/{_recent_incident(rng, f)}/verifications", None, None)),
+    ("GET /cache/stats", 1, lambda rng, f, n: ("GET", "/cache/stats", None, None)),
+    ("GET /jobs", 1, lambda rng, f, n: ("GET", "/jobs", None, None)),
+    ("GET /metrics", 1, lambda rng, f, n: ("GET", "/metrics", None, None)),
+    ("GET /analytics/delays", 3, lambda rng, f, n: ("GET", "/analytics/delays", {
+        "route_id": f["hot_route"], "bucket": "hour", "to": f["latest"].isoformat()}, None)),
+    ("GET /analytics/delays?bucket=day", 1, lambda rng, f, n: ("GET", "/analytics/delays", {
+        "bucket": "day", "to": f["latest"].isoformat()}, None)),
+    ("GET /export/incidents", 1, lambda rng, f, n: ("GET", "/export/incidents", {
+        "from": (f["latest"] - timedelta(hours=6)).isoformat(), "to": f["latest"].isoformat()}, None)),
+    ("GET /stats", 4, lambda rng, f, n: ("GET", "/stats", None, None)),
+]
+
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    # Nearest-rank percentile of an already sorted list
+    if not ordered:
+        return math.nan
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples_ms)
+    return {
+        "count": len(ordered),
+        "min_ms": round(ordered[0], 3) if ordered else math.nan,
+        "mean_ms": round(sum(ordered) / len(ordered), 3) if ordered else math.nan,
+        "p50_ms": round(percentile(ordered, 50), 3),
+        "p95_ms": round(percentile(ordered, 95), 3),
+        "p99_ms": round(percentile(ordered, 99), 3),
+        "max_ms": round(ordered[-1], 3) if ordered else math.nan,
+    }
+
+
+def environment(args) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "started_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+    }
+
+
+def save(path: str, result: dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2, default=str)
+    print(f"\nResults written to {path}")
+
+
+def default_output(kind: str) -> str:
+    return os.path.join("benchmarks", "results", f"{kind}-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+
+
+def load_result(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(previous: Dict[str, dict], current: Dict[str, dict], label: str, metric: str = "p50_ms",
+            threshold: float = 0.1):
+    """Print the change of ``metric`` per entry against an earlier run."""
+    print(f"\nCompared with {label} ({metric}; changes over {threshold:.0%} flagged)")
+    for name, stats in current.items():
+        before: Optional[dict] = previous.get(name)
+        if not before or not before.get(metric):
+            print(f"  {name:<50} {'new':>10}")
+            continue
+        change = stats[metric] / before[metric] - 1
+        flag = "  slower" if change > threshold else "  faster" if change < -threshold else ""
+        print(f"  {name:<50} {before[metric]:>10.2f} -> {stats[metric]:>10.2f} ms  {change:+7.1%}{flag}")
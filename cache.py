@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import config
+
+MISSING = object()
+
+
+class LocalCacheBackend:
+    """Bounded in-process cache with per-entry TTL and LRU eviction."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self, prefix: str = ""):
+        with self._lock:
+            if not prefix:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if str(key).startswith(prefix)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Shared backend so several workers see the same entries and invalidations.
+
+    Values must be JSON-serializable. Requires the optional ``redis`` package.
+    """
+
+    def __init__(self, url: str, key_prefix: str = "delay-api:"):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package") from exc
+        self._client = redis.Redis.from_url(url)
+        self.key_prefix = key_prefix
+
+    def get(self, key: Hashable):
+        raw = self._client.get(self.key_prefix + str(key))
+        return MISSING if raw is None else json.loads(raw)
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        self._client.set(self.key_prefix + str(key), json.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, key: Hashable):
+        self._client.delete(self.key_prefix + str(key))
+
+    def clear(self, prefix: str = ""):
+        for key in self._client.scan_iter(match=f"{self.key_prefix}{prefix}*"):
+            self._client.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self._client.scan_iter(match=f"{self.key_prefix}*"))
+
+
+def create_backend():
+    if config.CACHE_BACKEND == "redis":
+        return RedisCacheBackend(config.CACHE_REDIS_URL)
+    return LocalCacheBackend(config.CACHE_MAX_ENTRIES)
+
+
+class ReadThroughCache:
+    """Namespace on a shared backend that loads missing keys and counts hits and misses."""
+
+    def __init__(self, namespace: str, backend, ttl: float):
+        self.namespace = namespace
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Optional[Any]]):
+        value = self.backend.get(self._key(key))
+        if value is not MISSING:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = loader()
+        # Misses are not cached, so a newly created row is visible immediately
+        if value is not None:
+            self.backend.set(self._key(key), value, self.ttl)
+        return value
+
+    def invalidate(self, key: Hashable):
+        self.backend.delete(self._key(key))
+
+    def clear(self):
+        self.backend.clear(f"{self.namespace}:")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+backend = create_backend()
+route_cache = ReadThroughCache("route", backend, config.CACHE_REFERENCE_TTL_SECONDS)
+stop_cache = ReadThroughCache("stop", backend, config.CACHE_REFERENCE_TTL_SECONDS)
+user_cache = ReadThroughCache("user", backend, config.CACHE_USER_TTL_SECONDS)
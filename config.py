@@ -0,0 +1,151 @@
+import json
+import os
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _rate(name: str, default: str):
+    # "count/seconds" -> (count, seconds); "0" or an empty value disables the limit
+    value = os.getenv(name, default).strip()
+    if not value or value == "0":
+        return None
+    count, seconds = value.split("/")
+    return int(count), float(seconds)
+
+
+def _async_url(url: str) -> str:
+    # Derive the async driver URL from the sync one unless it is set explicitly
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith(("postgresql:", "postgresql+psycopg2:")):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+
+# Database
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./delay_management.db")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+# "sync" serves requests with the thread-pooled SQLAlchemy session, "async" with an
+# AsyncSession on an async driver (aiosqlite locally, asyncpg for Postgres)
+DB_MODE = os.getenv("DB_MODE", "sync")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+# Seconds after which pooled connections are replaced; -1 disables recycling
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# SQLite pragmas applied to every new connection
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Negative values are KiB, as in PRAGMA cache_size
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Largest number of reports accepted by POST /incidents/batch
+INCIDENT_BATCH_MAX_SIZE = int(os.getenv("INCIDENT_BATCH_MAX_SIZE", "1000"))
+
+# Read-through cache for routes, stops and users: "local" (per process) or "redis" (shared)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+# Routes and stops almost never change; users are invalidated on every points award
+CACHE_REFERENCE_TTL_SECONDS = float(os.getenv("CACHE_REFERENCE_TTL_SECONDS", "600"))
+CACHE_USER_TTL_SECONDS = float(os.getenv("CACHE_USER_TTL_SECONDS", "60"))
+
+# Serialized bodies of /routes, /stops, /incidents and /stats, reused until a write changes them
+RESPONSE_CACHE_ENABLED = _env_bool("RESPONSE_CACHE_ENABLED", True)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+# Upper bound on staleness for writes made through other worker processes
+RESPONSE_CACHE_MAX_AGE_SECONDS = float(os.getenv("RESPONSE_CACHE_MAX_AGE_SECONDS", "10"))
+
+# /incidents/stream: events buffered per subscriber before it is dropped as a slow consumer
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+# Comment lines sent on idle streams so proxies keep the connection open
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+
+# Duplicate reports: a new report matching an open incident on the same route, stop and type
+# within the window, with a similar enough title (trigram Jaccard), becomes a verification of it
+DEDUP_ENABLED = _env_bool("DEDUP_ENABLED", True)
+DEDUP_WINDOW_MINUTES = float(os.getenv("DEDUP_WINDOW_MINUTES", "15"))
+DEDUP_TITLE_SIMILARITY = float(os.getenv("DEDUP_TITLE_SIMILARITY", "0.5"))
+DEDUP_MAX_PER_KEY = int(os.getenv("DEDUP_MAX_PER_KEY", "16"))
+
+# Rows fetched and encoded per step of /export/incidents
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+# Background auto-resolve of stale incidents
+AUTO_RESOLVE_ENABLED = _env_bool("AUTO_RESOLVE_ENABLED", True)
+AUTO_RESOLVE_INTERVAL_SECONDS = float(os.getenv("AUTO_RESOLVE_INTERVAL_SECONDS", "300"))
+AUTO_RESOLVE_BATCH_SIZE = int(os.getenv("AUTO_RESOLVE_BATCH_SIZE", "500"))
+# Hours after which an unresolved incident is resolved. Keys are "type:severity", "type",
+# "*:severity" or "*" (most specific wins), e.g. '{"delay": 3, "delay:critical": 6, "*": 24}'
+AUTO_RESOLVE_MAX_AGE_HOURS = json.loads(os.getenv(
+    "AUTO_RESOLVE_MAX_AGE_HOURS",
+    '{"delay": 4, "crowding": 2, "cancellation": 8, "breakdown": 12, "*": 24}'
+))
+
+# Resolved incidents older than this move, with their verifications, to the archive tables
+ARCHIVE_ENABLED = _env_bool("ARCHIVE_ENABLED", True)
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+
+# /analytics/delays: rollups are updated on every incident write and fully reloaded at this
+# interval to pick up writes made by other worker processes
+ANALYTICS_REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", "900"))
+ANALYTICS_MAX_BUCKETS = int(os.getenv("ANALYTICS_MAX_BUCKETS", "2000"))
+
+# The leaderboard is kept in memory and updated on every award; this reload picks up
+# awards made by other worker processes
+LEADERBOARD_REFRESH_SECONDS = float(os.getenv("LEADERBOARD_REFRESH_SECONDS", "300"))
+LEADERBOARD_MAX_LIMIT = int(os.getenv("LEADERBOARD_MAX_LIMIT", "100"))
+
+# Reload interval of the in-memory route/stop topology behind /stops/{id}/affecting-incidents
+TOPOLOGY_REFRESH_SECONDS = float(os.getenv("TOPOLOGY_REFRESH_SECONDS", "300"))
+
+# Reload interval of the in-memory stop grid behind /stops/nearby and the stream's bbox filter;
+# picks up stops added or moved by a GTFS import run in another process
+STOP_INDEX_REFRESH_SECONDS = float(os.getenv("STOP_INDEX_REFRESH_SECONDS", "300"))
+
+# /stats backend: "query" runs one aggregate query per request, "snapshot" serves an
+# in-memory aggregate that the incident write paths keep up to date
+STATS_MODE = os.getenv("STATS_MODE", "query")
+# Snapshot mode reloads from the database at this interval so writes made by other
+# worker processes are eventually reflected
+STATS_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("STATS_SNAPSHOT_MAX_AGE_SECONDS", "60"))
+
+# Request and SQL instrumentation served at /metrics (per worker process)
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+# Statements slower than this are logged as warnings by the "metrics" logger; 0 disables the log
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+# A request executing one statement this many times is counted and logged as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+# Token-bucket limits on writes that award points, as "count/seconds": bursts of up to count
+# requests, refilled at count per seconds. Each request needs a token from its user's bucket,
+# then from its client IP's; "0" disables a rule.
+RATE_LIMIT_ENABLED = _env_bool("RATE_LIMIT_ENABLED", True)
+RATE_LIMIT_INCIDENTS_PER_USER = _rate("RATE_LIMIT_INCIDENTS_PER_USER", "5/300")
+RATE_LIMIT_INCIDENTS_PER_IP = _rate("RATE_LIMIT_INCIDENTS_PER_IP", "30/300")
+# POST /incidents/batch has its own, larger budget (importers and offline sync), one token per report
+RATE_LIMIT_BATCH_REPORTS_PER_USER = _rate("RATE_LIMIT_BATCH_REPORTS_PER_USER", "1000/300")
+RATE_LIMIT_BATCH_REPORTS_PER_IP = _rate("RATE_LIMIT_BATCH_REPORTS_PER_IP", "5000/300")
+RATE_LIMIT_VERIFICATIONS_PER_USER = _rate("RATE_LIMIT_VERIFICATIONS_PER_USER", "30/300")
+RATE_LIMIT_VERIFICATIONS_PER_IP = _rate("RATE_LIMIT_VERIFICATIONS_PER_IP", "120/300")
+# "local" keeps buckets per process; "redis" shares them between workers
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "local")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", CACHE_REDIS_URL)
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+# Seconds between sweeps of idle local buckets
+RATE_LIMIT_SWEEP_SECONDS = float(os.getenv("RATE_LIMIT_SWEEP_SECONDS", "60"))
+# Take the client IP from the first X-Forwarded-For entry; only enable behind a trusted proxy
+RATE_LIMIT_TRUST_FORWARDED = _env_bool("RATE_LIMIT_TRUST_FORWARDED", False)
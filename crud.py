@@ -1,8 +1,49 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import User, Route, Stop, Incident, Verification
-from schemas import IncidentCreate, VerificationCreate
-from datetime import datetime
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import (
+    DateTime, Float, and_, bindparam, case, cast, delete, func, insert, literal, literal_column, or_, select, update
+)
+from sqlalchemy.exc import IntegrityError
+from database import (
+    dialect_insert, User, Route, Stop, RouteStop, Incident, Verification, ArchivedIncident, ArchivedVerification,
+    RouteIncidentCounter, StopIncidentCounter
+)
+from schemas import IncidentCreate, IncidentResponse, VerificationCreate, RouteResponse, StopResponse, UserResponse
+from cache import route_cache, stop_cache, user_cache
+from response_cache import response_cache
+from pubsub import broker
+from spatial import stop_index
+from stats import archive_snapshot, stats_snapshot, summarize
+from analytics import delay_rollups
+from leaderboard import leaderboard
+from dedup import recent_incidents
+from search import fts5_match, incidents_fts, parse_query, tsquery
+from export import EXPORT_COLUMNS
+from topology import route_topology
+from datetime import datetime, timedelta
+from collections import Counter
+from itertools import islice
+from typing import List
+import heapq
+import config
+
+REPORT_POINTS = 10
+VERIFICATION_POINTS = 2
+# Incidents still affecting service: duplicate reports merge into them and stops downstream see them
+OPEN_STATUSES = ("active", "verified")
+
+# Relationships list endpoints can load alongside incidents via ?expand=
+INCIDENT_EXPANSIONS = {
+    "route": Incident.route,
+    "stop": Incident.stop,
+    "reporter": Incident.reporter,
+    "verifications": Incident.verifications,
+}
+ARCHIVED_INCIDENT_EXPANSIONS = {
+    "route": ArchivedIncident.route,
+    "stop": ArchivedIncident.stop,
+    "reporter": ArchivedIncident.reporter,
+    "verifications": ArchivedIncident.verifications,
+}
 
 
 # User operations
@@ -19,16 +60,87 @@ def create_user(db: Session, username: str):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    user_cache.invalidate(db_user.id)
+    leaderboard.add(db_user.id, db_user.username, db_user.points or 0)
     return db_user
 
 
+def _award_points(db: Session, user_id: int, points: int):
+    # Atomic increment inside the caller's transaction; no read-modify-write on points
+    db.execute(
+        update(User).where(User.id == user_id).values(points=User.points + points),
+        execution_options={"synchronize_session": "evaluate"}
+    )
+
+
 def update_user_points(db: Session, user_id: int, points: int):
-    user = get_user(db, user_id)
-    if user:
-        user.points += points
-        db.commit()
-        db.refresh(user)
-    return user
+    _award_points(db, user_id, points)
+    db.commit()
+    _on_points_changed({user_id: points})
+    return get_user(db, user_id)
+
+
+# Cached reference lookups. They return response schemas rather than ORM objects so
+# entries can outlive the session and be shared through an external cache backend.
+def _cached_lookup(cache, schema, key: int, load):
+    def loader():
+        row = load()
+        return schema.model_validate(row).model_dump(mode="json") if row is not None else None
+
+    value = cache.get_or_load(key, loader)
+    return schema(**value) if value is not None else None
+
+
+def get_user_cached(db: Session, user_id: int):
+    return _cached_lookup(user_cache, UserResponse, user_id, lambda: get_user(db, user_id))
+
+
+def get_route_cached(db: Session, route_id: int):
+    return _cached_lookup(route_cache, RouteResponse, route_id, lambda: get_route(db, route_id))
+
+
+def get_stop_cached(db: Session, stop_id: int):
+    return _cached_lookup(stop_cache, StopResponse, stop_id, lambda: get_stop(db, stop_id))
+
+
+def invalidate_reference_caches():
+    # Call after bulk changes to routes or stops
+    route_cache.clear()
+    stop_cache.clear()
+    response_cache.bump("routes", "stops")
+
+
+# Leaderboard
+def load_leaderboard(db: Session):
+    leaderboard.load(db.execute(select(User.id, User.username, User.points).order_by(User.points.desc(), User.id)))
+    return len(leaderboard)
+
+
+def _ensure_leaderboard(db: Session):
+    if leaderboard.loaded_at is None:
+        load_leaderboard(db)
+
+
+def get_leaderboard(db: Session, limit: int = 10, offset: int = 0):
+    _ensure_leaderboard(db)
+    return {"total_users": len(leaderboard), "entries": leaderboard.top(limit, offset)}
+
+
+def get_leaderboard_around(db: Session, user_id: int, limit: int = 10):
+    _ensure_leaderboard(db)
+    entries = leaderboard.around(user_id, limit)
+    if entries is None:
+        return None
+    return {"total_users": len(leaderboard), "user": leaderboard.rank(user_id), "entries": entries}
+
+
+def get_cache_stats():
+    return {
+        "routes": route_cache.stats(),
+        "stops": stop_cache.stats(),
+        "users": user_cache.stats(),
+        "entries": len(route_cache.backend),
+    }
 
 
 # Route operations
@@ -40,14 +152,54 @@ def get_route(db: Session, route_id: int):
     return db.query(Route).filter(Route.id == route_id).first()
 
 
-def get_routes_with_incident_counts(db: Session):
-    return db.query(
+def get_routes_with_incident_counts(db: Session, skip: int = 0, limit: int = 100, after_id: int = None):
+    query = db.query(
         Route,
-        func.count(Incident.id).label('active_incidents')
+        func.coalesce(RouteIncidentCounter.active_incidents, 0).label('active_incidents')
     ).outerjoin(
-        Incident,
-        (Incident.route_id == Route.id) & (Incident.status == 'active')
-    ).group_by(Route.id).all()
+        RouteIncidentCounter,
+        RouteIncidentCounter.route_id == Route.id
+    )
+    if after_id is not None:
+        query = query.filter(Route.id > after_id)
+    return query.order_by(Route.id).offset(skip).limit(limit).all()
+
+
+def get_route_stops(db: Session, route_id: int, direction_id: int = None):
+    # Stops in travel order for one direction; the route's lowest direction by default
+    if direction_id is None:
+        direction_id = select(func.min(RouteStop.direction_id)).where(RouteStop.route_id == route_id).scalar_subquery()
+    return db.query(Stop).join(RouteStop, RouteStop.stop_id == Stop.id).filter(
+        RouteStop.route_id == route_id,
+        RouteStop.direction_id == direction_id
+    ).order_by(RouteStop.stop_sequence, Stop.id).all()
+
+
+# Route topology
+def load_topology(db: Session):
+    route_topology.load(
+        db.execute(select(RouteStop.route_id, RouteStop.direction_id, RouteStop.stop_id, RouteStop.stop_sequence)),
+        db.execute(select(Incident.id, Incident.route_id, Incident.stop_id).where(Incident.status.in_(OPEN_STATUSES)))
+    )
+    return route_topology.stats()
+
+
+def get_affecting_incidents(db: Session, stop_id: int):
+    # Returns (incident, stops_away) pairs; the topology picks the ids, one primary-key query loads them
+    if route_topology.loaded_at is None:
+        load_topology(db)
+    affecting = route_topology.affecting(stop_id)
+    if not affecting:
+        return []
+    incidents = db.query(Incident).filter(
+        Incident.id.in_(affecting),
+        Incident.status.in_(OPEN_STATUSES)
+    ).all()
+    # Closest first; route-wide incidents (unknown position) last, newest first within a distance
+    incidents.sort(key=lambda incident: (
+        affecting[incident.id] is None, affecting[incident.id] or 0, -incident.reported_at.timestamp()
+    ))
+    return [(incident, affecting[incident.id]) for incident in incidents]
 
 
 # Stop operations
@@ -59,91 +211,578 @@ def get_stop(db: Session, stop_id: int):
     return db.query(Stop).filter(Stop.id == stop_id).first()
 
 
-def get_stops_with_incident_counts(db: Session):
-    return db.query(
+def get_stops_with_incident_counts(db: Session, skip: int = 0, limit: int = 100, after_id: int = None):
+    query = db.query(
         Stop,
-        func.count(Incident.id).label('nearby_incidents')
+        func.coalesce(StopIncidentCounter.active_incidents, 0).label('nearby_incidents')
     ).outerjoin(
-        Incident,
-        (Incident.stop_id == Stop.id) & (Incident.status == 'active')
-    ).group_by(Stop.id).all()
+        StopIncidentCounter,
+        StopIncidentCounter.stop_id == Stop.id
+    )
+    if after_id is not None:
+        query = query.filter(Stop.id > after_id)
+    return query.order_by(Stop.id).offset(skip).limit(limit).all()
+
+
+def rebuild_stop_index(db: Session):
+    stop_index.rebuild(db.query(Stop.id, Stop.latitude, Stop.longitude).all())
+    return len(stop_index)
+
+
+def get_stops_nearby(db: Session, latitude: float, longitude: float, radius_m: float, limit: int = 50):
+    if not stop_index.loaded:
+        rebuild_stop_index(db)
+
+    matches = stop_index.query_radius(latitude, longitude, radius_m, limit)
+    if not matches:
+        return []
+
+    stop_ids = [stop_id for stop_id, _ in matches]
+    stops = {stop.id: stop for stop in db.query(Stop).filter(Stop.id.in_(stop_ids)).all()}
+
+    incidents_by_stop = {stop_id: [] for stop_id in stop_ids}
+    active_incidents = db.query(Incident).filter(
+        Incident.stop_id.in_(stop_ids),
+        Incident.status == 'active'
+    ).order_by(Incident.reported_at.desc()).all()
+    for incident in active_incidents:
+        incidents_by_stop[incident.stop_id].append(incident)
+
+    return [
+        (stops[stop_id], distance, incidents_by_stop[stop_id])
+        for stop_id, distance in matches
+        if stop_id in stops
+    ]
+
+
+# Active-incident counters
+def _adjust_counter(db: Session, model, key_column, key: int, delta: int):
+    if key is None or delta == 0:
+        return
+    updated = db.query(model).filter(key_column == key).update(
+        {model.active_incidents: model.active_incidents + delta},
+        synchronize_session=False
+    )
+    if not updated:
+        db.execute(insert(model).values({key_column.key: key, "active_incidents": max(delta, 0)}))
+
+
+def adjust_active_counters(db: Session, route_id: int, stop_id: int, delta: int):
+    # Runs inside the caller's transaction so counters commit together with the incident change
+    _adjust_counter(db, RouteIncidentCounter, RouteIncidentCounter.route_id, route_id, delta)
+    _adjust_counter(db, StopIncidentCounter, StopIncidentCounter.stop_id, stop_id, delta)
+
+
+def _apply_counter_deltas(db: Session, route_deltas: Counter, stop_deltas: Counter):
+    # One executemany upsert per counter table for a whole batch of incident changes
+    insert_for_dialect = dialect_insert(db)
+    for model, key_column, deltas in (
+            (RouteIncidentCounter, RouteIncidentCounter.route_id, route_deltas),
+            (StopIncidentCounter, StopIncidentCounter.stop_id, stop_deltas),
+    ):
+        deltas = {key: delta for key, delta in deltas.items() if key is not None and delta}
+        if not deltas:
+            continue
+        if insert_for_dialect is None:
+            for key, delta in deltas.items():
+                _adjust_counter(db, model, key_column, key, delta)
+            continue
+        table = model.__table__
+        statement = insert_for_dialect(table).values(
+            {key_column.key: bindparam("key"), "active_incidents": bindparam("initial")}
+        ).on_conflict_do_update(
+            index_elements=[key_column.key],
+            set_={"active_incidents": table.c.active_incidents + bindparam("delta")}
+        )
+        db.execute(statement, [
+            {"key": key, "initial": max(delta, 0), "delta": delta} for key, delta in deltas.items()
+        ])
+
+
+def _active_delta(old_status: str, new_status: str):
+    return int(new_status == "active") - int(old_status == "active")
+
+
+def _count_active_incidents(db: Session, key_column):
+    return dict(
+        db.query(key_column, func.count(Incident.id))
+        .filter(Incident.status == 'active', key_column.isnot(None))
+        .group_by(key_column)
+        .all()
+    )
+
+
+def rebuild_incident_counters(db: Session):
+    route_counts = _count_active_incidents(db, Incident.route_id)
+    stop_counts = _count_active_incidents(db, Incident.stop_id)
+
+    db.query(RouteIncidentCounter).delete()
+    db.query(StopIncidentCounter).delete()
+    if route_counts:
+        db.execute(insert(RouteIncidentCounter), [
+            {"route_id": route_id, "active_incidents": count} for route_id, count in route_counts.items()
+        ])
+    if stop_counts:
+        db.execute(insert(StopIncidentCounter), [
+            {"stop_id": stop_id, "active_incidents": count} for stop_id, count in stop_counts.items()
+        ])
+    db.commit()
+
+
+def check_incident_counters(db: Session):
+    # Compare the materialized counters against the incidents table; returns the mismatches
+    mismatches = []
+    for scope, model, key_column, incident_column in (
+            ("route", RouteIncidentCounter, RouteIncidentCounter.route_id, Incident.route_id),
+            ("stop", StopIncidentCounter, StopIncidentCounter.stop_id, Incident.stop_id),
+    ):
+        expected = _count_active_incidents(db, incident_column)
+        stored = dict(db.query(key_column, model.active_incidents).all())
+        for key in sorted(set(expected) | set(stored)):
+            if expected.get(key, 0) != stored.get(key, 0):
+                mismatches.append({
+                    "scope": scope,
+                    "id": key,
+                    "stored": stored.get(key, 0),
+                    "expected": expected.get(key, 0)
+                })
+    return mismatches
+
+
+def ensure_incident_counters(db: Session):
+    # Bootstrap counters on databases created before they existed
+    has_counters = db.query(RouteIncidentCounter.route_id).first() is not None
+    if not has_counters and db.query(Incident.id).filter(Incident.status == 'active').first():
+        rebuild_incident_counters(db)
+
+
+# In-memory state kept in step with committed incident changes
+def _publish_incident_event(event_type: str, incident: Incident, **extra):
+    if broker.has_subscribers():
+        data = {"incident": IncidentResponse.model_validate(incident).model_dump(mode="json"), **extra}
+        broker.publish(event_type, incident.route_id, incident.stop_id, data)
+
+
+def _on_incident_created(incident: Incident):
+    stats_snapshot.record_created(incident.incident_type, incident.severity, incident.status)
+    if incident.status in OPEN_STATUSES:
+        recent_incidents.add(
+            incident.id, incident.route_id, incident.stop_id, incident.incident_type,
+            incident.title, incident.reporter_id, incident.reported_at
+        )
+        route_topology.add_incident(incident.id, incident.route_id, incident.stop_id)
+    delay_rollups.record(
+        incident.reported_at, incident.route_id, incident.stop_id,
+        incident.incident_type, incident.severity, incident.delay_minutes
+    )
+    response_cache.bump("incidents", "routes", "stops", "stats", "analytics")
+    _publish_incident_event("incident_created", incident)
+
+
+def _on_points_changed(awards):
+    # awards maps user id -> points added in the committed transaction
+    for user_id, points in awards.items():
+        user_cache.invalidate(user_id)
+        leaderboard.award(user_id, points)
+    response_cache.bump("users")
+
+
+def _on_incident_updated():
+    # Verification/dispute counts changed without a status change
+    response_cache.bump("incidents")
+
+
+def _on_incident_status_changed(incident: Incident, old_status: str):
+    if old_status == incident.status:
+        return
+    stats_snapshot.record_status_change(incident.incident_type, incident.severity, old_status, incident.status)
+    if incident.status not in OPEN_STATUSES:
+        recent_incidents.remove(incident.id)
+        route_topology.remove_incident(incident.id)
+    elif old_status not in OPEN_STATUSES:
+        route_topology.add_incident(incident.id, incident.route_id, incident.stop_id)
+    response_cache.bump("incidents", "routes", "stops", "stats")
+    _publish_incident_event("incident_status_changed", incident, old_status=old_status)
+
+
+# Duplicate reports
+def load_recent_incidents(db: Session, now: datetime = None):
+    now = now or datetime.utcnow()
+    recent_incidents.clear()
+    rows = db.execute(
+        select(
+            Incident.id, Incident.route_id, Incident.stop_id, Incident.incident_type,
+            Incident.title, Incident.reporter_id, Incident.reported_at
+        ).where(
+            Incident.status.in_(OPEN_STATUSES),
+            Incident.reported_at >= now - recent_incidents.window
+        )
+    )
+    for row in rows:
+        recent_incidents.add(*row, now=now)
+    return len(recent_incidents)
+
+
+def _merge_duplicate_report(db: Session, incident: IncidentCreate):
+    # Returns the open incident the report was merged into, or None if it should be created
+    match = recent_incidents.find(incident.route_id, incident.stop_id, incident.incident_type, incident.title)
+    if match is None:
+        return None
+    incident_id, original_reporter_id = match
+
+    if incident.reporter_id != original_reporter_id:
+        # Counts as a confirmation: verification points instead of report points
+        create_verification(db, VerificationCreate(
+            incident_id=incident_id,
+            user_id=incident.reporter_id,
+            is_verified=True,
+            comment=f"Duplicate report: {incident.title}"
+        ))
+    # A reporter repeating their own report, or confirming twice, changes nothing
+    existing = db.get(Incident, incident_id, populate_existing=True)
+    if existing is None or existing.status not in OPEN_STATUSES:
+        recent_incidents.remove(incident_id)
+        return None
+    recent_incidents.touch(incident_id)
+    return existing
 
 
 # Incident operations
-def create_incident(db: Session, incident: IncidentCreate):
+def create_incident(db: Session, incident: IncidentCreate, dedup: bool = None):
+    # Returns (incident, merged); merged is True when the report was folded into an existing incident
+    if config.DEDUP_ENABLED if dedup is None else dedup:
+        existing = _merge_duplicate_report(db, incident)
+        if existing is not None:
+            return existing, True
+
     db_incident = Incident(**incident.model_dump())
     db.add(db_incident)
+    adjust_active_counters(db, incident.route_id, incident.stop_id, 1)
+
+    # Award points to reporter in the same transaction
+    _award_points(db, incident.reporter_id, REPORT_POINTS)
+
+    db.commit()
+    _on_points_changed({incident.reporter_id: REPORT_POINTS})
+    _on_incident_created(db_incident)
+    return db_incident, False
+
+
+def _existing_ids(db: Session, id_column, ids: set):
+    if not ids:
+        return set()
+    return set(db.scalars(select(id_column).where(id_column.in_(ids))))
+
+
+def _insert_incidents(db: Session, rows: List[dict]):
+    # Returns the new incidents in the order of rows
+    if db.get_bind().dialect.name != "sqlite":
+        # PostgreSQL sorts RETURNING rows by parameter order within a few multi-row INSERTs
+        return list(db.scalars(insert(Incident).returning(Incident, sort_by_parameter_order=True), rows))
+    # SQLite has no sentinel column for that and would fall back to one INSERT per row. The
+    # caller has already written in this transaction, so it holds the write lock: every id past
+    # the current maximum belongs to these rows, assigned in order by a single executemany.
+    last_id = db.scalar(select(func.max(Incident.id))) or 0
+    # Core insert: the ORM bulk path would split rows into separate statements by which values are None
+    db.execute(insert(Incident.__table__), rows)
+    return db.scalars(select(Incident).where(Incident.id > last_id).order_by(Incident.id)).all()
+
+
+def create_incidents_batch(db: Session, incidents: List[IncidentCreate]):
+    # Validate references with one IN query per table instead of three lookups per report
+    routes = _existing_ids(db, Route.id, {incident.route_id for incident in incidents})
+    stops = _existing_ids(db, Stop.id, {incident.stop_id for incident in incidents if incident.stop_id})
+    users = _existing_ids(db, User.id, {incident.reporter_id for incident in incidents})
+
+    results = [None] * len(incidents)
+    valid = []
+    for index, incident in enumerate(incidents):
+        if incident.route_id not in routes:
+            results[index] = (None, "Route not found")
+        elif incident.stop_id and incident.stop_id not in stops:
+            results[index] = (None, "Stop not found")
+        elif incident.reporter_id not in users:
+            results[index] = (None, "User not found")
+        else:
+            valid.append(index)
+
+    if not valid:
+        return results
+
+    rows = [incidents[index].model_dump() for index in valid]
+
+    # One executemany UPDATE with the summed award per reporter
+    points = Counter()
+    for row in rows:
+        points[row["reporter_id"]] += REPORT_POINTS
+    users_table = User.__table__
+    db.execute(
+        update(users_table)
+        .where(users_table.c.id == bindparam("reporter"))
+        .values(points=users_table.c.points + bindparam("award")),
+        [{"reporter": user_id, "award": award} for user_id, award in points.items()]
+    )
+    _apply_counter_deltas(
+        db,
+        Counter(row["route_id"] for row in rows),
+        Counter(row["stop_id"] for row in rows if row["stop_id"])
+    )
+    created = _insert_incidents(db, rows)
+
     db.commit()
-    db.refresh(db_incident)
+    _on_points_changed(points)
 
-    # Award points to reporter
-    update_user_points(db, incident.reporter_id, 10)
+    for index, db_incident in zip(valid, created):
+        results[index] = (db_incident, None)
+        _on_incident_created(db_incident)
+    return results
 
-    return db_incident
 
+def _with_expansions(query, expand, expansions=INCIDENT_EXPANSIONS):
+    # One extra SELECT ... IN per expanded relationship, however many incidents are returned
+    return query.options(*(selectinload(expansions[name]) for name in expand))
 
-def get_incidents(db: Session, skip: int = 0, limit: int = 100, status: str = None):
-    query = db.query(Incident)
+
+def _incident_list_query(db: Session, model, expansions, status: str, after: tuple, expand: tuple):
+    query = _with_expansions(db.query(model), expand, expansions)
     if status:
-        query = query.filter(Incident.status == status)
-    return query.order_by(Incident.reported_at.desc()).offset(skip).limit(limit).all()
+        query = query.filter(model.status == status)
+    if after is not None:
+        # Keyset pagination: continue strictly after the last (reported_at, id) seen
+        reported_at, incident_id = after
+        query = query.filter(or_(
+            model.reported_at < reported_at,
+            and_(model.reported_at == reported_at, model.id < incident_id)
+        ))
+    return query.order_by(model.reported_at.desc(), model.id.desc())
+
+
+def get_incidents(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        status: str = None,
+        after: tuple = None,
+        expand: tuple = (),
+        include_archived: bool = False
+):
+    query = _incident_list_query(db, Incident, INCIDENT_EXPANSIONS, status, after, expand)
+    if not include_archived:
+        return query.offset(skip).limit(limit).all()
+
+    # Both tables return rows in page order, so the first skip + limit of each cover the merged page
+    archived = _incident_list_query(db, ArchivedIncident, ARCHIVED_INCIDENT_EXPANSIONS, status, after, expand)
+    merged = heapq.merge(
+        query.limit(skip + limit).all(),
+        archived.limit(skip + limit).all(),
+        key=lambda incident: (incident.reported_at, incident.id),
+        reverse=True
+    )
+    return list(islice(merged, skip, skip + limit))
 
 
 def get_incident(db: Session, incident_id: int):
     return db.query(Incident).filter(Incident.id == incident_id).first()
 
 
+def get_incident_detail(db: Session, incident_id: int):
+    # Load the relationships IncidentDetailResponse serializes in the same query
+    return db.query(Incident).options(
+        joinedload(Incident.route),
+        joinedload(Incident.stop),
+        joinedload(Incident.reporter)
+    ).filter(Incident.id == incident_id).first()
+
+
 def update_incident_status(db: Session, incident_id: int, status: str):
-    incident = get_incident(db, incident_id)
-    if incident:
-        incident.status = status
+    # Compare-and-set on the status that was read: when another writer changed it in between,
+    # the UPDATE matches no row and the change is retried from the new status, so two
+    # concurrent transitions never both apply a counter delta
+    while True:
+        incident = db.get(Incident, incident_id, populate_existing=True)
+        if incident is None:
+            return None
+        old_status = incident.status
+        values = {"status": status}
         if status == "resolved":
-            incident.resolved_at = datetime.utcnow()
-        db.commit()
-        db.refresh(incident)
+            values["resolved_at"] = datetime.utcnow()
+        result = db.execute(
+            update(Incident).where(Incident.id == incident_id, Incident.status == old_status).values(values),
+            execution_options={"synchronize_session": False}
+        )
+        if result.rowcount:
+            break
+        db.rollback()
+
+    adjust_active_counters(db, incident.route_id, incident.stop_id, _active_delta(old_status, status))
+    db.commit()
+    db.refresh(incident)
+    _on_incident_status_changed(incident, old_status)
     return incident
 
 
-def get_incidents_by_route(db: Session, route_id: int):
-    return db.query(Incident).filter(
+def get_incidents_by_route(db: Session, route_id: int, expand: tuple = ()):
+    return _with_expansions(db.query(Incident), expand).filter(
         Incident.route_id == route_id,
         Incident.status == 'active'
     ).all()
 
 
+def search_incidents(
+        db: Session,
+        q: str,
+        limit: int = 20,
+        route_id: int = None,
+        status: str = None,
+        after: tuple = None
+):
+    # Returns (incident, rank) pairs, best match first; a lower rank is a better match
+    terms = parse_query(q)
+    if not terms:
+        return []
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        rank = incidents_fts.c.rank
+        query = select(Incident, rank).join(incidents_fts, incidents_fts.c.rowid == Incident.id).where(
+            incidents_fts.c.incidents_fts.op("MATCH")(fts5_match(terms))
+        )
+    elif dialect == "postgresql":
+        vector = literal_column("incidents.search_vector")
+        ts_query = func.to_tsquery("english", tsquery(terms))
+        # ts_rank_cd returns real; cast to double precision so the rank in the cursor (a Python
+        # float, sent as float8) compares equal to the value it was read from
+        rank = -cast(func.ts_rank_cd(vector, ts_query), Float(53))
+        query = select(Incident, rank).where(vector.op("@@")(ts_query))
+    else:
+        # No full-text index available: unranked substring match
+        rank = literal(0.0, Float)
+        query = select(Incident, rank).where(*(
+            or_(Incident.title.ilike(f"%{term}%"), Incident.description.ilike(f"%{term}%"))
+            for term, _ in terms
+        ))
+
+    if route_id is not None:
+        query = query.where(Incident.route_id == route_id)
+    if status:
+        query = query.where(Incident.status == status)
+    if after is not None:
+        # Keyset pagination on (rank, id)
+        after_rank, after_id = after
+        query = query.where(or_(rank > after_rank, and_(rank == after_rank, Incident.id > after_id)))
+    return db.execute(query.order_by(rank, Incident.id).limit(limit)).all()
+
+
+def _stream_export_rows(db: Session, model, start: datetime, end: datetime, chunk_size: int):
+    query = select(*(getattr(model, name) for name in EXPORT_COLUMNS))
+    if start is not None:
+        query = query.where(model.reported_at >= start)
+    if end is not None:
+        query = query.where(model.reported_at < end)
+    # yield_per streams from a server-side cursor where the driver supports one
+    result = db.execute(query.order_by(model.reported_at, model.id).execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        yield from partition
+
+
+def iter_incident_export(
+        db: Session,
+        start: datetime = None,
+        end: datetime = None,
+        include_archived: bool = False,
+        chunk_size: int = 1000
+):
+    # Yields lists of at most chunk_size rows in (reported_at, id) order; never holds more than a chunk per table
+    rows = _stream_export_rows(db, Incident, start, end, chunk_size)
+    if include_archived:
+        rows = heapq.merge(
+            rows,
+            _stream_export_rows(db, ArchivedIncident, start, end, chunk_size),
+            key=lambda row: (row.reported_at, row.id)
+        )
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
 # Verification operations
-def create_verification(db: Session, verification: VerificationCreate):
-    # Check if user already verified this incident
-    existing = db.query(Verification).filter(
-        Verification.incident_id == verification.incident_id,
-        Verification.user_id == verification.user_id
-    ).first()
+def _insert_verification(db: Session, verification: VerificationCreate):
+    # The unique (incident_id, user_id) index rejects duplicates; returns None for a repeat verification
+    values = verification.model_dump()
+    insert_for_dialect = dialect_insert(db)
+    if insert_for_dialect is not None:
+        statement = insert_for_dialect(Verification).values(**values).on_conflict_do_nothing(
+            index_elements=["incident_id", "user_id"]
+        ).returning(Verification)
+        return db.scalars(statement).first()
+
+    try:
+        with db.begin_nested():
+            db_verification = Verification(**values)
+            db.add(db_verification)
+        return db_verification
+    except IntegrityError:
+        return None
+
 
-    if existing:
+def create_verification(db: Session, verification: VerificationCreate):
+    db_verification = _insert_verification(db, verification)
+    if db_verification is None:
+        db.rollback()
         return None
 
-    db_verification = Verification(**verification.model_dump())
-    db.add(db_verification)
+    # Increment in SQL so concurrent verifications of one incident cannot overwrite each other
+    count_column = Incident.verification_count if verification.is_verified else Incident.dispute_count
+    counts = db.execute(
+        update(Incident)
+        .where(Incident.id == verification.incident_id)
+        .values({count_column: count_column + 1})
+        .returning(
+            Incident.verification_count, Incident.dispute_count, Incident.status, Incident.route_id, Incident.stop_id
+        ),
+        execution_options={"synchronize_session": False}
+    ).first()
+    if counts is None:
+        db.rollback()
+        return None
 
-    # Update incident counts
-    incident = get_incident(db, verification.incident_id)
-    if incident:
-        if verification.is_verified:
-            incident.verification_count += 1
-            # Award points for helpful verification
-            update_user_points(db, verification.user_id, 2)
+    verification_count, dispute_count, old_status, route_id, stop_id = counts
+    new_status = old_status
+    # Auto-verify if enough confirmations
+    if verification_count >= 3:
+        new_status = "verified"
+    # Auto-dispute if too many disputes
+    elif dispute_count >= 3:
+        new_status = "disputed"
+
+    if new_status != old_status:
+        # Conditional like update_incident_status: a status changed meanwhile is left alone
+        flipped = db.execute(
+            update(Incident)
+            .where(Incident.id == verification.incident_id, Incident.status == old_status)
+            .values(status=new_status),
+            execution_options={"synchronize_session": False}
+        ).rowcount
+        if flipped:
+            adjust_active_counters(db, route_id, stop_id, _active_delta(old_status, new_status))
         else:
-            incident.dispute_count += 1
+            new_status = old_status
 
-        # Auto-verify if enough confirmations
-        if incident.verification_count >= 3:
-            incident.status = "verified"
-        # Auto-dispute if too many disputes
-        elif incident.dispute_count >= 3:
-            incident.status = "disputed"
+    # Award points for helpful verification
+    if verification.is_verified:
+        _award_points(db, verification.user_id, VERIFICATION_POINTS)
 
     db.commit()
-    db.refresh(db_verification)
+    _on_incident_updated()
+    if verification.is_verified:
+        _on_points_changed({verification.user_id: VERIFICATION_POINTS})
+
+    if new_status != old_status:
+        # Reload so in-memory state sees the SQL-side changes; only needed on the rare status flip
+        incident = db.get(Incident, verification.incident_id, populate_existing=True)
+        _on_incident_status_changed(incident, old_status)
     return db_verification
 
 
@@ -151,26 +790,202 @@ def get_verifications_by_incident(db: Session, incident_id: int):
     return db.query(Verification).filter(Verification.incident_id == incident_id).all()
 
 
-# Statistics
-def get_incident_stats(db: Session):
-    total = db.query(func.count(Incident.id)).scalar()
-    active = db.query(func.count(Incident.id)).filter(Incident.status == 'active').scalar()
-    resolved = db.query(func.count(Incident.id)).filter(Incident.status == 'resolved').scalar()
+# Background maintenance
+UNRESOLVED_STATUSES = ("active", "verified", "disputed")
 
-    by_type = {}
-    type_stats = db.query(Incident.incident_type, func.count(Incident.id)).group_by(Incident.incident_type).all()
-    for incident_type, count in type_stats:
-        by_type[incident_type] = count
 
-    by_severity = {}
-    severity_stats = db.query(Incident.severity, func.count(Incident.id)).group_by(Incident.severity).all()
-    for severity, count in severity_stats:
-        by_severity[severity] = count
+def _rule_rank(key: str):
+    incident_type, _, severity = key.partition(":")
+    has_type = incident_type != "*"
+    has_severity = bool(severity) and severity != "*"
+    return (not has_type, not has_severity)
 
-    return {
-        "total_incidents": total,
-        "active_incidents": active,
-        "resolved_incidents": resolved,
-        "by_type": by_type,
-        "by_severity": by_severity
-    }
\ No newline at end of file
+
+def _resolve_cutoff(max_age_hours: dict, now: datetime):
+    # Per-row cutoff from the most specific matching rule ("type:severity" > "type" > "*:severity" > "*")
+    whens = []
+    default = None
+    for key, hours in sorted(max_age_hours.items(), key=lambda item: _rule_rank(item[0])):
+        cutoff = now - timedelta(hours=hours)
+        incident_type, _, severity = key.partition(":")
+        conditions = []
+        if incident_type != "*":
+            conditions.append(Incident.incident_type == incident_type)
+        if severity and severity != "*":
+            conditions.append(Incident.severity == severity)
+        if conditions:
+            whens.append((and_(*conditions), cutoff))
+        else:
+            default = cutoff
+    if not whens:
+        return literal(default, Incident.reported_at.type)
+    return case(*whens, else_=literal(default, Incident.reported_at.type))
+
+
+def auto_resolve_stale_incidents(
+        db: Session,
+        max_age_hours: dict,
+        batch_size: int = 500,
+        max_batches: int = 100,
+        now: datetime = None
+):
+    # Commits per batch so no single transaction holds the write lock for long
+    now = now or datetime.utcnow()
+    cutoff = _resolve_cutoff(max_age_hours, now)
+    resolved = batches = 0
+
+    while batches < max_batches:
+        ids = db.scalars(
+            select(Incident.id)
+            .where(Incident.status.in_(UNRESOLVED_STATUSES), Incident.reported_at < cutoff)
+            .order_by(Incident.reported_at)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+
+        # One conditional UPDATE per prior status, so deltas come from the rows actually changed
+        # and their status at that moment; rows another worker or a manual change got to first
+        # match nothing
+        changes = []
+        route_deltas = Counter()
+        stop_deltas = Counter()
+        for old_status in UNRESOLVED_STATUSES:
+            incidents = db.scalars(
+                update(Incident)
+                .where(Incident.id.in_(ids), Incident.status == old_status)
+                .values(status="resolved", resolved_at=now)
+                .returning(Incident),
+                execution_options={"synchronize_session": "fetch"}
+            ).all()
+            for incident in incidents:
+                if old_status == "active":
+                    route_deltas[incident.route_id] -= 1
+                    if incident.stop_id:
+                        stop_deltas[incident.stop_id] -= 1
+                changes.append((incident, old_status))
+        _apply_counter_deltas(db, route_deltas, stop_deltas)
+        db.commit()
+
+        for incident, old_status in changes:
+            _on_incident_status_changed(incident, old_status)
+        resolved += len(changes)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+
+    return {"resolved": resolved, "batches": batches}
+
+
+# Archival: resolved incidents leave the hot tables once they are old enough
+def _on_incidents_archived(groups):
+    for incident_type, severity, count in groups:
+        stats_snapshot.record_removed(incident_type, severity, "resolved", count)
+        archive_snapshot.record_created(incident_type, severity, "resolved", count)
+    response_cache.bump("incidents", "stats")
+
+
+def archive_resolved_incidents(
+        db: Session,
+        older_than_days: float,
+        batch_size: int = 1000,
+        max_batches: int = 100,
+        now: datetime = None
+):
+    # Each batch is copied and deleted in one transaction, so a row is never in both tables
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=older_than_days)
+    incident_columns = [column.name for column in Incident.__table__.columns]
+    verification_columns = [column.name for column in Verification.__table__.columns]
+    archived = batches = 0
+
+    while batches < max_batches:
+        ids = db.scalars(
+            select(Incident.id)
+            .where(Incident.status == "resolved", Incident.resolved_at < cutoff)
+            .order_by(Incident.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+
+        groups = db.execute(
+            select(Incident.incident_type, Incident.severity, func.count())
+            .where(Incident.id.in_(ids))
+            .group_by(Incident.incident_type, Incident.severity)
+        ).all()
+        db.execute(insert(ArchivedIncident).from_select(
+            [*incident_columns, "archived_at"],
+            select(*Incident.__table__.columns, literal(now, DateTime)).where(Incident.id.in_(ids))
+        ))
+        db.execute(insert(ArchivedVerification).from_select(
+            verification_columns,
+            select(*Verification.__table__.columns).where(Verification.incident_id.in_(ids))
+        ))
+        db.execute(delete(Verification.__table__).where(Verification.incident_id.in_(ids)))
+        db.execute(delete(Incident.__table__).where(Incident.id.in_(ids)))
+        db.commit()
+
+        _on_incidents_archived(groups)
+        archived += len(ids)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+
+    return {"archived": archived, "batches": batches}
+
+
+# Delay analytics
+def _hour_bucket(db: Session, column):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc("hour", column)
+    return func.strftime("%Y-%m-%d %H:00:00", column)
+
+
+def _delay_rollup_groups(db: Session, model):
+    hour = _hour_bucket(db, model.reported_at)
+    columns = (hour, model.route_id, model.stop_id, model.incident_type, model.severity, model.delay_minutes)
+    for row in db.execute(select(*columns, func.count()).group_by(*columns)):
+        # SQLite returns the truncated hour as text
+        reported_hour = datetime.fromisoformat(row[0]) if isinstance(row[0], str) else row[0]
+        yield (reported_hour, *row[1:])
+
+
+def load_delay_rollups(db: Session):
+    # Archived incidents keep counting towards historical analytics
+    delay_rollups.load([*_delay_rollup_groups(db, Incident), *_delay_rollup_groups(db, ArchivedIncident)])
+    response_cache.bump("analytics")
+    return len(delay_rollups)
+
+
+def get_delay_analytics(db: Session, start: datetime, end: datetime, bucket: str = "hour",
+                        route_id: int = None, stop_id: int = None):
+    if delay_rollups.loaded_at is None:
+        load_delay_rollups(db)
+    return delay_rollups.query(start, end, bucket, route_id, stop_id)
+
+
+# Statistics
+def _incident_stat_groups(db: Session, model=Incident):
+    # One pass over incidents; every /stats figure is derived from these few groups
+    return db.query(
+        model.incident_type,
+        model.severity,
+        model.status,
+        func.count(model.id)
+    ).group_by(model.incident_type, model.severity, model.status).all()
+
+
+def get_incident_stats(db: Session, include_archived: bool = False):
+    if config.STATS_MODE == "snapshot":
+        if stats_snapshot.is_stale(config.STATS_SNAPSHOT_MAX_AGE_SECONDS):
+            stats_snapshot.load(_incident_stat_groups(db))
+        rows = stats_snapshot.rows()
+    else:
+        rows = _incident_stat_groups(db)
+
+    if include_archived:
+        if archive_snapshot.is_stale(config.STATS_SNAPSHOT_MAX_AGE_SECONDS):
+            archive_snapshot.load(_incident_stat_groups(db, ArchivedIncident))
+        rows = [*rows, *archive_snapshot.rows()]
+    return summarize(rows)
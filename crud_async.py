@@ -0,0 +1,91 @@
+from datetime import datetime
+from typing import Callable, List, Optional, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+import crud
+from database import DbSession, Incident
+from schemas import IncidentCreate, RouteResponse, StopResponse, UserResponse
+
+T = TypeVar("T")
+
+
+async def run(db: DbSession, func: Callable[..., T], *args, **kwargs) -> T:
+    """Call ``func(session, *args, **kwargs)`` off the event loop and return its result.
+
+    With an AsyncSession the sync implementation runs through ``run_sync``, so SQL is issued
+    on the async driver and both modes share one implementation. With a plain Session the
+    call is offloaded to the thread pool. A handler needing several crud calls should make
+    them in one function passed here, so it pays for a single hop.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(func, *args, **kwargs)
+    return await run_in_threadpool(func, db, *args, **kwargs)
+
+
+# Async versions of the crud functions the endpoints call on their own
+async def get_leaderboard(db: DbSession, limit: int = 10, offset: int = 0) -> dict:
+    return await run(db, crud.get_leaderboard, limit, offset)
+
+
+async def get_leaderboard_around(db: DbSession, user_id: int, limit: int = 10) -> Optional[dict]:
+    return await run(db, crud.get_leaderboard_around, user_id, limit)
+
+
+async def get_user_cached(db: DbSession, user_id: int) -> Optional[UserResponse]:
+    return await run(db, crud.get_user_cached, user_id)
+
+
+async def get_route_cached(db: DbSession, route_id: int) -> Optional[RouteResponse]:
+    return await run(db, crud.get_route_cached, route_id)
+
+
+async def get_stop_cached(db: DbSession, stop_id: int) -> Optional[StopResponse]:
+    return await run(db, crud.get_stop_cached, stop_id)
+
+
+async def get_routes_with_incident_counts(db: DbSession, skip: int = 0, limit: int = 100,
+                                          after_id: int = None) -> list:
+    return await run(db, crud.get_routes_with_incident_counts, skip, limit, after_id)
+
+
+async def get_stops_with_incident_counts(db: DbSession, skip: int = 0, limit: int = 100,
+                                         after_id: int = None) -> list:
+    return await run(db, crud.get_stops_with_incident_counts, skip, limit, after_id)
+
+
+async def get_stops_nearby(db: DbSession, latitude: float, longitude: float, radius_m: float,
+                           limit: int = 50) -> list:
+    return await run(db, crud.get_stops_nearby, latitude, longitude, radius_m, limit)
+
+
+async def get_incidents(db: DbSession, skip: int = 0, limit: int = 100, status: str = None, after: tuple = None,
+                        expand: tuple = (), include_archived: bool = False) -> list:
+    return await run(db, crud.get_incidents, skip, limit, status, after, expand, include_archived)
+
+
+async def get_incident_detail(db: DbSession, incident_id: int) -> Optional[Incident]:
+    return await run(db, crud.get_incident_detail, incident_id)
+
+
+async def create_incidents_batch(db: DbSession, incidents: List[IncidentCreate]) -> list:
+    return await run(db, crud.create_incidents_batch, incidents)
+
+
+async def update_incident_status(db: DbSession, incident_id: int, status: str) -> Optional[Incident]:
+    return await run(db, crud.update_incident_status, incident_id, status)
+
+
+async def search_incidents(db: DbSession, q: str, limit: int = 20, route_id: int = None, status: str = None,
+                           after: tuple = None) -> list:
+    return await run(db, crud.search_incidents, q, limit, route_id, status, after)
+
+
+async def get_delay_analytics(db: DbSession, start: datetime, end: datetime, bucket: str = "hour",
+                              route_id: int = None, stop_id: int = None) -> dict:
+    return await run(db, crud.get_delay_analytics, start, end, bucket, route_id, stop_id)
+
+
+async def get_incident_stats(db: DbSession, include_archived: bool = False) -> dict:
+    return await run(db, crud.get_incident_stats, include_archived)
@@ -1,14 +1,74 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import (
+    create_engine, event, inspect, Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Index
+)
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import Session, sessionmaker, relationship
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from datetime import datetime
+from typing import Union
+from search import create_search_index
+from metrics import instrument_engine
+import config
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./delay_management.db"
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
+ASYNC_SQLALCHEMY_DATABASE_URL = config.ASYNC_DATABASE_URL
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _engine_options(url: str):
+    options = {}
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+        # In-memory databases use a single shared connection; pool sizing does not apply
+        if ":memory:" in url or url.rstrip("/").endswith(":"):
+            return options
+    options.update(
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+        pool_recycle=config.DB_POOL_RECYCLE,
+    )
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers proceed while a write is in progress; busy_timeout makes
+    # concurrent writers wait for the lock instead of failing with "database is locked"
+    cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size={config.SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options(SQLALCHEMY_DATABASE_URL))
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+if config.METRICS_ENABLED:
+    instrument_engine(engine)
+# Instances keep their values after commit; the write paths set every column they return
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Only created in async mode so the async driver stays an optional dependency
+async_engine = None
+AsyncSessionLocal = None
+if config.DB_MODE == "async":
+    async_options = _engine_options(ASYNC_SQLALCHEMY_DATABASE_URL)
+    if ASYNC_SQLALCHEMY_DATABASE_URL.startswith("sqlite") and "pool_size" in async_options:
+        # aiosqlite defaults to NullPool, which would reopen the file and rerun the pragmas per session
+        async_options["poolclass"] = AsyncAdaptedQueuePool
+    async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, **async_options)
+    if async_engine.dialect.name == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    if config.METRICS_ENABLED:
+        instrument_engine(async_engine.sync_engine)
+    # Objects must stay readable after commit: lazy refreshes cannot run outside the greenlet
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+DbSession = Union[Session, AsyncSession]
 
 Base = declarative_base()
 
@@ -24,6 +84,11 @@ class User(Base):
     incidents = relationship("Incident", back_populates="reporter")
     verifications = relationship("Verification", back_populates="user")
 
+    __table_args__ = (
+        # Leaderboard order; also lets the in-memory ranking load without sorting the table
+        Index("ix_users_points_id", "points", "id"),
+    )
+
 
 class Route(Base):
     __tablename__ = "routes"
@@ -32,9 +97,14 @@ class Route(Base):
     route_number = Column(String, unique=True, index=True)
     route_name = Column(String)
     transport_type = Column(String)  # bus, train, tram
+    gtfs_id = Column(String, nullable=True)  # route_id in the imported GTFS feed
 
     incidents = relationship("Incident", back_populates="route")
 
+    __table_args__ = (
+        Index("uq_routes_gtfs_id", "gtfs_id", unique=True),
+    )
+
 
 class Stop(Base):
     __tablename__ = "stops"
@@ -43,9 +113,29 @@ class Stop(Base):
     stop_name = Column(String, index=True)
     latitude = Column(Float)
     longitude = Column(Float)
+    gtfs_id = Column(String, nullable=True)  # stop_id in the imported GTFS feed
 
     incidents = relationship("Incident", back_populates="stop")
 
+    __table_args__ = (
+        Index("uq_stops_gtfs_id", "gtfs_id", unique=True),
+    )
+
+
+class RouteStop(Base):
+    __tablename__ = "route_stops"
+
+    # Stops served by a route in each direction of travel, derived from GTFS trips/stop_times;
+    # stop_sequence is the stop's position along that direction
+    route_id = Column(Integer, ForeignKey("routes.id"), primary_key=True)
+    direction_id = Column(Integer, primary_key=True, default=0)
+    stop_id = Column(Integer, ForeignKey("stops.id"), primary_key=True)
+    stop_sequence = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_route_stops_stop_id", "stop_id"),
+    )
+
 
 class Incident(Base):
     __tablename__ = "incidents"
@@ -73,6 +163,23 @@ class Incident(Base):
     reporter = relationship("User", back_populates="incidents")
     verifications = relationship("Verification", back_populates="incident")
 
+    __table_args__ = (
+        # get_incidents: filter by status, newest first (keyset on reported_at, id)
+        Index("ix_incidents_status_reported_at", "status", "reported_at", "id"),
+        Index("ix_incidents_reported_at_id", "reported_at", "id"),
+        # get_incidents_by_route and the active-incident counters
+        Index("ix_incidents_route_status", "route_id", "status"),
+        Index("ix_incidents_stop_status", "stop_id", "status"),
+        # /stats groups by these columns; the index lets it skip the table
+        Index("ix_incidents_type_severity_status", "incident_type", "severity", "status"),
+        # Never hand out an id again once its row is deleted: archived rows keep their ids
+        {"sqlite_autoincrement": True},
+    )
+
+
+# The full-text index lives outside the ORM models (FTS5 table or tsvector column per dialect)
+event.listen(Incident.__table__, "after_create", lambda target, connection, **kw: create_search_index(connection))
+
 
 class Verification(Base):
     __tablename__ = "verifications"
@@ -87,6 +194,94 @@ class Verification(Base):
     incident = relationship("Incident", back_populates="verifications")
     user = relationship("User", back_populates="verifications")
 
+    __table_args__ = (
+        # One verification per user per incident
+        Index("uq_verifications_incident_user", "incident_id", "user_id", unique=True),
+        {"sqlite_autoincrement": True},
+    )
+
+
+# Cold storage for resolved incidents moved out of the hot tables by archive_resolved_incidents.
+# Rows keep their original ids, so archived and hot incidents can be listed together.
+class ArchivedIncident(Base):
+    __tablename__ = "incidents_archive"
+
+    id = Column(Integer, primary_key=True)
+    title = Column(String)
+    description = Column(Text)
+    incident_type = Column(String)
+    severity = Column(String)
+    status = Column(String)
+
+    route_id = Column(Integer, ForeignKey("routes.id"))
+    stop_id = Column(Integer, ForeignKey("stops.id"), nullable=True)
+    reporter_id = Column(Integer, ForeignKey("users.id"))
+
+    delay_minutes = Column(Integer, nullable=True)
+    reported_at = Column(DateTime)
+    resolved_at = Column(DateTime, nullable=True)
+
+    verification_count = Column(Integer, default=0)
+    dispute_count = Column(Integer, default=0)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    route = relationship("Route", viewonly=True)
+    stop = relationship("Stop", viewonly=True)
+    reporter = relationship("User", viewonly=True)
+    verifications = relationship("ArchivedVerification", viewonly=True)
+
+    __table_args__ = (
+        Index("ix_incidents_archive_status_reported_at", "status", "reported_at", "id"),
+        Index("ix_incidents_archive_reported_at_id", "reported_at", "id"),
+        Index("ix_incidents_archive_type_severity_status", "incident_type", "severity", "status"),
+    )
+
+
+class ArchivedVerification(Base):
+    __tablename__ = "verifications_archive"
+
+    id = Column(Integer, primary_key=True)
+    incident_id = Column(Integer, ForeignKey("incidents_archive.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    is_verified = Column(Boolean)
+    comment = Column(String, nullable=True)
+    verified_at = Column(DateTime)
+
+
+class RouteIncidentCounter(Base):
+    __tablename__ = "route_incident_counters"
+
+    # Materialized count of active incidents, maintained by the crud write paths
+    route_id = Column(Integer, ForeignKey("routes.id"), primary_key=True)
+    active_incidents = Column(Integer, default=0, nullable=False)
+
+
+class StopIncidentCounter(Base):
+    __tablename__ = "stop_incident_counters"
+
+    stop_id = Column(Integer, ForeignKey("stops.id"), primary_key=True)
+    active_incidents = Column(Integer, default=0, nullable=False)
+
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    name = Column(String)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+
+def dialect_insert(db: Session):
+    # insert() with ON CONFLICT support for the session's dialect, or None if unsupported
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    return None
+
 
 def get_db():
     db = SessionLocal()
@@ -96,5 +291,19 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Request-scoped session dependency for the configured DB_MODE
+get_session = get_async_db if config.DB_MODE == "async" else get_db
+
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    from migrations import run_migrations
+
+    # create_all only adds missing tables; migrations bring existing tables up to date
+    fresh = not inspect(engine).has_table("incidents")
+    Base.metadata.create_all(bind=engine)
+    return run_migrations(engine, fresh=fresh)
\ No newline at end of file
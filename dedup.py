@@ -0,0 +1,123 @@
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import config
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def title_trigrams(title: str) -> FrozenSet[str]:
+    # Character trigrams of each normalized word, padded so short words still contribute
+    grams = set()
+    for word in _WORD.findall(title.lower()):
+        padded = f"  {word} "
+        grams.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _Entry:
+    __slots__ = ("incident_id", "reporter_id", "trigrams", "last_seen")
+
+    def __init__(self, incident_id: int, reporter_id: int, trigrams: FrozenSet[str], last_seen: datetime):
+        self.incident_id = incident_id
+        self.reporter_id = reporter_id
+        self.trigrams = trigrams
+        self.last_seen = last_seen
+
+
+class RecentIncidentIndex:
+    """Open incidents from the last few minutes, keyed by (route_id, stop_id, incident_type).
+
+    A lookup only looks at one key's entries, which are pruned to the time window and
+    capped in number, so matching a report costs O(1) regardless of table size. A match
+    refreshes the entry, so a cluster stays open while reports keep arriving.
+    """
+
+    def __init__(self, window: timedelta, min_similarity: float, max_per_key: int):
+        self.window = window
+        self.min_similarity = min_similarity
+        self.max_per_key = max_per_key
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[int, Optional[int], str], List[_Entry]] = {}
+        self._keys: Dict[int, Tuple[int, Optional[int], str]] = {}
+
+    def _prune(self, key, now: datetime):
+        entries = self._entries.get(key)
+        if not entries:
+            return []
+        cutoff = now - self.window
+        kept = [entry for entry in entries if entry.last_seen >= cutoff]
+        for entry in entries:
+            if entry.last_seen < cutoff:
+                self._keys.pop(entry.incident_id, None)
+        if kept:
+            self._entries[key] = kept
+        else:
+            del self._entries[key]
+        return kept
+
+    def add(self, incident_id: int, route_id: int, stop_id: Optional[int], incident_type: str,
+            title: str, reporter_id: int, reported_at: datetime, now: datetime = None):
+        key = (route_id, stop_id, incident_type)
+        with self._lock:
+            entries = self._prune(key, now or datetime.utcnow())
+            entries.append(_Entry(incident_id, reporter_id, title_trigrams(title), reported_at))
+            if len(entries) > self.max_per_key:
+                # Forget the least recently active incident of this key
+                entries.sort(key=lambda entry: entry.last_seen)
+                self._keys.pop(entries.pop(0).incident_id, None)
+            self._entries[key] = entries
+            self._keys[incident_id] = key
+
+    def remove(self, incident_id: int):
+        with self._lock:
+            key = self._keys.pop(incident_id, None)
+            if key is None:
+                return
+            entries = [entry for entry in self._entries.get(key, []) if entry.incident_id != incident_id]
+            if entries:
+                self._entries[key] = entries
+            else:
+                self._entries.pop(key, None)
+
+    def find(self, route_id: int, stop_id: Optional[int], incident_type: str, title: str,
+             now: datetime = None) -> Optional[Tuple[int, int]]:
+        """Return ``(incident_id, reporter_id)`` of the most similar open incident, if similar enough."""
+        trigrams = title_trigrams(title)
+        with self._lock:
+            entries = self._prune((route_id, stop_id, incident_type), now or datetime.utcnow())
+            best = None
+            best_score = self.min_similarity
+            for entry in entries:
+                score = similarity(trigrams, entry.trigrams)
+                if score >= best_score:
+                    best, best_score = entry, score
+            return (best.incident_id, best.reporter_id) if best else None
+
+    def touch(self, incident_id: int, now: datetime = None):
+        with self._lock:
+            key = self._keys.get(incident_id)
+            for entry in self._entries.get(key, ()):
+                if entry.incident_id == incident_id:
+                    entry.last_seen = now or datetime.utcnow()
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._keys = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+
+recent_incidents = RecentIncidentIndex(
+    timedelta(minutes=config.DEDUP_WINDOW_MINUTES), config.DEDUP_TITLE_SIMILARITY, config.DEDUP_MAX_PER_KEY
+)
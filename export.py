@@ -0,0 +1,121 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, List, Sequence
+
+# Column order of every export format
+EXPORT_COLUMNS = (
+    "id", "title", "description", "incident_type", "severity", "status",
+    "route_id", "stop_id", "reporter_id", "delay_minutes",
+    "reported_at", "resolved_at", "verification_count", "dispute_count",
+)
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _ndjson(chunks: Iterable[List[Sequence]]) -> Iterator[bytes]:
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, map(_jsonable, row))), ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+
+def _csv(chunks: Iterable[List[Sequence]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows([_jsonable(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _DrainableSink(io.RawIOBase):
+    # Write-only file that hands out what was written since the last drain() while still
+    # reporting the absolute position, which the Parquet footer offsets are based on
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _parquet(chunks: Iterable[List[Sequence]]) -> Iterator[bytes]:
+    # Requires the optional pyarrow package. Each chunk becomes one row group; the footer
+    # with the row group index is written when the last chunk has been sent.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()), ("title", pa.string()), ("description", pa.string()),
+        ("incident_type", pa.string()), ("severity", pa.string()), ("status", pa.string()),
+        ("route_id", pa.int64()), ("stop_id", pa.int64()), ("reporter_id", pa.int64()),
+        ("delay_minutes", pa.int64()),
+        ("reported_at", pa.timestamp("us")), ("resolved_at", pa.timestamp("us")),
+        ("verification_count", pa.int64()), ("dispute_count", pa.int64()),
+    ])
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for rows in chunks:
+        columns = list(zip(*rows))
+        arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema)]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {"ndjson": _ndjson, "csv": _csv, "parquet": _parquet}
+
+
+def gzip_stream(parts: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for part in parts:
+        data = compressor.compress(part)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def encode_export(export_format: str, chunks: Iterable[List[Sequence]], gzip: bool = False) -> Iterator[bytes]:
+    """Encode row chunks as they arrive; memory use is bounded by one chunk."""
+    parts = ENCODERS[export_format](chunks)
+    return gzip_stream(parts) if gzip else parts
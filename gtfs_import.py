@@ -0,0 +1,290 @@
+import argparse
+import csv
+import io
+import sys
+import time
+import zipfile
+from collections import Counter, defaultdict
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, insert, select, update, delete
+from sqlalchemy.orm import Session
+
+import crud
+from database import Route, RouteStop, SessionLocal, Stop, init_db
+
+BATCH_SIZE = 5000
+
+# GTFS route_type -> transport_type. Extended (Google) route types are grouped by hundreds.
+ROUTE_TYPES = {0: "tram", 1: "train", 2: "train", 3: "bus", 5: "tram", 7: "train", 11: "bus", 12: "train"}
+EXTENDED_ROUTE_TYPES = {1: "train", 2: "bus", 4: "train", 7: "bus", 8: "bus", 9: "tram"}
+
+# stops.txt location_type values that are boarding points (stations and entrances are skipped)
+STOP_LOCATION_TYPES = {"", "0"}
+
+
+class GtfsError(Exception):
+    pass
+
+
+def transport_type(route_type: str) -> str:
+    try:
+        code = int(route_type)
+    except ValueError:
+        return "bus"
+    if code >= 100:
+        return EXTENDED_ROUTE_TYPES.get(code // 100, "bus")
+    return ROUTE_TYPES.get(code, "bus")
+
+
+def _rows(feed: zipfile.ZipFile, name: str, columns: Tuple[str, ...]) -> Iterator[Tuple[str, ...]]:
+    # Streams one CSV member of the feed, yielding only the requested columns ("" when absent)
+    try:
+        raw = feed.open(name)
+    except KeyError:
+        raise GtfsError(f"Feed has no {name}")
+    with raw:
+        reader = csv.reader(io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""))
+        header = [column.strip() for column in next(reader, [])]
+        positions = [header.index(column) if column in header else None for column in columns]
+        width = len(header)
+        for record in reader:
+            if not record:
+                continue
+            if len(record) < width:
+                record += [""] * (width - len(record))
+            yield tuple(record[position].strip() if position is not None else "" for position in positions)
+
+
+def _batched(items: Iterable, size: int = BATCH_SIZE) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _write(db: Session, table, inserts: List[dict], updates: List[dict]):
+    # Bulk executemany statements; updates are keyed on the "_id" parameter
+    for batch in _batched(inserts):
+        db.execute(insert(table), batch)
+    if updates:
+        statement = update(table).where(table.c.id == bindparam("_id"))
+        for batch in _batched(updates):
+            db.execute(statement, batch)
+
+
+def _float(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def import_routes(db: Session, feed: zipfile.ZipFile):
+    existing = {
+        gtfs_id: (route_id, (number, name, kind))
+        for route_id, gtfs_id, number, name, kind in db.execute(
+            select(Route.id, Route.gtfs_id, Route.route_number, Route.route_name, Route.transport_type)
+        )
+        if gtfs_id is not None
+    }
+    numbers = dict(db.execute(select(Route.route_number, Route.gtfs_id)).all())
+    manual_ids = dict(db.execute(select(Route.route_number, Route.id).where(Route.gtfs_id.is_(None))).all())
+
+    inserts, updates, used_numbers = [], [], set()
+    for gtfs_id, short_name, long_name, description, route_type in _rows(
+            feed, "routes.txt", ("route_id", "route_short_name", "route_long_name", "route_desc", "route_type")):
+        if not gtfs_id:
+            continue
+        number = short_name or gtfs_id
+        # route_number is unique: keep the short name unless another route already uses it
+        if number in used_numbers or numbers.get(number, gtfs_id) not in (gtfs_id, None):
+            number = f"{number} ({gtfs_id})"
+        used_numbers.add(number)
+        values = (number, long_name or description or number, transport_type(route_type))
+        row = dict(zip(("route_number", "route_name", "transport_type"), values), gtfs_id=gtfs_id)
+
+        current = existing.get(gtfs_id)
+        if current is None and number in manual_ids:
+            # Adopt a route created by hand (e.g. seed data) with the same number
+            updates.append({**row, "_id": manual_ids.pop(number)})
+        elif current is None:
+            inserts.append(row)
+        elif current[1] != values:
+            updates.append({**row, "_id": current[0]})
+
+    _write(db, Route.__table__, inserts, updates)
+    ids = dict(db.execute(select(Route.gtfs_id, Route.id).where(Route.gtfs_id.is_not(None))).all())
+    return ids, {"inserted": len(inserts), "updated": len(updates)}
+
+
+def import_stops(db: Session, feed: zipfile.ZipFile):
+    existing = {
+        gtfs_id: (stop_id, (name, latitude, longitude))
+        for stop_id, gtfs_id, name, latitude, longitude in db.execute(
+            select(Stop.id, Stop.gtfs_id, Stop.stop_name, Stop.latitude, Stop.longitude).where(Stop.gtfs_id.is_not(None))
+        )
+    }
+
+    inserts, updates = [], []
+    for gtfs_id, name, latitude, longitude, location_type in _rows(
+            feed, "stops.txt", ("stop_id", "stop_name", "stop_lat", "stop_lon", "location_type")):
+        if not gtfs_id or location_type not in STOP_LOCATION_TYPES:
+            continue
+        values = (name, _float(latitude), _float(longitude))
+        row = {"stop_name": name, "latitude": values[1], "longitude": values[2], "gtfs_id": gtfs_id}
+        current = existing.get(gtfs_id)
+        if current is None:
+            inserts.append(row)
+        elif current[1] != values:
+            updates.append({**row, "_id": current[0]})
+
+    _write(db, Stop.__table__, inserts, updates)
+    ids = dict(db.execute(select(Stop.gtfs_id, Stop.id).where(Stop.gtfs_id.is_not(None))).all())
+    return ids, {"inserted": len(inserts), "updated": len(updates)}
+
+
+def _direction_numbers(keys: Set[str]) -> Dict[str, int]:
+    # GTFS direction_id values keep their number; shape-derived directions take the next free ones
+    numbers = {key: int(key) for key in keys if key.isdigit()}
+    free = max(numbers.values(), default=-1) + 1
+    for key in sorted(keys - numbers.keys()):
+        numbers[key] = free
+        free += 1
+    return numbers
+
+
+def import_route_stops(db: Session, feed: zipfile.ZipFile, route_ids: Dict[str, int], stop_ids: Dict[str, int]):
+    # One stop pattern per route and direction, taken from the direction's longest trip. Merging the
+    # trips of both directions into one order would interleave them (A, D, B, C for A-B-C-D and back).
+    trip_groups: Dict[str, Tuple[int, str]] = {}
+    for trip_id, gtfs_route_id, direction, shape_id in _rows(
+            feed, "trips.txt", ("trip_id", "route_id", "direction_id", "shape_id")):
+        route_id = route_ids.get(gtfs_route_id)
+        if route_id is not None:
+            # direction_id is optional in GTFS; without it each shape counts as a direction
+            trip_groups[trip_id] = (route_id, direction or f"shape:{shape_id}")
+
+    # Two passes over stop_times.txt so only the chosen trips' stops are ever held in memory
+    trip_lengths = Counter(
+        row[0] for row in _rows(feed, "stop_times.txt", ("trip_id",)) if row[0] in trip_groups
+    )
+    longest: Dict[Tuple[int, str], str] = {}
+    # Sorted by trip_id so ties always pick the same trip
+    for trip_id, length in sorted(trip_lengths.items()):
+        group = trip_groups[trip_id]
+        if group not in longest or length > trip_lengths[longest[group]]:
+            longest[group] = trip_id
+    representative = {trip_id: group for group, trip_id in longest.items()}
+
+    trip_stops = defaultdict(list)
+    for trip_id, gtfs_stop_id, sequence in _rows(feed, "stop_times.txt", ("trip_id", "stop_id", "stop_sequence")):
+        stop_id = stop_ids.get(gtfs_stop_id)
+        if trip_id in representative and stop_id is not None:
+            trip_stops[trip_id].append((int(sequence) if sequence.isdigit() else 0, stop_id))
+
+    directions = defaultdict(set)
+    for route_id, key in longest:
+        directions[route_id].add(key)
+    direction_numbers = {route_id: _direction_numbers(keys) for route_id, keys in directions.items()}
+
+    memberships: Dict[Tuple[int, int, int], int] = {}  # (route_id, direction_id, stop_id) -> position
+    for trip_id, stops in trip_stops.items():
+        route_id, key = representative[trip_id]
+        direction_id = direction_numbers[route_id][key]
+        position = 0
+        for _, stop_id in sorted(stops):
+            # A loop visits its first stop again at the end; the stop keeps its first position
+            if (route_id, direction_id, stop_id) not in memberships:
+                memberships[route_id, direction_id, stop_id] = position
+                position += 1
+
+    feed_routes = set(route_ids.values())
+    existing = {
+        (route_id, direction_id, stop_id): sequence
+        for route_id, direction_id, stop_id, sequence in db.execute(
+            select(RouteStop.route_id, RouteStop.direction_id, RouteStop.stop_id, RouteStop.stop_sequence)
+        )
+        if route_id in feed_routes
+    }
+    inserts = [
+        {"route_id": route_id, "direction_id": direction_id, "stop_id": stop_id, "stop_sequence": sequence}
+        for (route_id, direction_id, stop_id), sequence in memberships.items()
+        if (route_id, direction_id, stop_id) not in existing
+    ]
+    updates = [
+        {"_route_id": route_id, "_direction_id": direction_id, "_stop_id": stop_id, "stop_sequence": sequence}
+        for (route_id, direction_id, stop_id), sequence in memberships.items()
+        if existing.get((route_id, direction_id, stop_id), sequence) != sequence
+    ]
+    # Stops a feed route no longer serves in that direction
+    deletes = [
+        {"_route_id": route_id, "_direction_id": direction_id, "_stop_id": stop_id}
+        for route_id, direction_id, stop_id in existing.keys() - memberships.keys()
+    ]
+
+    table = RouteStop.__table__
+    key = (
+        (table.c.route_id == bindparam("_route_id"))
+        & (table.c.direction_id == bindparam("_direction_id"))
+        & (table.c.stop_id == bindparam("_stop_id"))
+    )
+    for batch in _batched(inserts):
+        db.execute(insert(table), batch)
+    for batch in _batched(updates):
+        db.execute(update(table).where(key), batch)
+    for batch in _batched(deletes):
+        db.execute(delete(table).where(key), batch)
+    return {"inserted": len(inserts), "updated": len(updates), "deleted": len(deletes)}
+
+
+def import_feed(db: Session, path: str):
+    """Upsert routes, stops and route membership from a GTFS static feed zip.
+
+    Rows are matched on their GTFS ids, so re-importing the same feed writes nothing and a
+    newer feed only writes what changed. Routes and stops missing from the feed are kept,
+    since incidents may reference them. The whole import is one transaction.
+    """
+    with zipfile.ZipFile(path) as feed:
+        try:
+            route_ids, routes = import_routes(db, feed)
+            stop_ids, stops = import_stops(db, feed)
+            route_stops = import_route_stops(db, feed, route_ids, stop_ids)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    crud.invalidate_reference_caches()
+    crud.rebuild_stop_index(db)
+    crud.load_topology(db)
+    return {"routes": routes, "stops": stops, "route_stops": route_stops}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import routes and stops from a GTFS static feed (.zip)")
+    parser.add_argument("feed", help="path to the GTFS zip file")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        result = import_feed(db, args.feed)
+    except (GtfsError, zipfile.BadZipFile) as exc:
+        print(f"Import failed: {exc}")
+        return 1
+    finally:
+        db.close()
+
+    for table, counts in result.items():
+        print(f"{table}: " + ", ".join(f"{count} {action}" for action, count in counts.items()))
+    print(f"Imported in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+
+class Leaderboard:
+    """Users ordered by points (highest first, ties by id) in a SortedList.
+
+    Awards, inserts and rank lookups are O(log n); reading a page is O(log n + limit).
+    Ranks are competition ranks: users with equal points share a rank.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = SortedList()  # (-points, user_id)
+        self._points: Dict[int, int] = {}
+        self._usernames: Dict[int, str] = {}
+        self.loaded_at: Optional[float] = None
+
+    def load(self, users: Iterable[Tuple[int, str, int]]):
+        points = {}
+        usernames = {}
+        for user_id, username, user_points in users:
+            points[user_id] = user_points or 0
+            usernames[user_id] = username
+        entries = SortedList((-user_points, user_id) for user_id, user_points in points.items())
+        with self._lock:
+            self._entries, self._points, self._usernames = entries, points, usernames
+            self.loaded_at = time.monotonic()
+
+    def add(self, user_id: int, username: str, points: int = 0):
+        if self.loaded_at is None:
+            return
+        with self._lock:
+            old = self._points.get(user_id)
+            if old is not None:
+                self._entries.remove((-old, user_id))
+            self._points[user_id] = points
+            self._usernames[user_id] = username
+            self._entries.add((-points, user_id))
+
+    def award(self, user_id: int, delta: int):
+        if self.loaded_at is None or not delta:
+            return
+        with self._lock:
+            old = self._points.get(user_id)
+            if old is None:
+                # Created by another process; picked up by the next reload
+                return
+            self._entries.remove((-old, user_id))
+            self._points[user_id] = old + delta
+            self._entries.add((-(old + delta), user_id))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _entry(self, user_id: int, points: int, rank: int):
+        return {"rank": rank, "user_id": user_id, "username": self._usernames.get(user_id), "points": points}
+
+    def _page(self, start: int, stop: int) -> List[dict]:
+        entries = []
+        rank = None
+        previous = None
+        for index, (negative_points, user_id) in enumerate(self._entries.islice(start, stop), start):
+            if negative_points != previous:
+                # (-points,) sorts before every (-points, id), so this counts users with more points
+                rank = self._entries.bisect_left((negative_points,)) + 1 if previous is None else index + 1
+                previous = negative_points
+            entries.append(self._entry(user_id, -negative_points, rank))
+        return entries
+
+    def top(self, limit: int, offset: int = 0) -> List[dict]:
+        with self._lock:
+            return self._page(offset, offset + limit)
+
+    def rank(self, user_id: int) -> Optional[dict]:
+        with self._lock:
+            points = self._points.get(user_id)
+            if points is None:
+                return None
+            return self._entry(user_id, points, self._entries.bisect_left((-points,)) + 1)
+
+    def around(self, user_id: int, limit: int) -> Optional[List[dict]]:
+        # A page of `limit` users with user_id as close to the middle as the ends allow
+        with self._lock:
+            points = self._points.get(user_id)
+            if points is None:
+                return None
+            position = self._entries.index((-points, user_id))
+            start = max(0, min(position - limit // 2, len(self._entries) - limit))
+            return self._page(start, start + limit)
+
+
+leaderboard = Leaderboard()
@@ -1,9 +1,27 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from typing import List, Optional
-from database import get_db, init_db
+from datetime import datetime, timedelta, timezone
+from pydantic import ValidationError
+import asyncio
+import json
+import math
+from database import DbSession, SessionLocal, async_engine, engine, get_session, init_db
+from pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, encode_cursor, decode_id_cursor, decode_score_cursor,
+    decode_timestamp_cursor
+)
+from response_cache import etag_matches, make_etag, response_cache
+from pubsub import DROPPED, IncidentFilter, broker
+from scheduler import scheduler
+from spatial import stop_index
+from export import MEDIA_TYPES, encode_export, parquet_available
+from metrics import MetricsMiddleware, metrics
+from ratelimit import rate_limiter
+import config
 import crud
+import crud_async
 import schemas
 
 app = FastAPI(
@@ -22,17 +40,199 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
+if config.METRICS_ENABLED:
+    # Added last so it is the outermost layer and times everything below it
+    app.add_middleware(MetricsMiddleware)
+
 # Initialize database on startup
 @app.on_event("startup")
 def startup_event():
     init_db()
 
+    db = SessionLocal()
+    try:
+        crud.ensure_incident_counters(db)
+        # Build the in-memory spatial index used by /stops/nearby
+        crud.rebuild_stop_index(db)
+        crud.load_delay_rollups(db)
+        crud.load_leaderboard(db)
+        crud.load_recent_incidents(db)
+        crud.load_topology(db)
+    finally:
+        db.close()
+
+
+def _auto_resolve_job():
+    db = SessionLocal()
+    try:
+        return crud.auto_resolve_stale_incidents(
+            db, config.AUTO_RESOLVE_MAX_AGE_HOURS, batch_size=config.AUTO_RESOLVE_BATCH_SIZE
+        )
+    finally:
+        db.close()
+
+
+def _archive_job():
+    db = SessionLocal()
+    try:
+        return crud.archive_resolved_incidents(
+            db, config.ARCHIVE_AFTER_DAYS, batch_size=config.ARCHIVE_BATCH_SIZE
+        )
+    finally:
+        db.close()
+
+
+def _analytics_refresh_job():
+    db = SessionLocal()
+    try:
+        return {"rollup_rows": crud.load_delay_rollups(db)}
+    finally:
+        db.close()
+
+
+def _leaderboard_refresh_job():
+    db = SessionLocal()
+    try:
+        return {"users": crud.load_leaderboard(db)}
+    finally:
+        db.close()
+
+
+def _topology_refresh_job():
+    db = SessionLocal()
+    try:
+        return crud.load_topology(db)
+    finally:
+        db.close()
+
+
+def _stop_index_refresh_job():
+    db = SessionLocal()
+    try:
+        return {"stops": crud.rebuild_stop_index(db)}
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+async def start_background_jobs():
+    if config.AUTO_RESOLVE_ENABLED:
+        scheduler.add_job("auto_resolve", config.AUTO_RESOLVE_INTERVAL_SECONDS, _auto_resolve_job)
+    if config.ARCHIVE_ENABLED:
+        scheduler.add_job("archive", config.ARCHIVE_INTERVAL_SECONDS, _archive_job)
+    scheduler.add_job("analytics_refresh", config.ANALYTICS_REFRESH_SECONDS, _analytics_refresh_job)
+    scheduler.add_job("leaderboard_refresh", config.LEADERBOARD_REFRESH_SECONDS, _leaderboard_refresh_job)
+    scheduler.add_job("topology_refresh", config.TOPOLOGY_REFRESH_SECONDS, _topology_refresh_job)
+    scheduler.add_job("stop_index_refresh", config.STOP_INDEX_REFRESH_SECONDS, _stop_index_refresh_job)
+    if config.RATE_LIMIT_ENABLED and not rate_limiter.backend.remote:
+        scheduler.add_job("rate_limit_sweep", config.RATE_LIMIT_SWEEP_SECONDS, rate_limiter.sweep)
+    scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    await scheduler.stop()
+    # Close pooled connections; aiosqlite keeps a thread per connection that would otherwise
+    # keep the process alive after the server stops
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
+
+
+def _client_ip(request: Request) -> Optional[str]:
+    if config.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else None
+
+
+def _too_many_requests(retry_after: float):
+    return HTTPException(
+        status_code=429,
+        detail="Rate limit exceeded",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+async def _enforce_rate_limit(request: Request, action: str, user_id: int):
+    # Checked before any database work, so rejected requests cost no queries
+    retry_after = await rate_limiter.check_async(action, _client_ip(request), user_id)
+    if retry_after:
+        raise _too_many_requests(retry_after)
+
+
+def _decode_cursor(decoder, cursor: Optional[str]):
+    try:
+        return decoder(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _next_cursor_headers(rows: list, limit: int, key):
+    # A full page means there may be more rows after the last one
+    if rows and len(rows) == limit:
+        return {NEXT_CURSOR_HEADER: encode_cursor(*key(rows[-1]))}
+    return {}
+
+
+def _render_json(payload) -> bytes:
+    # Same encoding as FastAPI's JSONResponse
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+async def _cached_json(request: Request, scopes: tuple, build):
+    # build() returns (jsonable payload, extra headers). The serialized body is reused until
+    # a write bumps one of the scopes, and If-None-Match is answered with 304.
+    key = f"{request.url.path}?{sorted(request.query_params.multi_items())}"
+    versions = response_cache.versions(scopes)
+    cached = response_cache.get(key, versions) if config.RESPONSE_CACHE_ENABLED else None
+    if cached is None:
+        payload, headers = await build()
+        body = _render_json(payload)
+        if config.RESPONSE_CACHE_ENABLED:
+            etag = response_cache.put(key, versions, body, headers)
+        else:
+            etag = make_etag(body)
+    else:
+        body, etag, headers = cached
+
+    headers = {**headers, "ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _parse_expand(expand: Optional[str]):
+    if not expand:
+        return ()
+    names = tuple(dict.fromkeys(name.strip() for name in expand.split(",") if name.strip()))
+    unknown = [name for name in names if name not in crud.INCIDENT_EXPANSIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid expand. Must be a comma-separated subset of: {', '.join(crud.INCIDENT_EXPANSIONS)}"
+        )
+    return names
+
+
+def _expanded_incidents(incidents: list, expand: tuple):
+    # Only the requested relationships are read (and serialized); the rest stay unloaded
+    return [
+        schemas.IncidentExpandedResponse(
+            **schemas.IncidentResponse.model_validate(incident).model_dump(),
+            **{name: getattr(incident, name) for name in expand}
+        )
+        for incident in incidents
+    ]
+
 
 # Health check
 @app.get("/")
-def read_root():
+async def read_root():
     return {
         "message": "Delay Management API",
         "status": "running",
@@ -41,123 +241,395 @@ def read_root():
 
 
 # User endpoints
+# Declared before /users/{user_id} so "leaderboard" is not parsed as an id
+@app.get("/users/leaderboard", response_model=schemas.LeaderboardResponse, response_model_exclude_none=True)
+async def get_leaderboard(
+        limit: int = Query(10, ge=1, le=config.LEADERBOARD_MAX_LIMIT),
+        offset: int = Query(0, ge=0),
+        around_user: Optional[int] = None,
+        db: DbSession = Depends(get_session)
+):
+    if around_user is None:
+        return await crud_async.get_leaderboard(db, limit, offset)
+    result = await crud_async.get_leaderboard_around(db, around_user, limit)
+    if result is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return result
+
+
 @app.get("/users/{user_id}", response_model=schemas.UserResponse)
-def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = crud.get_user(db, user_id)
+async def get_user(user_id: int, db: DbSession = Depends(get_session)):
+    user = await crud_async.get_user_cached(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 
 @app.post("/users", response_model=schemas.UserResponse, status_code=201)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing_user = crud.get_user_by_username(db, user.username)
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Username already exists")
-    return crud.create_user(db, user.username)
+async def create_user(user: schemas.UserCreate, db: DbSession = Depends(get_session)):
+    def create(session):
+        existing_user = crud.get_user_by_username(session, user.username)
+        if existing_user:
+            raise HTTPException(status_code=400, detail="Username already exists")
+        return crud.create_user(session, user.username)
+
+    return await crud_async.run(db, create)
 
 
 # Route endpoints
 @app.get("/routes", response_model=List[schemas.RouteWithIncidents])
-def get_routes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    routes_with_counts = crud.get_routes_with_incident_counts(db)
-    return [
-        schemas.RouteWithIncidents(
-            id=route.id,
-            route_number=route.route_number,
-            route_name=route.route_name,
-            transport_type=route.transport_type,
-            active_incidents=count
-        )
-        for route, count in routes_with_counts
-    ]
+async def get_routes(
+        request: Request,
+        skip: int = Query(0, ge=0),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        db: DbSession = Depends(get_session)
+):
+    after_id = _decode_cursor(decode_id_cursor, cursor)
+
+    async def build():
+        routes_with_counts = await crud_async.get_routes_with_incident_counts(db, skip, limit, after_id)
+        payload = [
+            schemas.RouteWithIncidents(
+                id=route.id,
+                route_number=route.route_number,
+                route_name=route.route_name,
+                transport_type=route.transport_type,
+                gtfs_id=route.gtfs_id,
+                active_incidents=count
+            ).model_dump(mode="json")
+            for route, count in routes_with_counts
+        ]
+        return payload, _next_cursor_headers(routes_with_counts, limit, lambda row: (row[0].id,))
+
+    return await _cached_json(request, ("routes",), build)
 
 
 @app.get("/routes/{route_id}", response_model=schemas.RouteResponse)
-def get_route(route_id: int, db: Session = Depends(get_db)):
-    route = crud.get_route(db, route_id)
+async def get_route(route_id: int, db: DbSession = Depends(get_session)):
+    route = await crud_async.get_route_cached(db, route_id)
     if not route:
         raise HTTPException(status_code=404, detail="Route not found")
     return route
 
 
-@app.get("/routes/{route_id}/incidents", response_model=List[schemas.IncidentResponse])
-def get_route_incidents(route_id: int, db: Session = Depends(get_db)):
-    route = crud.get_route(db, route_id)
-    if not route:
-        raise HTTPException(status_code=404, detail="Route not found")
-    return crud.get_incidents_by_route(db, route_id)
+@app.get(
+    "/routes/{route_id}/incidents",
+    response_model=List[schemas.IncidentExpandedResponse],
+    response_model_exclude_unset=True
+)
+async def get_route_incidents(route_id: int, expand: Optional[str] = None, db: DbSession = Depends(get_session)):
+    expand = _parse_expand(expand)
+
+    def load(session):
+        route = crud.get_route_cached(session, route_id)
+        if not route:
+            raise HTTPException(status_code=404, detail="Route not found")
+        return _expanded_incidents(crud.get_incidents_by_route(session, route_id, expand), expand)
+
+    return await crud_async.run(db, load)
+
+
+@app.get("/routes/{route_id}/stops", response_model=List[schemas.StopResponse])
+async def get_route_stops(
+        route_id: int,
+        direction_id: Optional[int] = Query(None, ge=0, description="GTFS direction; the route's first by default"),
+        db: DbSession = Depends(get_session)
+):
+    # Stops in travel order, as imported from GTFS (empty for routes without an imported feed)
+    def load(session):
+        route = crud.get_route_cached(session, route_id)
+        if not route:
+            raise HTTPException(status_code=404, detail="Route not found")
+        return crud.get_route_stops(session, route_id, direction_id)
+
+    return await crud_async.run(db, load)
 
 
 # Stop endpoints
 @app.get("/stops", response_model=List[schemas.StopWithIncidents])
-def get_stops(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    stops_with_counts = crud.get_stops_with_incident_counts(db)
+async def get_stops(
+        request: Request,
+        skip: int = Query(0, ge=0),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        db: DbSession = Depends(get_session)
+):
+    after_id = _decode_cursor(decode_id_cursor, cursor)
+
+    async def build():
+        stops_with_counts = await crud_async.get_stops_with_incident_counts(db, skip, limit, after_id)
+        payload = [
+            schemas.StopWithIncidents(
+                id=stop.id,
+                stop_name=stop.stop_name,
+                latitude=stop.latitude,
+                longitude=stop.longitude,
+                gtfs_id=stop.gtfs_id,
+                nearby_incidents=count
+            ).model_dump(mode="json")
+            for stop, count in stops_with_counts
+        ]
+        return payload, _next_cursor_headers(stops_with_counts, limit, lambda row: (row[0].id,))
+
+    return await _cached_json(request, ("stops",), build)
+
+
+@app.get("/stops/nearby", response_model=List[schemas.StopNearby])
+async def get_stops_nearby(
+        lat: float = Query(..., ge=-90, le=90),
+        lon: float = Query(..., ge=-180, le=180),
+        radius_m: float = Query(500, gt=0, le=5000),
+        limit: int = Query(50, ge=1, le=500),
+        db: DbSession = Depends(get_session)
+):
+    nearby = await crud_async.get_stops_nearby(db, lat, lon, radius_m, limit)
     return [
-        schemas.StopWithIncidents(
+        schemas.StopNearby(
             id=stop.id,
             stop_name=stop.stop_name,
             latitude=stop.latitude,
             longitude=stop.longitude,
-            nearby_incidents=count
+            gtfs_id=stop.gtfs_id,
+            distance_m=round(distance, 1),
+            active_incidents=incidents
         )
-        for stop, count in stops_with_counts
+        for stop, distance, incidents in nearby
     ]
 
 
 @app.get("/stops/{stop_id}", response_model=schemas.StopResponse)
-def get_stop(stop_id: int, db: Session = Depends(get_db)):
-    stop = crud.get_stop(db, stop_id)
+async def get_stop(stop_id: int, db: DbSession = Depends(get_session)):
+    stop = await crud_async.get_stop_cached(db, stop_id)
     if not stop:
         raise HTTPException(status_code=404, detail="Stop not found")
     return stop
 
 
-# Incident endpoints
-@app.post("/incidents", response_model=schemas.IncidentResponse, status_code=201)
-def create_incident(incident: schemas.IncidentCreate, db: Session = Depends(get_db)):
-    # Validate route exists
-    route = crud.get_route(db, incident.route_id)
-    if not route:
-        raise HTTPException(status_code=404, detail="Route not found")
-
-    # Validate stop exists if provided
-    if incident.stop_id:
-        stop = crud.get_stop(db, incident.stop_id)
+@app.get("/stops/{stop_id}/affecting-incidents", response_model=List[schemas.AffectingIncident])
+async def get_affecting_incidents(stop_id: int, db: DbSession = Depends(get_session)):
+    # Open incidents at this stop or upstream of it on any route serving it, closest first
+    def load(session):
+        stop = crud.get_stop_cached(session, stop_id)
         if not stop:
             raise HTTPException(status_code=404, detail="Stop not found")
+        return crud.get_affecting_incidents(session, stop_id)
 
-    # Validate user exists
-    user = crud.get_user(db, incident.reporter_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    rows = await crud_async.run(db, load)
+    return [
+        schemas.AffectingIncident(**schemas.IncidentResponse.model_validate(incident).model_dump(), stops_away=stops_away)
+        for incident, stops_away in rows
+    ]
 
-    return crud.create_incident(db, incident)
+
+# Incident endpoints
+@app.post("/incidents", response_model=schemas.IncidentReportResponse, status_code=201)
+async def create_incident(
+        incident: schemas.IncidentCreate,
+        request: Request,
+        response: Response,
+        db: DbSession = Depends(get_session)
+):
+    await _enforce_rate_limit(request, "incidents", incident.reporter_id)
+
+    # Validation and insert share one trip off the event loop
+    def create(session):
+        # Validate route exists
+        route = crud.get_route_cached(session, incident.route_id)
+        if not route:
+            raise HTTPException(status_code=404, detail="Route not found")
+
+        # Validate stop exists if provided
+        if incident.stop_id:
+            stop = crud.get_stop_cached(session, incident.stop_id)
+            if not stop:
+                raise HTTPException(status_code=404, detail="Stop not found")
+
+        # Validate user exists
+        user = crud.get_user_cached(session, incident.reporter_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        return crud.create_incident(session, incident)
+
+    db_incident, merged = await crud_async.run(db, create)
+    if merged:
+        # Nothing was created; the report confirmed an open incident
+        response.status_code = 200
+    return schemas.IncidentReportResponse(
+        **schemas.IncidentResponse.model_validate(db_incident).model_dump(), merged=merged
+    )
+
+
+def _validate_report(item):
+    # Returns (report, None), or (None, error) naming each invalid field
+    try:
+        return schemas.IncidentCreate.model_validate(item), None
+    except ValidationError as exc:
+        problems = "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'report'}: {error['msg']}" for error in exc.errors()
+        )
+        return None, f"Invalid report: {problems}"
 
 
-@app.get("/incidents", response_model=List[schemas.IncidentResponse])
-def get_incidents(
-        skip: int = 0,
-        limit: int = 100,
+@app.post("/incidents/batch", response_model=schemas.IncidentBatchResponse)
+async def create_incidents_batch(
+        batch: schemas.IncidentBatchCreate,
+        request: Request,
+        db: DbSession = Depends(get_session)
+):
+    results = [_validate_report(item) for item in batch.incidents]
+    valid = [index for index, (report, _) in enumerate(results) if report is not None]
+
+    # Each valid report takes a token from the batch budget, separate from single reports;
+    # reports over the limit fail individually
+    retry_afters = await rate_limiter.check_many_async(
+        "incident_batches", _client_ip(request), [results[index][0].reporter_id for index in valid]
+    )
+    accepted, limited = [], []
+    for index, retry_after in zip(valid, retry_afters):
+        if retry_after:
+            results[index] = (None, f"Rate limit exceeded, retry after {math.ceil(retry_after)}s")
+            limited.append(retry_after)
+        else:
+            accepted.append(index)
+    if limited and not accepted:
+        raise _too_many_requests(min(limited))
+
+    # Reports referencing unknown routes, stops or users fail individually; the rest are inserted together
+    if accepted:
+        inserted = await crud_async.create_incidents_batch(db, [results[index][0] for index in accepted])
+        for index, result in zip(accepted, inserted):
+            results[index] = result
+    items = [
+        schemas.IncidentBatchItemResult(
+            index=index,
+            status="created" if incident else "error",
+            incident=incident,
+            error=error
+        )
+        for index, (incident, error) in enumerate(results)
+    ]
+    created = sum(1 for item in items if item.status == "created")
+    return schemas.IncidentBatchResponse(created=created, failed=len(items) - created, results=items)
+
+
+@app.get("/incidents", response_model=List[schemas.IncidentExpandedResponse], response_model_exclude_unset=True)
+async def get_incidents(
+        request: Request,
+        skip: int = Query(0, ge=0),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        status: Optional[str] = None,
+        cursor: Optional[str] = None,
+        expand: Optional[str] = Query(None, description="Comma-separated: route,stop,reporter,verifications"),
+        include_archived: bool = False,
+        db: DbSession = Depends(get_session)
+):
+    after = _decode_cursor(decode_timestamp_cursor, cursor)
+    expand = _parse_expand(expand)
+
+    async def build():
+        incidents = await crud_async.get_incidents(db, skip, limit, status, after, expand, include_archived)
+        payload = [
+            incident.model_dump(mode="json", exclude_unset=True)
+            for incident in _expanded_incidents(incidents, expand)
+        ]
+        return payload, _next_cursor_headers(incidents, limit, lambda incident: (incident.reported_at, incident.id))
+
+    # Embedded objects change without touching incidents: reporters' points on every award,
+    # routes and stops on a GTFS import
+    expansion_scopes = {"reporter": "users", "route": "routes", "stop": "stops"}
+    scopes = ("incidents", *(expansion_scopes[name] for name in expand if name in expansion_scopes))
+    return await _cached_json(request, scopes, build)
+
+
+def _parse_bbox(bbox: Optional[str]):
+    if bbox is None:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid bbox. Expected min_lon,min_lat,max_lon,max_lat")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="Invalid bbox. Minimums must not exceed maximums")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+async def _incident_events(request: Request, subscription):
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), config.STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            if event is DROPPED:
+                # Too far behind; the client reconnects and refetches current state
+                yield "event: dropped\ndata: {}\n\n"
+                break
+            yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@app.get("/incidents/stream")
+async def stream_incidents(
+        request: Request,
+        route_id: List[int] = Query([]),
+        stop_id: List[int] = Query([]),
+        bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+):
+    # Server-Sent Events: incident_created and incident_status_changed (manual or from verifications)
+    incident_filter = IncidentFilter(route_id, stop_id, _parse_bbox(bbox), stop_index.get)
+    subscription = broker.subscribe(incident_filter)
+    return StreamingResponse(
+        _incident_events(request, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/incidents/search", response_model=List[schemas.IncidentSearchResult])
+async def search_incidents(
+        request: Request,
+        q: str = Query(..., min_length=1, max_length=200, description="Words to match; end a word with * for a prefix match"),
+        limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+        route_id: Optional[int] = None,
         status: Optional[str] = None,
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = None,
+        db: DbSession = Depends(get_session)
 ):
-    return crud.get_incidents(db, skip, limit, status)
+    after = _decode_cursor(decode_score_cursor, cursor)
+
+    async def build():
+        rows = await crud_async.search_incidents(db, q, limit, route_id, status, after)
+        payload = [
+            schemas.IncidentSearchResult(
+                **schemas.IncidentResponse.model_validate(incident).model_dump(), relevance=-rank
+            ).model_dump(mode="json")
+            for incident, rank in rows
+        ]
+        return payload, _next_cursor_headers(rows, limit, lambda row: (row[1], row[0].id))
+
+    return await _cached_json(request, ("incidents",), build)
 
 
 @app.get("/incidents/{incident_id}", response_model=schemas.IncidentDetailResponse)
-def get_incident(incident_id: int, db: Session = Depends(get_db)):
-    incident = crud.get_incident(db, incident_id)
+async def get_incident(incident_id: int, db: DbSession = Depends(get_session)):
+    incident = await crud_async.get_incident_detail(db, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     return incident
 
 
 @app.put("/incidents/{incident_id}/status")
-def update_incident_status(
+async def update_incident_status(
         incident_id: int,
         status: str,
-        db: Session = Depends(get_db)
+        db: DbSession = Depends(get_session)
 ):
     valid_statuses = ["active", "resolved", "verified", "disputed"]
     if status not in valid_statuses:
@@ -166,7 +638,7 @@ def update_incident_status(
             detail=f"Invalid status. Must be one of: {', '.join(valid_statuses)}"
         )
 
-    incident = crud.update_incident_status(db, incident_id, status)
+    incident = await crud_async.update_incident_status(db, incident_id, status)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     return {"message": "Status updated successfully", "incident": incident}
@@ -174,40 +646,163 @@ def update_incident_status(
 
 # Verification endpoints
 @app.post("/verifications", response_model=schemas.VerificationResponse, status_code=201)
-def create_verification(verification: schemas.VerificationCreate, db: Session = Depends(get_db)):
-    # Validate incident exists
-    incident = crud.get_incident(db, verification.incident_id)
-    if not incident:
-        raise HTTPException(status_code=404, detail="Incident not found")
+async def create_verification(
+        verification: schemas.VerificationCreate,
+        request: Request,
+        db: DbSession = Depends(get_session)
+):
+    await _enforce_rate_limit(request, "verifications", verification.user_id)
+
+    def create(session):
+        # Validate incident exists
+        incident = crud.get_incident(session, verification.incident_id)
+        if not incident:
+            raise HTTPException(status_code=404, detail="Incident not found")
+
+        # Validate user exists
+        user = crud.get_user_cached(session, verification.user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        # Create verification
+        db_verification = crud.create_verification(session, verification)
+        if not db_verification:
+            raise HTTPException(
+                status_code=400,
+                detail="User has already verified this incident"
+            )
+        return db_verification
+
+    return await crud_async.run(db, create)
+
+
+@app.get("/incidents/{incident_id}/verifications", response_model=List[schemas.VerificationResponse])
+async def get_incident_verifications(incident_id: int, db: DbSession = Depends(get_session)):
+    def load(session):
+        incident = crud.get_incident(session, incident_id)
+        if not incident:
+            raise HTTPException(status_code=404, detail="Incident not found")
+        return crud.get_verifications_by_incident(session, incident_id)
+
+    return await crud_async.run(db, load)
+
+
+# Cache endpoint
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return {**crud.get_cache_stats(), "responses": response_cache.stats()}
+
+
+# Background job metrics
+@app.get("/jobs")
+async def get_jobs():
+    return scheduler.stats()
+
+
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    if not config.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# Delay analytics
+BUCKET_SPANS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+DEFAULT_ANALYTICS_RANGES = {"hour": timedelta(days=1), "day": timedelta(days=30)}
+
+
+def _naive_utc(value: Optional[datetime]):
+    # Incident timestamps are stored as naive UTC
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
-    # Validate user exists
-    user = crud.get_user(db, verification.user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    # Create verification
-    db_verification = crud.create_verification(db, verification)
-    if not db_verification:
+@app.get("/analytics/delays", response_model=schemas.DelayAnalyticsResponse)
+async def get_delay_analytics(
+        request: Request,
+        route_id: Optional[int] = None,
+        stop_id: Optional[int] = None,
+        start: Optional[datetime] = Query(None, alias="from"),
+        end: Optional[datetime] = Query(None, alias="to"),
+        bucket: str = Query("hour", pattern="^(hour|day)$"),
+        db: DbSession = Depends(get_session)
+):
+    end = _naive_utc(end) or datetime.utcnow()
+    start = _naive_utc(start) or end - DEFAULT_ANALYTICS_RANGES[bucket]
+    if start >= end:
+        raise HTTPException(status_code=400, detail="Invalid range. 'from' must be before 'to'")
+    if (end - start) / BUCKET_SPANS[bucket] > config.ANALYTICS_MAX_BUCKETS:
         raise HTTPException(
             status_code=400,
-            detail="User has already verified this incident"
+            detail=f"Range too large. At most {config.ANALYTICS_MAX_BUCKETS} {bucket} buckets per request"
         )
 
-    return db_verification
+    def check_references(session):
+        if route_id is not None and not crud.get_route_cached(session, route_id):
+            raise HTTPException(status_code=404, detail="Route not found")
+        if stop_id is not None and not crud.get_stop_cached(session, stop_id):
+            raise HTTPException(status_code=404, detail="Stop not found")
 
+    if route_id is not None or stop_id is not None:
+        await crud_async.run(db, check_references)
 
-@app.get("/incidents/{incident_id}/verifications", response_model=List[schemas.VerificationResponse])
-def get_incident_verifications(incident_id: int, db: Session = Depends(get_db)):
-    incident = crud.get_incident(db, incident_id)
-    if not incident:
-        raise HTTPException(status_code=404, detail="Incident not found")
-    return crud.get_verifications_by_incident(db, incident_id)
+    async def build():
+        result = await crud_async.get_delay_analytics(db, start, end, bucket, route_id, stop_id)
+        response = schemas.DelayAnalyticsResponse(
+            route_id=route_id, stop_id=stop_id, bucket=bucket, start=start, end=end, **result
+        )
+        return response.model_dump(mode="json"), {}
+
+    return await _cached_json(request, ("analytics",), build)
+
+
+# Bulk export
+def _export_chunks(start: Optional[datetime], end: Optional[datetime], include_archived: bool):
+    # Runs in the threadpool while the response streams, with its own session so it does not
+    # depend on the request's session lifetime or on DB_MODE
+    db = SessionLocal()
+    try:
+        yield from crud.iter_incident_export(db, start, end, include_archived, config.EXPORT_CHUNK_SIZE)
+    finally:
+        db.close()
+
+
+@app.get("/export/incidents")
+async def export_incidents(
+        format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+        start: Optional[datetime] = Query(None, alias="from"),
+        end: Optional[datetime] = Query(None, alias="to"),
+        include_archived: bool = False,
+        gzip: bool = False
+):
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires the 'pyarrow' package")
+    start = _naive_utc(start)
+    end = _naive_utc(end)
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="Invalid range. 'from' must be before 'to'")
+
+    filename = f"incidents.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        encode_export(format, _export_chunks(start, end, include_archived), gzip),
+        media_type=MEDIA_TYPES[format],
+        headers=headers
+    )
 
 
 # Statistics endpoint
 @app.get("/stats", response_model=schemas.IncidentStats)
-def get_stats(db: Session = Depends(get_db)):
-    return crud.get_incident_stats(db)
+async def get_stats(request: Request, include_archived: bool = False, db: DbSession = Depends(get_session)):
+    async def build():
+        stats = await crud_async.get_incident_stats(db, include_archived)
+        return schemas.IncidentStats(**stats).model_dump(mode="json"), {}
+
+    return await _cached_json(request, ("stats",), build)
 
 
 if __name__ == "__main__":
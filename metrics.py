@@ -0,0 +1,231 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Unmatched paths share one label so scanners cannot blow up the number of series
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestStats:
+    # Database work of the request being served; mutated by the cursor hooks
+    __slots__ = ("queries", "db_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = Counter()
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("metrics_request", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Metrics:
+    """Per-process request and SQL metrics rendered in the Prometheus text format.
+
+    Recording is a few counter increments under one lock; the text is only built when
+    /metrics is scraped.
+    """
+
+    def __init__(self, slow_query_ms: float = 0, n_plus_one_threshold: int = 10):
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self._requests: Counter = Counter()  # (method, route, status) -> count
+        self._latency: Dict[Tuple[str, str], Histogram] = {}  # (method, route)
+        self._request_queries: Dict[Tuple[str, str], Histogram] = {}
+        self._request_db_seconds: Counter = Counter()  # (method, route) -> seconds
+        self._n_plus_one: Counter = Counter()  # (method, route) -> requests flagged
+        self._queries = Histogram(LATENCY_BUCKETS)
+        self.slow_queries = 0
+
+    def start_request(self) -> RequestStats:
+        with self._lock:
+            self.in_flight += 1
+        return RequestStats()
+
+    def finish_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        repeated = None
+        if stats.queries >= self.n_plus_one_threshold > 0:
+            statement, count = stats.statements.most_common(1)[0]
+            if count >= self.n_plus_one_threshold:
+                repeated = (statement, count)
+
+        with self._lock:
+            self.in_flight -= 1
+            self._requests[(method, route, status)] += 1
+            latency = self._latency.get(key)
+            if latency is None:
+                latency = self._latency[key] = Histogram(LATENCY_BUCKETS)
+                self._request_queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+            latency.observe(seconds)
+            self._request_queries[key].observe(stats.queries)
+            self._request_db_seconds[key] += stats.db_seconds
+            if repeated:
+                self._n_plus_one[key] += 1
+
+        if repeated:
+            logger.warning("Possible N+1 on %s %s: %d executions of %s", method, route, repeated[1],
+                           " ".join(repeated[0].split())[:300])
+
+    def record_query(self, statement: str, seconds: float):
+        stats = _current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += seconds
+            stats.statements[statement] += 1
+        slow = 0 < self.slow_query_ms <= seconds * 1000
+        with self._lock:
+            self._queries.observe(seconds)
+            if slow:
+                self.slow_queries += 1
+        if slow:
+            logger.warning("Slow query (%.1f ms): %s", seconds * 1000, " ".join(statement.split())[:1000])
+
+    def render(self) -> str:
+        with self._lock:
+            requests = dict(self._requests)
+            latency = {key: (list(h.counts), h.sum, h.count) for key, h in self._latency.items()}
+            queries_per_request = {key: (list(h.counts), h.sum, h.count) for key, h in self._request_queries.items()}
+            db_seconds = dict(self._request_db_seconds)
+            n_plus_one = dict(self._n_plus_one)
+            queries = (list(self._queries.counts), self._queries.sum, self._queries.count)
+            in_flight = self.in_flight
+            slow_queries = self.slow_queries
+
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, buckets, values, **labels):
+            counts, total, count = values
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels(**labels, le=format(bound, 'g'))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {count}")
+            lines.append(f"{name}_sum{_labels(**labels) if labels else ''} {round(total, 6)}")
+            lines.append(f"{name}_count{_labels(**labels) if labels else ''} {count}")
+
+        header("http_requests_in_flight", "gauge", "Requests currently being served.")
+        lines.append(f"http_requests_in_flight {in_flight}")
+
+        header("http_requests_total", "counter", "Requests served, by route template and status code.")
+        for (method, route, status), count in sorted(requests.items()):
+            lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+        header("http_request_duration_seconds", "histogram", "Request latency, by route template.")
+        for (method, route), values in sorted(latency.items()):
+            histogram("http_request_duration_seconds", LATENCY_BUCKETS, values, method=method, route=route)
+
+        header("http_request_db_queries", "histogram", "SQL statements executed per request.")
+        for (method, route), values in sorted(queries_per_request.items()):
+            histogram("http_request_db_queries", QUERY_COUNT_BUCKETS, values, method=method, route=route)
+
+        header("http_request_db_seconds_total", "counter", "Time spent in SQL statements while serving requests.")
+        for (method, route), seconds in sorted(db_seconds.items()):
+            lines.append(f"http_request_db_seconds_total{_labels(method=method, route=route)} {round(seconds, 6)}")
+
+        header("http_request_n_plus_one_total", "counter",
+               "Requests that ran one statement at least N_PLUS_ONE_THRESHOLD times.")
+        for (method, route), count in sorted(n_plus_one.items()):
+            lines.append(f"http_request_n_plus_one_total{_labels(method=method, route=route)} {count}")
+
+        header("db_query_duration_seconds", "histogram", "SQL statement latency, including background jobs.")
+        histogram("db_query_duration_seconds", LATENCY_BUCKETS, queries)
+
+        header("db_slow_queries_total", "counter", "Statements slower than SLOW_QUERY_MS.")
+        lines.append(f"db_slow_queries_total {slow_queries}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(config.SLOW_QUERY_MS, config.N_PLUS_ONE_THRESHOLD)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["metrics_query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("metrics_query_started", None)
+    if started is not None:
+        metrics.record_query(statement, time.perf_counter() - started)
+
+
+def instrument_engine(engine):
+    # Takes a sync Engine; for an AsyncEngine pass its .sync_engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: unlike BaseHTTPMiddleware it leaves streaming responses untouched."""
+
+    def __init__(self, app, registry: Metrics = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = self.registry.start_request()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_request.reset(token)
+            # The router stores the matched route in the scope; its path is the template, e.g. /incidents/{incident_id}
+            route = scope.get("route")
+            self.registry.finish_request(
+                scope["method"], getattr(route, "path", UNMATCHED_ROUTE), status, elapsed, stats
+            )
@@ -0,0 +1,181 @@
+import argparse
+from datetime import datetime
+
+from sqlalchemy import Engine, func, inspect, select, text
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.orm import Session
+
+from search import create_search_index
+from database import (
+    ArchivedIncident, ArchivedVerification, Incident, Route, RouteStop, SchemaMigration, Stop, User, Verification,
+    engine as default_engine
+)
+
+
+def _create_indexes(conn, table, names):
+    for index in table.indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+
+def _add_column(conn, table, name):
+    if name in {column["name"] for column in inspect(conn).get_columns(table.name)}:
+        return
+    column_type = table.c[name].type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}"))
+
+
+def _incident_filter_indexes(conn):
+    _create_indexes(conn, Incident.__table__, {
+        "ix_incidents_status_reported_at",
+        "ix_incidents_reported_at_id",
+        "ix_incidents_route_status",
+        "ix_incidents_stop_status",
+        "ix_incidents_type_severity_status",
+    })
+
+
+def _unique_verification_per_user(conn):
+    # Keep the earliest verification when a user verified the same incident twice
+    keep = select(func.min(Verification.id)).group_by(Verification.incident_id, Verification.user_id)
+    conn.execute(Verification.__table__.delete().where(Verification.id.not_in(keep)))
+    _create_indexes(conn, Verification.__table__, {"uq_verifications_incident_user"})
+
+    # Recount from the remaining rows: the stored counts included the duplicates, and older
+    # write paths could lose increments under concurrency
+    def count(is_verified):
+        return (
+            select(func.count(Verification.id))
+            .where(Verification.incident_id == Incident.id, Verification.is_verified == is_verified)
+            .scalar_subquery()
+        )
+
+    conn.execute(Incident.__table__.update().values(verification_count=count(True), dispute_count=count(False)))
+
+
+def _archive_tables(conn):
+    ArchivedIncident.__table__.create(conn, checkfirst=True)
+    ArchivedVerification.__table__.create(conn, checkfirst=True)
+
+
+def _user_points_index(conn):
+    _create_indexes(conn, User.__table__, {"ix_users_points_id"})
+
+
+def _incident_search_index(conn):
+    create_search_index(conn)
+
+
+def _gtfs_import(conn):
+    for model, index in ((Route, "uq_routes_gtfs_id"), (Stop, "uq_stops_gtfs_id")):
+        _add_column(conn, model.__table__, "gtfs_id")
+        _create_indexes(conn, model.__table__, {index})
+    RouteStop.__table__.create(conn, checkfirst=True)
+
+
+def _rebuild_sqlite_table(conn, table, fill: dict = None):
+    # SQLite cannot alter a table's primary key: copy the rows into a table created from the
+    # model, swap it in and recreate the indexes (dropped along with the old table).
+    # fill gives SQL values for model columns the old table does not have.
+    fill = fill or {}
+    rebuilt = f"{table.name}_rebuild"
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect)).strip()
+    conn.execute(text(ddl.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {rebuilt} ", 1)))
+    columns = [column.name for column in table.columns]
+    values = ", ".join(fill.get(name, name) for name in columns)
+    conn.execute(text(f"INSERT INTO {rebuilt} ({', '.join(columns)}) SELECT {values} FROM {table.name}"))
+    conn.execute(text(f"DROP TABLE {table.name}"))
+    conn.execute(text(f"ALTER TABLE {rebuilt} RENAME TO {table.name}"))
+    for index in table.indexes:
+        index.create(conn)
+
+
+def _autoincrement_ids(conn):
+    # Without AUTOINCREMENT SQLite reuses the ids of deleted rows, which then collide with the
+    # archived copies. Other databases use sequences that never go back.
+    if conn.dialect.name != "sqlite":
+        return
+    for model, archive in ((Incident, ArchivedIncident), (Verification, ArchivedVerification)):
+        if "AUTOINCREMENT" not in conn.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": model.__tablename__}
+        ).scalar():
+            _rebuild_sqlite_table(conn, model.__table__)
+        # Start past every id ever used, archived rows included
+        last_id = max(
+            conn.execute(select(func.max(model.id))).scalar() or 0,
+            conn.execute(select(func.max(archive.id))).scalar() or 0,
+        )
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": model.__tablename__})
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                     {"name": model.__tablename__, "seq": last_id})
+    # The full-text triggers were dropped with the old incidents table
+    create_search_index(conn)
+
+
+def _route_stop_directions(conn):
+    # Existing memberships become direction 0; re-importing the feed splits them by direction
+    table = RouteStop.__table__
+    if "direction_id" in {column["name"] for column in inspect(conn).get_columns(table.name)}:
+        return
+    if conn.dialect.name == "sqlite":
+        _rebuild_sqlite_table(conn, table, fill={"direction_id": "0"})
+        return
+    conn.execute(text("ALTER TABLE route_stops ADD COLUMN direction_id INTEGER NOT NULL DEFAULT 0"))
+    constraint = inspect(conn).get_pk_constraint(table.name)["name"]
+    conn.execute(text(f"ALTER TABLE route_stops DROP CONSTRAINT {constraint}"))
+    conn.execute(text("ALTER TABLE route_stops ADD PRIMARY KEY (route_id, direction_id, stop_id)"))
+
+
+# Applied in order, once each; a new schema change appends an entry here and updates the models
+MIGRATIONS = [
+    (1, "incident filter indexes", _incident_filter_indexes),
+    (2, "unique verification per user", _unique_verification_per_user),
+    (3, "incident archive tables", _archive_tables),
+    (4, "user points index", _user_points_index),
+    (5, "incident full-text search", _incident_search_index),
+    (6, "gtfs ids and route stops", _gtfs_import),
+    (7, "autoincrement incident and verification ids", _autoincrement_ids),
+    (8, "route stop directions", _route_stop_directions),
+]
+
+
+def applied_versions(bind: Engine):
+    if not inspect(bind).has_table(SchemaMigration.__tablename__):
+        return set()
+    with Session(bind) as db:
+        return set(db.scalars(select(SchemaMigration.version)))
+
+
+def run_migrations(bind: Engine = default_engine, fresh: bool = False):
+    # A fresh database already matches the models, so migrations are only recorded
+    done = applied_versions(bind)
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        with bind.begin() as conn:
+            if not fresh:
+                migrate(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+        applied.append((version, name))
+    return applied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--status", action="store_true", help="list migrations without applying them")
+    args = parser.parse_args()
+
+    if args.status:
+        done = applied_versions(default_engine)
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:>4}  {'applied' if version in done else 'pending'}  {name}")
+    else:
+        from database import init_db
+
+        for version, name in init_db():
+            print(f"Applied migration {version}: {name}")
+        print("Database schema is up to date")
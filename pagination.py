@@ -0,0 +1,55 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# Cursors are opaque to clients: base64url-encoded JSON of the last row's sort key
+def encode_cursor(*values) -> str:
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def decode_id_cursor(cursor: Optional[str]) -> Optional[int]:
+    if cursor is None:
+        return None
+    values = _decode(cursor)
+    if len(values) != 1 or not isinstance(values[0], int):
+        raise ValueError("Invalid cursor")
+    return values[0]
+
+
+def decode_score_cursor(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+    if cursor is None:
+        return None
+    values = _decode(cursor)
+    if (len(values) != 2 or not isinstance(values[0], (int, float)) or isinstance(values[0], bool)
+            or not isinstance(values[1], int)):
+        raise ValueError("Invalid cursor")
+    return float(values[0]), values[1]
+
+
+def decode_timestamp_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if cursor is None:
+        return None
+    values = _decode(cursor)
+    if len(values) != 2 or not isinstance(values[0], str) or not isinstance(values[1], int):
+        raise ValueError("Invalid cursor")
+    return datetime.fromisoformat(values[0]), values[1]
@@ -0,0 +1,114 @@
+import asyncio
+import itertools
+import threading
+from typing import Callable, Optional, Sequence, Tuple
+
+import config
+
+# Queued in place of an event when a subscriber falls too far behind
+DROPPED = object()
+
+
+class IncidentFilter:
+    """Matches events on any of the given routes, stops or inside a bounding box; no criteria matches all."""
+
+    def __init__(
+            self,
+            route_ids: Sequence[int] = (),
+            stop_ids: Sequence[int] = (),
+            bbox: Optional[Tuple[float, float, float, float]] = None,
+            locate_stop: Callable[[int], Optional[Tuple[float, float]]] = lambda stop_id: None
+    ):
+        self.route_ids = set(route_ids)
+        self.stop_ids = set(stop_ids)
+        self.bbox = bbox  # min_lon, min_lat, max_lon, max_lat
+        self.locate_stop = locate_stop
+
+    def matches(self, route_id: Optional[int], stop_id: Optional[int]) -> bool:
+        if not self.route_ids and not self.stop_ids and self.bbox is None:
+            return True
+        if route_id in self.route_ids or (stop_id is not None and stop_id in self.stop_ids):
+            return True
+        if self.bbox is not None and stop_id is not None:
+            coords = self.locate_stop(stop_id)
+            if coords is not None:
+                lat, lon = coords
+                min_lon, min_lat, max_lon, max_lat = self.bbox
+                return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+        return False
+
+
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, incident_filter: IncidentFilter, queue_size: int):
+        self.loop = loop
+        self.filter = incident_filter
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size + 1)
+        self.queue_size = queue_size
+        self.dropped = False
+
+    def _offer(self, event: dict):
+        # Runs on the subscriber's event loop
+        if self.dropped:
+            return
+        if self.queue.qsize() >= self.queue_size:
+            # Slow consumer: stop feeding it rather than buffering without bound or blocking publishers
+            self.dropped = True
+            self.queue.put_nowait(DROPPED)
+            return
+        self.queue.put_nowait(event)
+
+
+class IncidentBroker:
+    """In-process fan-out of incident events to streaming subscribers.
+
+    ``publish`` is safe to call from any thread; delivery to each subscriber is scheduled
+    on its own event loop and never waits on a subscriber's queue.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    def subscribe(self, incident_filter: IncidentFilter) -> Subscription:
+        subscription = Subscription(asyncio.get_running_loop(), incident_filter, self.queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+        if subscription.dropped:
+            self.dropped_subscribers += 1
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscriptions)
+
+    def publish(self, event_type: str, route_id: Optional[int], stop_id: Optional[int], data: dict):
+        with self._lock:
+            targets = [sub for sub in self._subscriptions if not sub.dropped]
+        if not targets:
+            return
+        event = {"id": next(self._ids), "type": event_type, "data": data}
+        self.published += 1
+        for subscription in targets:
+            if subscription.filter.matches(route_id, stop_id):
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription._offer, event)
+                except RuntimeError:
+                    # The subscriber's loop has shut down
+                    self.unsubscribe(subscription)
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscriptions),
+            "published": self.published,
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+broker = IncidentBroker(config.STREAM_QUEUE_SIZE)
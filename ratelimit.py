@@ -0,0 +1,239 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+import config
+
+
+# A check names the buckets one request draws on, as (key, capacity, refill rate per second).
+# It takes a token from every bucket or, when any of them is empty, from none of them.
+Check = List[Tuple[str, float, float]]
+
+
+class LocalRateLimitBackend:
+    """In-process token buckets.
+
+    Buckets are kept in last-use order, so each check is O(1) and sweep() only looks at the
+    buckets it evicts. A bucket idle for a whole refill period is full again, which is the
+    same as having no bucket, so evicting it forgets nothing.
+    """
+
+    remote = False
+
+    def __init__(self, max_buckets: int = 100000):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def _store(self, key: str, tokens: float, now: float):
+        if key in self._buckets:
+            self._buckets.move_to_end(key)
+        elif len(self._buckets) >= self.max_buckets:
+            # Bounded memory under a flood of new keys: drop the least recently used bucket
+            self._buckets.popitem(last=False)
+        self._buckets[key] = (tokens, now)
+
+    def acquire_many(self, checks: List[Check]) -> List[float]:
+        """Apply the checks in order; for each, 0 if allowed, else the seconds until it would be."""
+        now = time.monotonic()
+        results = []
+        with self._lock:
+            for check in checks:
+                levels = []
+                for key, capacity, rate in check:
+                    bucket = self._buckets.get(key)
+                    tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                    levels.append((key, tokens, rate))
+                retry_after = max(((1 - tokens) / rate for _, tokens, rate in levels if tokens < 1), default=0.0)
+                taken = 0 if retry_after else 1
+                for key, tokens, _ in levels:
+                    self._store(key, tokens - taken, now)
+                results.append(retry_after)
+        return results
+
+    def acquire(self, key: str, capacity: float, rate: float) -> float:
+        # Takes one token; returns 0 if it was available, else the seconds until it will be
+        return self.acquire_many([[(key, capacity, rate)]])[0]
+
+    def sweep(self, idle_seconds: float) -> int:
+        cutoff = time.monotonic() - idle_seconds
+        evicted = 0
+        with self._lock:
+            while self._buckets:
+                key, (_, updated) = next(iter(self._buckets.items()))
+                if updated > cutoff:
+                    break
+                del self._buckets[key]
+                evicted += 1
+        return evicted
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# All checks of a call in one atomic step. ARGV is the number of checks, then per check the
+# number of buckets and a (KEYS index, capacity, rate) triple for each. Time comes from the
+# Redis server so workers with skewed clocks agree; results are strings because Lua numbers
+# are truncated to integers.
+_REDIS_TOKEN_BUCKETS = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local buckets = {}
+local results = {}
+local position = 2
+for check = 1, tonumber(ARGV[1]) do
+    local count = tonumber(ARGV[position])
+    position = position + 1
+    local drawn = {}
+    local retry_after = 0
+    for i = 1, count do
+        local index = tonumber(ARGV[position])
+        local capacity = tonumber(ARGV[position + 1])
+        local rate = tonumber(ARGV[position + 2])
+        position = position + 3
+        local bucket = buckets[index]
+        if not bucket then
+            local stored = redis.call('HMGET', KEYS[index], 'tokens', 'updated')
+            local tokens = tonumber(stored[1]) or capacity
+            local updated = tonumber(stored[2]) or now
+            bucket = {tokens = math.min(capacity, tokens + (now - updated) * rate), ttl = math.ceil(capacity / rate * 1000)}
+            buckets[index] = bucket
+        end
+        if bucket.tokens < 1 then
+            retry_after = math.max(retry_after, (1 - bucket.tokens) / rate)
+        end
+        drawn[i] = bucket
+    end
+    if retry_after == 0 then
+        for i = 1, count do
+            drawn[i].tokens = drawn[i].tokens - 1
+        end
+    end
+    results[check] = tostring(retry_after)
+end
+for index, bucket in pairs(buckets) do
+    redis.call('HSET', KEYS[index], 'tokens', tostring(bucket.tokens), 'updated', tostring(now))
+    redis.call('PEXPIRE', KEYS[index], bucket.ttl)
+end
+return results
+"""
+
+
+class RedisRateLimitBackend:
+    """Buckets shared by all workers. Keys expire once full, so there is nothing to sweep.
+
+    Every call is one script run, however many checks and buckets it covers. Requires the
+    optional ``redis`` package and Redis 5 or newer.
+    """
+
+    remote = True
+
+    def __init__(self, url: str, key_prefix: str = "delay-api:ratelimit:"):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package") from exc
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKETS)
+        self.key_prefix = key_prefix
+
+    def acquire_many(self, checks: List[Check]) -> List[float]:
+        if not checks:
+            return []
+        keys: List[str] = []
+        indexes: Dict[str, int] = {}
+        args: list = [len(checks)]
+        for check in checks:
+            args.append(len(check))
+            for key, capacity, rate in check:
+                if key not in indexes:
+                    keys.append(self.key_prefix + key)
+                    indexes[key] = len(keys)
+                args += [indexes[key], capacity, rate]
+        return [float(retry_after) for retry_after in self._script(keys=keys, args=args)]
+
+    def acquire(self, key: str, capacity: float, rate: float) -> float:
+        return self.acquire_many([[(key, capacity, rate)]])[0]
+
+    def sweep(self, idle_seconds: float) -> int:
+        return 0
+
+    def __len__(self):
+        return sum(1 for _ in self._client.scan_iter(match=f"{self.key_prefix}*"))
+
+
+def create_backend():
+    if config.RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitBackend(config.RATE_LIMIT_REDIS_URL)
+    return LocalRateLimitBackend(config.RATE_LIMIT_MAX_BUCKETS)
+
+
+class RateLimiter:
+    """Token-bucket limits per action, keyed by client IP and by user id.
+
+    ``rules`` maps (action, "ip" | "user") to (count, seconds): bursts of up to ``count``
+    requests, refilled at ``count`` per ``seconds``.
+    """
+
+    def __init__(self, backend, rules: Dict[Tuple[str, str], Optional[Tuple[int, float]]], enabled: bool = True):
+        self.backend = backend
+        self.rules = {key: rule for key, rule in rules.items() if rule}
+        self.enabled = enabled
+
+    def idle_seconds(self) -> float:
+        # Longest refill period: after it any bucket is full again
+        return max((seconds for _, seconds in self.rules.values()), default=0.0)
+
+    def _buckets(self, action: str, ip: Optional[str], user_id: Optional[int]) -> Check:
+        buckets = []
+        for scope, key in (("user", user_id), ("ip", ip)):
+            rule = self.rules.get((action, scope))
+            if rule is not None and key is not None:
+                count, seconds = rule
+                buckets.append((f"{action}:{scope}:{key}", count, count / seconds))
+        return buckets
+
+    def check(self, action: str, ip: Optional[str], user_id: Optional[int]) -> float:
+        """Take a token from the user and the IP bucket; 0 if allowed, else seconds to wait.
+
+        Both are checked in one atomic step and charged only together, so a request the IP
+        limit rejects does not spend the user's token, nor the other way round.
+        """
+        return self.check_many(action, ip, [user_id])[0]
+
+    def check_many(self, action: str, ip: Optional[str], user_ids: List[Optional[int]]) -> List[float]:
+        # One check per item, e.g. per report of a batch, applied in order in a single backend call
+        if not self.enabled:
+            return [0.0] * len(user_ids)
+        return self.backend.acquire_many([self._buckets(action, ip, user_id) for user_id in user_ids])
+
+    async def check_async(self, action: str, ip: Optional[str], user_id: Optional[int]) -> float:
+        # The local backend is a dict lookup; only a network round trip is worth a thread hop
+        if self.backend.remote:
+            return await run_in_threadpool(self.check, action, ip, user_id)
+        return self.check(action, ip, user_id)
+
+    async def check_many_async(self, action: str, ip: Optional[str], user_ids: List[Optional[int]]) -> List[float]:
+        if self.backend.remote:
+            return await run_in_threadpool(self.check_many, action, ip, user_ids)
+        return self.check_many(action, ip, user_ids)
+
+    def sweep(self) -> dict:
+        return {"evicted": self.backend.sweep(self.idle_seconds()), "buckets": len(self.backend)}
+
+
+rate_limiter = RateLimiter(
+    create_backend(),
+    {
+        ("incidents", "user"): config.RATE_LIMIT_INCIDENTS_PER_USER,
+        ("incidents", "ip"): config.RATE_LIMIT_INCIDENTS_PER_IP,
+        ("incident_batches", "user"): config.RATE_LIMIT_BATCH_REPORTS_PER_USER,
+        ("incident_batches", "ip"): config.RATE_LIMIT_BATCH_REPORTS_PER_IP,
+        ("verifications", "user"): config.RATE_LIMIT_VERIFICATIONS_PER_USER,
+        ("verifications", "ip"): config.RATE_LIMIT_VERIFICATIONS_PER_IP,
+    },
+    enabled=config.RATE_LIMIT_ENABLED,
+)
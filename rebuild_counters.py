@@ -0,0 +1,32 @@
+import argparse
+import sys
+
+from database import SessionLocal, init_db
+from crud import check_incident_counters, rebuild_incident_counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check or rebuild the materialized active-incident counters")
+    parser.add_argument("--check", action="store_true", help="only report drift, do not rewrite the counters")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        mismatches = check_incident_counters(db)
+        for mismatch in mismatches:
+            print(f"{mismatch['scope']} {mismatch['id']}: stored={mismatch['stored']} expected={mismatch['expected']}")
+
+        if args.check:
+            print(f"{len(mismatches)} counter(s) out of sync")
+            return 1 if mismatches else 0
+
+        rebuild_incident_counters(db)
+        print(f"Rebuilt counters ({len(mismatches)} were out of sync)")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
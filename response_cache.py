@@ -0,0 +1,74 @@
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import config
+
+
+class ResponseCache:
+    """Serialized response bodies keyed by request, valid while their scopes' versions are unchanged.
+
+    Writes bump the version of every scope they affect (see crud's change hooks), so a
+    cached body is reused until the data behind it changes. Entries also expire after a
+    max age, which bounds staleness for writes handled by other worker processes.
+    """
+
+    def __init__(self, max_entries: int, max_age_seconds: float):
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._versions = Counter()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def bump(self, *scopes: str):
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] += 1
+
+    def versions(self, scopes: Iterable[str]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._versions[scope] for scope in scopes)
+
+    def get(self, key: str, versions: Tuple[int, ...]) -> Optional[Tuple[bytes, str, Dict[str, str]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_versions, stored_at, body, etag, headers = entry
+                if entry_versions == versions and time.monotonic() - stored_at <= self.max_age_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return body, etag, headers
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, versions: Tuple[int, ...], body: bytes, headers: Dict[str, str]) -> str:
+        etag = make_etag(body)
+        with self._lock:
+            self._entries[key] = (versions, time.monotonic(), body, etag, headers)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+def make_etag(body: bytes) -> str:
+    # Strong validator derived from the bytes, so it agrees across workers for identical bodies
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+response_cache = ResponseCache(config.RESPONSE_CACHE_MAX_ENTRIES, config.RESPONSE_CACHE_MAX_AGE_SECONDS)
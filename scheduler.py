@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    def __init__(self, name: str, interval_seconds: float, func: Callable[[], Optional[dict]], history: int = 20):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.func = func
+        self.runs = 0
+        self.failures = 0
+        self.totals = {}
+        self.history = deque(maxlen=history)
+
+    def run(self):
+        started_at = time.time()
+        started = time.perf_counter()
+        try:
+            result = self.func() or {}
+        except Exception:
+            self.failures += 1
+            logger.exception("Job %s failed", self.name)
+            result = {"error": True}
+        self.runs += 1
+        for key, value in result.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.totals[key] = self.totals.get(key, 0) + value
+        self.history.append({
+            "started_at": started_at,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            **result,
+        })
+        return result
+
+    def stats(self):
+        return {
+            "interval_seconds": self.interval_seconds,
+            "runs": self.runs,
+            "failures": self.failures,
+            "totals": self.totals,
+            "last_run": self.history[-1] if self.history else None,
+            "recent_runs": list(self.history),
+        }
+
+
+class Scheduler:
+    """Runs registered jobs periodically on the app's event loop.
+
+    Job bodies are blocking database work, so each run is offloaded to the thread pool.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self._tasks = []
+
+    def add_job(self, name: str, interval_seconds: float, func: Callable[[], Optional[dict]]):
+        self.jobs[name] = PeriodicJob(name, interval_seconds, func)
+
+    async def _loop(self, job: PeriodicJob):
+        while True:
+            await asyncio.sleep(job.interval_seconds)
+            await run_in_threadpool(job.run)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._loop(job)) for job in self.jobs.values()]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self):
+        return {name: job.stats() for name, job in self.jobs.items()}
+
+
+scheduler = Scheduler()
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
+import config
 
 
 class UserBase(BaseModel):
@@ -20,6 +21,20 @@ class UserResponse(UserBase):
         from_attributes = True
 
 
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    username: str
+    points: int
+
+
+class LeaderboardResponse(BaseModel):
+    total_users: int
+    # Set when the page is centered on ?around_user=
+    user: Optional[LeaderboardEntry] = None
+    entries: List[LeaderboardEntry]
+
+
 class RouteBase(BaseModel):
     route_number: str
     route_name: str
@@ -28,6 +43,7 @@ class RouteBase(BaseModel):
 
 class RouteResponse(RouteBase):
     id: int
+    gtfs_id: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -45,6 +61,7 @@ class StopBase(BaseModel):
 
 class StopResponse(StopBase):
     id: int
+    gtfs_id: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -65,6 +82,12 @@ class IncidentCreate(BaseModel):
     delay_minutes: Optional[int] = Field(None, ge=0, le=999)
 
 
+class IncidentBatchCreate(BaseModel):
+    # Items are IncidentCreate objects, validated one by one by the endpoint so a malformed
+    # report fails on its own in the results instead of rejecting the whole batch
+    incidents: List[Any] = Field(..., min_length=1, max_length=config.INCIDENT_BATCH_MAX_SIZE)
+
+
 class IncidentResponse(BaseModel):
     id: int
     title: str
@@ -85,12 +108,45 @@ class IncidentResponse(BaseModel):
         from_attributes = True
 
 
+class AffectingIncident(IncidentResponse):
+    # Stops between the incident and the requested stop along its route; None if route-wide
+    stops_away: Optional[int]
+
+
+class IncidentReportResponse(IncidentResponse):
+    # True when the report was merged into this existing incident as a verification
+    merged: bool = False
+
+
+class IncidentSearchResult(IncidentResponse):
+    # Higher is a better match
+    relevance: float
+
+
 class IncidentDetailResponse(IncidentResponse):
     route: RouteResponse
     stop: Optional[StopResponse]
     reporter: UserResponse
 
 
+class IncidentBatchItemResult(BaseModel):
+    index: int
+    status: str  # created, error
+    incident: Optional[IncidentResponse] = None
+    error: Optional[str] = None
+
+
+class IncidentBatchResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[IncidentBatchItemResult]
+
+
+class StopNearby(StopResponse):
+    distance_m: float
+    active_incidents: List[IncidentResponse]
+
+
 class VerificationCreate(BaseModel):
     incident_id: int
     user_id: int
@@ -110,6 +166,39 @@ class VerificationResponse(BaseModel):
         from_attributes = True
 
 
+class IncidentExpandedResponse(IncidentResponse):
+    # Related objects requested with ?expand=; omitted from the payload otherwise
+    route: Optional[RouteResponse] = None
+    stop: Optional[StopResponse] = None
+    reporter: Optional[UserResponse] = None
+    verifications: Optional[List[VerificationResponse]] = None
+
+
+class DelayStats(BaseModel):
+    incidents: int
+    delayed_incidents: int
+    mean_delay_minutes: Optional[float]
+    p50_delay_minutes: Optional[float]
+    p95_delay_minutes: Optional[float]
+    by_type: Dict[str, int]
+    by_severity: Dict[str, int]
+
+
+class DelayBucket(DelayStats):
+    bucket_start: datetime
+
+
+class DelayAnalyticsResponse(BaseModel):
+    route_id: Optional[int]
+    stop_id: Optional[int]
+    bucket: str
+    start: datetime
+    end: datetime
+    total: DelayStats
+    # Only buckets with at least one incident are listed
+    buckets: List[DelayBucket]
+
+
 class IncidentStats(BaseModel):
     total_incidents: int
     active_incidents: int
@@ -0,0 +1,76 @@
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, text
+
+# Title matches weigh more than description matches in the relevance score
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_TERM = re.compile(r"(\w+)(\*?)", re.UNICODE)
+
+# SQLite: external-content FTS5 table over incidents.title/description. Triggers keep it in
+# sync with every write path, including bulk inserts and archival deletes.
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS incidents_fts USING fts5("
+    "title, description, content='incidents', content_rowid='id', "
+    "tokenize='porter unicode61', prefix='2 3')",
+    f"INSERT INTO incidents_fts(incidents_fts, rank) VALUES('rank', 'bm25({TITLE_WEIGHT}, {DESCRIPTION_WEIGHT})')",
+    "CREATE TRIGGER IF NOT EXISTS incidents_fts_insert AFTER INSERT ON incidents BEGIN "
+    "INSERT INTO incidents_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS incidents_fts_delete AFTER DELETE ON incidents BEGIN "
+    "INSERT INTO incidents_fts(incidents_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); END",
+    # Only text changes touch the index; status and count updates leave it alone
+    "CREATE TRIGGER IF NOT EXISTS incidents_fts_update AFTER UPDATE OF title, description ON incidents BEGIN "
+    "INSERT INTO incidents_fts(incidents_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO incidents_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "INSERT INTO incidents_fts(incidents_fts) VALUES('rebuild')",
+]
+
+# Postgres: a stored generated tsvector with a GIN index, maintained by the database itself
+POSTGRES_DDL = [
+    "ALTER TABLE incidents ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_incidents_search_vector ON incidents USING gin (search_vector)",
+]
+
+# Query-side handle on the FTS5 table; kept out of Base.metadata so create_all never touches it
+incidents_fts = Table(
+    "incidents_fts", MetaData(),
+    Column("rowid", Integer),
+    Column("rank", Float),
+    Column("incidents_fts", String),
+)
+
+
+def create_search_index(conn):
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        statements = SQLITE_DDL
+    elif dialect == "postgresql":
+        statements = POSTGRES_DDL
+    else:
+        return
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def parse_query(q: str) -> List[Tuple[str, bool]]:
+    # (term, is_prefix) pairs; anything but word characters and a trailing * is ignored
+    return [(term, bool(star)) for term, star in _TERM.findall(q)]
+
+
+def fts5_match(terms: List[Tuple[str, bool]]) -> Optional[str]:
+    # Every term is quoted so user input can never be read as FTS5 syntax
+    if not terms:
+        return None
+    return " AND ".join(f'"{term}"*' if prefix else f'"{term}"' for term, prefix in terms)
+
+
+def tsquery(terms: List[Tuple[str, bool]]) -> Optional[str]:
+    if not terms:
+        return None
+    return " & ".join(f"{term}:*" if prefix else term for term, prefix in terms)
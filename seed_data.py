@@ -1,4 +1,8 @@
-from database import SessionLocal, User, Route, Stop, Incident, Verification, init_db
+from database import (
+    SessionLocal, User, Route, Stop, RouteStop, Incident, Verification, ArchivedIncident, ArchivedVerification,
+    RouteIncidentCounter, StopIncidentCounter, init_db
+)
+from crud import rebuild_incident_counters
 from datetime import datetime, timedelta
 import random
 
@@ -7,9 +11,14 @@ def seed_database():
     init_db()
     db = SessionLocal()
 
-    # Clear existing data
+    # Clear existing data, referencing tables first
+    db.query(RouteIncidentCounter).delete()
+    db.query(StopIncidentCounter).delete()
+    db.query(ArchivedVerification).delete()
+    db.query(ArchivedIncident).delete()
     db.query(Verification).delete()
     db.query(Incident).delete()
+    db.query(RouteStop).delete()
     db.query(Stop).delete()
     db.query(Route).delete()
     db.query(User).delete()
@@ -201,6 +210,9 @@ def seed_database():
 
     db.commit()
 
+    # Incidents were inserted directly, so derive the active-incident counters from them
+    rebuild_incident_counters(db)
+
     print("\n=== Database seeded successfully! ===")
     print(f"Users: {len(users)}")
     print(f"Routes: {len(routes)}")
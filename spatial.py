@@ -0,0 +1,82 @@
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_M / 180
+
+# ~1.1 km of latitude per cell; a typical "near me" radius touches a handful of cells
+DEFAULT_CELL_SIZE_DEG = 0.01
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class StopGridIndex:
+    """In-process uniform lat/lon grid over stop coordinates.
+
+    Lookups only visit the cells overlapping the query circle, so cost depends on
+    local stop density rather than on the total number of stops.
+    """
+
+    def __init__(self, cell_size_deg: float = DEFAULT_CELL_SIZE_DEG):
+        self.cell_size_deg = cell_size_deg
+        self._cells: Dict[Tuple[int, int], List[Tuple[int, float, float]]] = {}
+        self._stops: Dict[int, Tuple[float, float]] = {}
+        self.loaded = False
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_size_deg)), int(math.floor(lon / self.cell_size_deg))
+
+    def rebuild(self, stops: Iterable[Tuple[int, Optional[float], Optional[float]]]):
+        cells = defaultdict(list)
+        coords = {}
+        for stop_id, lat, lon in stops:
+            if lat is None or lon is None:
+                continue
+            cells[self._cell(lat, lon)].append((stop_id, lat, lon))
+            coords[stop_id] = (lat, lon)
+        # Swap in the new structures in one go so concurrent readers never see a half-built index
+        self._cells, self._stops = dict(cells), coords
+        self.loaded = True
+
+    def get(self, stop_id: int) -> Optional[Tuple[float, float]]:
+        return self._stops.get(stop_id)
+
+    def __len__(self):
+        return len(self._stops)
+
+    def query_radius(self, lat: float, lon: float, radius_m: float, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Return ``(stop_id, distance_m)`` pairs within ``radius_m``, nearest first."""
+        cells = self._cells
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        # Longitude degrees shrink towards the poles; clamp to avoid blowing up near them
+        dlon = dlat / max(math.cos(math.radians(lat)), 0.01)
+
+        min_row, min_col = self._cell(lat - dlat, lon - dlon)
+        max_row, max_col = self._cell(lat + dlat, lon + dlon)
+
+        results = []
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                for stop_id, stop_lat, stop_lon in cells.get((row, col), ()):
+                    # Cheap bounding-box rejection before the trigonometry
+                    if abs(stop_lat - lat) > dlat or abs(stop_lon - lon) > dlon:
+                        continue
+                    distance = haversine_m(lat, lon, stop_lat, stop_lon)
+                    if distance <= radius_m:
+                        results.append((stop_id, distance))
+
+        results.sort(key=lambda item: item[1])
+        if limit is not None:
+            results = results[:limit]
+        return results
+
+
+stop_index = StopGridIndex()
@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+
+def summarize(rows: Iterable[Tuple[str, str, str, int]]):
+    # Fold (incident_type, severity, status, count) groups into the /stats payload
+    total = active = resolved = 0
+    by_type = Counter()
+    by_severity = Counter()
+    for incident_type, severity, status, count in rows:
+        if not count:
+            continue
+        total += count
+        if status == "active":
+            active += count
+        elif status == "resolved":
+            resolved += count
+        by_type[incident_type] += count
+        by_severity[severity] += count
+
+    return {
+        "total_incidents": total,
+        "active_incidents": active,
+        "resolved_incidents": resolved,
+        "by_type": dict(sorted(by_type.items())),
+        "by_severity": dict(sorted(by_severity.items()))
+    }
+
+
+class StatsSnapshot:
+    """Incrementally maintained incident counts keyed by (type, severity, status)."""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+
+    def load(self, rows: Iterable[Tuple[str, str, str, int]]):
+        counts = Counter()
+        for incident_type, severity, status, count in rows:
+            counts[(incident_type, severity, status)] += count
+        with self._lock:
+            self._counts = counts
+            self.loaded_at = time.monotonic()
+
+    def is_stale(self, max_age_seconds: float) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > max_age_seconds
+
+    def record_created(self, incident_type: str, severity: str, status: str, count: int = 1):
+        if self.loaded_at is None:
+            return
+        with self._lock:
+            self._counts[(incident_type, severity, status)] += count
+
+    def record_status_change(self, incident_type: str, severity: str, old_status: str, new_status: str):
+        if self.loaded_at is None or old_status == new_status:
+            return
+        with self._lock:
+            self._counts[(incident_type, severity, old_status)] -= 1
+            self._counts[(incident_type, severity, new_status)] += 1
+
+    def record_removed(self, incident_type: str, severity: str, status: str, count: int = 1):
+        self.record_created(incident_type, severity, status, -count)
+
+    def rows(self):
+        with self._lock:
+            return [(*key, count) for key, count in self._counts.items()]
+
+    def to_stats(self):
+        return summarize(self.rows())
+
+
+stats_snapshot = StatsSnapshot()
+# Archived incidents only change when a batch is archived, so their groups are always served from memory
+archive_snapshot = StatsSnapshot()
@@ -0,0 +1,113 @@
+import os
+import tempfile
+
+# Settings are read when the app modules are imported, so they are fixed before the first import
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="delay-api-tests-"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATABASE_PATH}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.update({
+    "DB_MODE": "sync",
+    "RATE_LIMIT_ENABLED": "true",
+    "RATE_LIMIT_TRUST_FORWARDED": "false",
+    "AUTO_RESOLVE_ENABLED": "false",
+    "ARCHIVE_ENABLED": "false",
+    "DEDUP_ENABLED": "false",
+    "STATS_MODE": "snapshot",
+})
+
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+import crud
+import main
+from cache import route_cache, stop_cache, user_cache
+from database import Route, SessionLocal, Stop, engine
+from ratelimit import LocalRateLimitBackend, rate_limiter
+from response_cache import response_cache
+from schemas import IncidentCreate
+from stats import archive_snapshot, stats_snapshot
+
+
+@pytest.fixture(autouse=True)
+def fresh_database():
+    # Every test starts from an empty database file and in-memory state loaded from it
+    engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(DATABASE_PATH + suffix):
+            os.remove(DATABASE_PATH + suffix)
+    main.startup_event()
+    for cache in (route_cache, stop_cache, user_cache):
+        cache.clear()
+    response_cache.bump("incidents", "routes", "stops", "users", "stats", "analytics")
+    stats_snapshot.load([])
+    archive_snapshot.load([])
+    rate_limiter.backend = LocalRateLimitBackend(config.RATE_LIMIT_MAX_BUCKETS)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client():
+    # Not entered as a context manager, so the background jobs never start
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def network(db):
+    """Three users, two routes and four stops; returns their ids."""
+    # Users go through crud so the in-memory leaderboard knows them
+    users = [crud.create_user(db, f"user{i}") for i in range(3)]
+    routes = [Route(route_number=f"R{i}", route_name=f"Route {i}", transport_type="bus") for i in range(2)]
+    stops = [Stop(stop_name=f"Stop {i}", latitude=50.0 + i / 100, longitude=19.9) for i in range(4)]
+    db.add_all([*routes, *stops])
+    db.commit()
+    return {
+        "users": [user.id for user in users],
+        "routes": [route.id for route in routes],
+        "stops": [stop.id for stop in stops],
+    }
+
+
+def report(route_id: int, reporter_id: int, stop_id: int = None, title: str = "Bus running late", **fields):
+    return IncidentCreate(
+        title=title,
+        description=fields.pop("description", "Waiting at the stop for a while"),
+        incident_type=fields.pop("incident_type", "delay"),
+        severity=fields.pop("severity", "medium"),
+        route_id=route_id,
+        stop_id=stop_id,
+        reporter_id=reporter_id,
+        **fields
+    )
+
+
+def assert_consistent(db):
+    """Counters, verification tallies and both stats snapshots agree with the tables."""
+    from sqlalchemy import func
+
+    import crud
+    from database import ArchivedIncident, Incident, Verification
+    from stats import summarize
+
+    db.expire_all()
+    assert crud.check_incident_counters(db) == []
+    assert summarize(stats_snapshot.rows()) == summarize(crud._incident_stat_groups(db))
+    assert summarize(archive_snapshot.rows()) == summarize(crud._incident_stat_groups(db, ArchivedIncident))
+
+    tallies = dict(
+        ((incident_id, is_verified), count)
+        for incident_id, is_verified, count in db.query(
+            Verification.incident_id, Verification.is_verified, func.count()
+        ).group_by(Verification.incident_id, Verification.is_verified)
+    )
+    for incident in db.query(Incident):
+        assert incident.verification_count == tallies.get((incident.id, True), 0)
+        assert incident.dispute_count == tallies.get((incident.id, False), 0)
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import crud
+from conftest import assert_consistent, report
+from database import ArchivedIncident, ArchivedVerification, Incident, Verification
+from schemas import VerificationCreate
+from seed_data import seed_database
+from stats import archive_snapshot, stats_snapshot
+
+LATER = datetime.utcnow() + timedelta(days=60)
+
+
+def resolve(db, incident_ids):
+    for incident_id in incident_ids:
+        crud.update_incident_status(db, incident_id, "resolved")
+
+
+def test_archive_moves_incidents_with_their_verifications(client, db, network):
+    results = crud.create_incidents_batch(db, [report(network["routes"][0], network["users"][0]) for _ in range(5)])
+    ids = [incident.id for incident, _ in results]
+    for user_id in network["users"][1:]:
+        crud.create_verification(db, VerificationCreate(incident_id=ids[0], user_id=user_id, is_verified=True))
+    resolve(db, ids[:3])
+
+    assert crud.archive_resolved_incidents(db, 30, batch_size=2, now=LATER) == {"archived": 3, "batches": 2}
+
+    assert sorted(incident_id for incident_id, in db.query(Incident.id)) == ids[3:]
+    assert sorted(incident_id for incident_id, in db.query(ArchivedIncident.id)) == ids[:3]
+    assert db.query(Verification).count() == 0
+    assert db.query(ArchivedVerification).filter(ArchivedVerification.incident_id == ids[0]).count() == 2
+    assert_consistent(db)
+
+
+def test_recently_resolved_incidents_stay(client, db, network):
+    results = crud.create_incidents_batch(db, [report(network["routes"][0], network["users"][0]) for _ in range(2)])
+    resolve(db, [incident.id for incident, _ in results])
+
+    assert crud.archive_resolved_incidents(db, 30)["archived"] == 0
+
+
+def test_archived_incidents_in_lists_and_stats(client, db, network):
+    results = crud.create_incidents_batch(db, [report(network["routes"][0], network["users"][0]) for _ in range(4)])
+    ids = [incident.id for incident, _ in results]
+    resolve(db, ids[:2])
+    crud.archive_resolved_incidents(db, 30, now=LATER)
+
+    assert {row["id"] for row in client.get("/incidents").json()} == set(ids[2:])
+    assert {row["id"] for row in client.get("/incidents", params={"include_archived": True}).json()} == set(ids)
+    merged = client.get("/incidents", params={"include_archived": True, "limit": 3}).json()
+    assert [row["id"] for row in merged] == sorted(ids, reverse=True)[:3]
+
+    assert client.get("/stats").json()["total_incidents"] == 2
+    with_archive = client.get("/stats", params={"include_archived": True}).json()
+    assert (with_archive["total_incidents"], with_archive["resolved_incidents"]) == (4, 2)
+
+
+def test_ids_are_never_reused_after_archiving(client, db, network):
+    route, users = network["routes"][0], network["users"]
+    incident, _ = crud.create_incidents_batch(db, [report(route, users[0])])[0]
+    verification = crud.create_verification(
+        db, VerificationCreate(incident_id=incident.id, user_id=users[1], is_verified=True)
+    )
+    incident_id, verification_id = incident.id, verification.id
+    resolve(db, [incident_id])
+    crud.archive_resolved_incidents(db, 30, now=LATER)
+
+    # The archived rows were the newest, so a plain rowid would hand their ids out again
+    new_incident, _ = crud.create_incidents_batch(db, [report(route, users[0])])[0]
+    new_verification = crud.create_verification(
+        db, VerificationCreate(incident_id=new_incident.id, user_id=users[1], is_verified=True)
+    )
+    assert new_incident.id > incident_id
+    assert new_verification.id > verification_id
+
+    # So a second archive run cannot collide with the first
+    resolve(db, [new_incident.id])
+    assert crud.archive_resolved_incidents(db, 30, now=LATER)["archived"] == 1
+    assert db.query(ArchivedIncident).count() == 2
+    assert_consistent(db)
+
+
+def reload_snapshots(db):
+    # As startup does after the seed script has rewritten the tables
+    stats_snapshot.load(crud._incident_stat_groups(db))
+    archive_snapshot.load(crud._incident_stat_groups(db, ArchivedIncident))
+
+
+def test_reseeding_after_archive(db):
+    for _ in range(2):
+        seed_database()
+        db.expire_all()
+        reload_snapshots(db)
+        resolved = db.query(Incident).filter(Incident.status == "resolved").count()
+        assert db.query(ArchivedIncident).count() == 0
+
+        archived = crud.archive_resolved_incidents(db, 0, now=LATER)["archived"]
+
+        assert archived == resolved > 0
+        assert db.query(ArchivedIncident).count() == resolved
+        assert_consistent(db)
@@ -0,0 +1,108 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from conftest import assert_consistent, report
+from database import Incident, User, engine
+
+
+@contextmanager
+def count_statements(prefix):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(prefix):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def post_batch(client, reports):
+    response = client.post("/incidents/batch", json={"incidents": [item.model_dump() for item in reports]})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_large_batch_is_one_insert(client, db, network):
+    reports = [
+        report(network["routes"][i % 2], network["users"][i % 3], network["stops"][i % 4] if i % 3 else None,
+               title=f"Report number {i}")
+        for i in range(200)
+    ]
+
+    with count_statements("INSERT INTO INCIDENTS") as inserts:
+        body = post_batch(client, reports)
+
+    assert body["created"] == 200 and body["failed"] == 0
+    assert len(inserts) == 1
+    assert db.query(Incident).count() == 200
+    assert_consistent(db)
+
+
+def test_results_map_back_to_their_reports(client, db, network):
+    route, stop, user = network["routes"][0], network["stops"][1], network["users"][0]
+    reports = [
+        report(route, user, title="First with stop", stop_id=stop),
+        report(999, user, title="Unknown route"),
+        report(route, user, title="Second without stop"),
+        report(route, user, title="Unknown stop", stop_id=999),
+        report(route, 999, title="Unknown user"),
+        report(route, user, title="Third with stop", stop_id=stop),
+    ]
+
+    body = post_batch(client, reports)
+
+    assert body["created"] == 3 and body["failed"] == 3
+    results = body["results"]
+    assert [item["index"] for item in results] == list(range(6))
+    assert [item["error"] for item in results] == [
+        None, "Route not found", None, "Stop not found", "User not found", None
+    ]
+    for item, sent in zip(results, reports):
+        if item["status"] == "created":
+            assert (item["incident"]["title"], item["incident"]["stop_id"]) == (sent.title, sent.stop_id)
+            stored = db.get(Incident, item["incident"]["id"])
+            assert (stored.title, stored.stop_id) == (sent.title, sent.stop_id)
+    assert_consistent(db)
+
+
+def test_points_awarded_per_report(client, db, network):
+    users = network["users"]
+    post_batch(client, [report(network["routes"][0], users[i % 2]) for i in range(5)])
+
+    db.expire_all()
+    assert [db.get(User, user_id).points for user_id in users] == [30, 20, 0]
+    leaderboard = client.get("/users/leaderboard").json()
+    assert [entry["points"] for entry in leaderboard["entries"][:2]] == [30, 20]
+
+
+def test_batch_with_no_valid_reports_creates_nothing(client, db, network):
+    body = post_batch(client, [report(999, network["users"][0])])
+
+    assert body == {"created": 0, "failed": 1, "results": [
+        {"index": 0, "status": "error", "incident": None, "error": "Route not found"}
+    ]}
+    assert db.query(Incident).count() == 0
+
+
+def test_malformed_reports_fail_on_their_own(client, db, network):
+    good = report(network["routes"][0], network["users"][0]).model_dump()
+    reports = [good, {**good, "title": "Hi"}, "not a report", {**good, "severity": "extreme"}, good]
+
+    response = client.post("/incidents/batch", json={"incidents": reports})
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 3)
+    assert [item["status"] for item in body["results"]] == ["created", "error", "error", "error", "created"]
+    assert body["results"][1]["error"].startswith("Invalid report: title:")
+    assert body["results"][3]["error"].startswith("Invalid report: severity:")
+    assert db.query(Incident).count() == 2
+
+
+def test_batch_size_is_still_bounded(client):
+    assert client.post("/incidents/batch", json={"incidents": []}).status_code == 422
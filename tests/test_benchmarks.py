@@ -0,0 +1,30 @@
+import argparse
+import os
+import subprocess
+import sys
+
+import benchmarks.generator
+from benchmarks import workload
+
+
+def test_generator_does_not_import_the_app():
+    # config binds DATABASE_URL on first import, which must wait for the benchmark database
+    code = "import sys, benchmarks.generator, benchmarks.workload; print('config' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_database_url_is_set_before_generating(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///./delay_management.db")
+    seen = []
+    monkeypatch.setattr(
+        benchmarks.generator, "create_database", lambda url, **counts: seen.append((url, os.environ["DATABASE_URL"]))
+    )
+    parser = argparse.ArgumentParser()
+    workload.add_database_arguments(parser, incidents=100)
+
+    path = workload.use_database(parser.parse_args([]))
+    try:
+        assert seen == [(f"sqlite:///{path}", f"sqlite:///{path}")]
+    finally:
+        workload.remove_database(path, parser.parse_args([]))
@@ -0,0 +1,189 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import crud
+from conftest import assert_consistent, report
+from database import Incident
+from schemas import VerificationCreate
+
+
+def verify(client, incident_id, user_id, is_verified=True):
+    response = client.post("/verifications", json={
+        "incident_id": incident_id, "user_id": user_id, "is_verified": is_verified
+    })
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def create(client, route_id, reporter_id, stop_id=None, **fields):
+    response = client.post("/incidents", json=report(route_id, reporter_id, stop_id, **fields).model_dump())
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def active_count(client, path, key):
+    field = "active_incidents" if path == "/routes" else "nearby_incidents"
+    return {row["id"]: row[field] for row in client.get(path).json()}[key]
+
+
+def test_create_counts_towards_route_stop_and_stats(client, db, network):
+    route, stop = network["routes"][0], network["stops"][0]
+    create(client, route, network["users"][0], stop)
+    create(client, route, network["users"][1], title="Tram broken down", incident_type="breakdown")
+
+    assert active_count(client, "/routes", route) == 2
+    assert active_count(client, "/stops", stop) == 1
+    stats = client.get("/stats").json()
+    assert stats["total_incidents"] == 2
+    assert stats["by_type"] == {"breakdown": 1, "delay": 1}
+    assert_consistent(db)
+
+
+def test_three_verifications_flip_to_verified(client, db, network):
+    route, stop = network["routes"][0], network["stops"][0]
+    incident = create(client, route, network["users"][0], stop)
+    for user_id in network["users"]:
+        verify(client, incident["id"], user_id)
+
+    detail = client.get(f"/incidents/{incident['id']}").json()
+    assert detail["status"] == "verified"
+    assert detail["verification_count"] == 3
+    assert active_count(client, "/routes", route) == 0
+    assert active_count(client, "/stops", stop) == 0
+    assert client.get("/stats").json()["active_incidents"] == 0
+    assert_consistent(db)
+
+
+def test_three_disputes_flip_to_disputed(client, db, network):
+    route = network["routes"][0]
+    incident = create(client, route, network["users"][0])
+    for user_id in network["users"]:
+        verify(client, incident["id"], user_id, is_verified=False)
+
+    detail = client.get(f"/incidents/{incident['id']}").json()
+    assert detail["status"] == "disputed"
+    assert detail["dispute_count"] == 3
+    assert active_count(client, "/routes", route) == 0
+    assert_consistent(db)
+
+
+def test_repeat_verification_is_rejected_and_not_counted(client, db, network):
+    incident = create(client, network["routes"][0], network["users"][0])
+    verify(client, incident["id"], network["users"][1])
+    response = client.post("/verifications", json={
+        "incident_id": incident["id"], "user_id": network["users"][1], "is_verified": False
+    })
+
+    assert response.status_code == 400
+    assert client.get(f"/incidents/{incident['id']}").json()["verification_count"] == 1
+    assert_consistent(db)
+
+
+def test_manual_status_changes(client, db, network):
+    route, stop = network["routes"][0], network["stops"][0]
+    incident = create(client, route, network["users"][0], stop)
+
+    assert client.put(f"/incidents/{incident['id']}/status", params={"status": "resolved"}).status_code == 200
+    assert active_count(client, "/routes", route) == 0
+    assert client.get("/stats").json()["resolved_incidents"] == 1
+    assert_consistent(db)
+
+    # Reopening counts it again
+    assert client.put(f"/incidents/{incident['id']}/status", params={"status": "active"}).status_code == 200
+    assert active_count(client, "/stops", stop) == 1
+    assert_consistent(db)
+
+
+def test_auto_resolve(client, db, network):
+    route, stop = network["routes"][0], network["stops"][0]
+    old = create(client, route, network["users"][0], stop)
+    verified = create(client, route, network["users"][1], title="Tram broken down", incident_type="breakdown")
+    for user_id in network["users"]:
+        verify(client, verified["id"], user_id)
+    fresh = create(client, route, network["users"][2], stop, title="Crowded platform", incident_type="crowding")
+    db.query(Incident).filter(Incident.id.in_([old["id"], verified["id"]])).update(
+        {Incident.reported_at: datetime.utcnow() - timedelta(hours=5)}, synchronize_session=False
+    )
+    db.commit()
+
+    result = crud.auto_resolve_stale_incidents(db, {"*": 2}, batch_size=1)
+
+    assert result == {"resolved": 2, "batches": 2}
+    statuses = dict(db.query(Incident.id, Incident.status))
+    assert statuses == {old["id"]: "resolved", verified["id"]: "resolved", fresh["id"]: "active"}
+    assert active_count(client, "/routes", route) == 1
+    assert_consistent(db)
+
+
+def test_batch_then_verifications(client, db, network):
+    route, stop = network["routes"][1], network["stops"][2]
+    reports = [report(route, network["users"][i % 3], stop if i % 2 else None).model_dump() for i in range(10)]
+    assert client.post("/incidents/batch", json={"incidents": reports}).json()["created"] == 10
+    first = db.query(Incident.id).order_by(Incident.id).first()[0]
+    for user_id in network["users"]:
+        crud.create_verification(db, VerificationCreate(incident_id=first, user_id=user_id, is_verified=True))
+
+    assert active_count(client, "/routes", route) == 9
+    assert active_count(client, "/stops", stop) == 5
+    assert_consistent(db)
+
+
+def test_concurrent_status_changes_apply_one_delta(db, network, monkeypatch):
+    from database import SessionLocal
+
+    route = network["routes"][0]
+    incident, _ = crud.create_incident(db, report(route, network["users"][0]))
+    other = SessionLocal()
+    read = other.get
+    raced = []
+
+    def get_then_race(*args, **kwargs):
+        # The other session has read "active"; resolve the incident before it writes
+        found = read(*args, **kwargs)
+        if not raced:
+            raced.append(crud.update_incident_status(db, incident.id, "resolved").status)
+        return found
+
+    monkeypatch.setattr(other, "get", get_then_race)
+    try:
+        updated = crud.update_incident_status(other, incident.id, "verified")
+    finally:
+        other.close()
+
+    assert raced == ["resolved"]
+    assert updated.status == "verified"
+    assert_consistent(db)
+
+
+def test_overlapping_auto_resolve_runs_apply_one_delta(db, network, monkeypatch):
+    from database import SessionLocal
+
+    route, stop = network["routes"][0], network["stops"][0]
+    results = crud.create_incidents_batch(db, [report(route, network["users"][0], stop) for _ in range(4)])
+    ids = [incident.id for incident, _ in results]
+    db.query(Incident).update({Incident.reported_at: datetime.utcnow() - timedelta(hours=5)})
+    db.commit()
+
+    other = SessionLocal()
+    scalars = other.scalars
+    raced = []
+
+    def select_then_race(*args, **kwargs):
+        # The other worker has picked its batch; this one resolves it and verifies one first
+        found = scalars(*args, **kwargs)
+        if raced:
+            return found
+        rows = found.all()
+        crud.update_incident_status(db, ids[0], "verified")
+        raced.append(crud.auto_resolve_stale_incidents(db, {"*": 2}, batch_size=2))
+        return SimpleNamespace(all=lambda: rows)
+
+    monkeypatch.setattr(other, "scalars", select_then_race)
+    try:
+        late = crud.auto_resolve_stale_incidents(other, {"*": 2})
+    finally:
+        other.close()
+
+    assert raced == [{"resolved": 4, "batches": 2}]
+    assert late["resolved"] == 0
+    assert_consistent(db)
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+import crud
+from conftest import report
+from database import Incident, Route, Stop
+from pagination import NEXT_CURSOR_HEADER
+
+
+def walk(client, path, **params):
+    """Follow X-Next-Cursor to the end; returns the pages' ids."""
+    pages = []
+    cursor = None
+    while True:
+        response = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        pages.append([row["id"] for row in response.json()])
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+
+
+def test_incident_cursor_breaks_ties_on_id(client, db, network):
+    results = crud.create_incidents_batch(db, [
+        report(network["routes"][i % 2], network["users"][0]) for i in range(23)
+    ])
+    ids = [incident.id for incident, _ in results]
+    # Groups of identical timestamps straddle the page boundaries
+    base = datetime(2026, 1, 1, 8)
+    for position, incident_id in enumerate(ids):
+        db.query(Incident).filter(Incident.id == incident_id).update(
+            {Incident.reported_at: base + timedelta(minutes=position // 4)}
+        )
+    db.commit()
+
+    pages = walk(client, "/incidents", limit=5)
+
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    expected = sorted(ids, key=lambda incident_id: (ids.index(incident_id) // 4, incident_id), reverse=True)
+    assert [incident_id for page in pages for incident_id in page] == expected
+
+
+def test_incident_cursor_with_status_filter(client, db, network):
+    results = crud.create_incidents_batch(db, [report(network["routes"][0], network["users"][0]) for _ in range(7)])
+    resolved = {incident.id for incident, _ in results[::2]}
+    for incident_id in resolved:
+        crud.update_incident_status(db, incident_id, "resolved")
+
+    pages = walk(client, "/incidents", limit=2, status="resolved")
+
+    assert sorted(incident_id for page in pages for incident_id in page) == sorted(resolved)
+
+
+def test_exact_multiple_ends_with_empty_page(client, db, network):
+    crud.create_incidents_batch(db, [report(network["routes"][0], network["users"][0]) for _ in range(4)])
+
+    assert [len(page) for page in walk(client, "/incidents", limit=2)] == [2, 2, 0]
+
+
+def test_route_and_stop_cursors(client, db):
+    db.add_all([Route(route_number=f"N{i}", route_name=f"Night {i}", transport_type="bus") for i in range(12)])
+    db.add_all([Stop(stop_name=f"Stop {i}", latitude=50.0, longitude=20.0 + i / 1000) for i in range(9)])
+    db.commit()
+
+    for path, model in (("/routes", Route), ("/stops", Stop)):
+        pages = walk(client, path, limit=5)
+        seen = [row_id for page in pages for row_id in page]
+        assert seen == sorted(row_id for row_id, in db.query(model.id))
+
+
+def test_cursor_survives_inserts_between_pages(client, db, network):
+    crud.create_incidents_batch(db, [report(network["routes"][0], network["users"][0]) for _ in range(6)])
+    first = client.get("/incidents", params={"limit": 3})
+    crud.create_incidents_batch(db, [report(network["routes"][0], network["users"][1]) for _ in range(2)])
+
+    second = client.get("/incidents", params={"limit": 3, "cursor": first.headers[NEXT_CURSOR_HEADER]})
+
+    first_ids = [row["id"] for row in first.json()]
+    assert [row["id"] for row in second.json()] == [min(first_ids) - 1 - i for i in range(3)]
+
+
+def test_invalid_cursor(client):
+    assert client.get("/incidents", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/routes", params={"cursor": "WyJ4Il0"}).status_code == 400
+
+
+def test_search_cursor(client, db, network):
+    # Equal titles give equal ranks, so the pages also depend on the id tie-break
+    crud.create_incidents_batch(db, [
+        report(network["routes"][0], network["users"][0], title="Tram stuck at the depot") for _ in range(7)
+    ])
+
+    pages = walk(client, "/incidents/search", q="tram", limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sorted(row_id for page in pages for row_id in page) == [row_id for row_id, in db.query(Incident.id)]
@@ -0,0 +1,144 @@
+import pytest
+
+import ratelimit
+from conftest import report
+from ratelimit import LocalRateLimitBackend, RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_allows_burst_then_refills(clock):
+    backend = LocalRateLimitBackend()
+    assert [backend.acquire("k", 3, 0.5) for _ in range(3)] == [0, 0, 0]
+    assert backend.acquire("k", 3, 0.5) == pytest.approx(2.0)
+
+    clock.now += 2
+    assert backend.acquire("k", 3, 0.5) == 0
+    assert backend.acquire("k", 3, 0.5) > 0
+
+
+def test_bucket_count_is_bounded(clock):
+    backend = LocalRateLimitBackend(max_buckets=2)
+    for key in ("a", "b", "c"):
+        backend.acquire(key, 1, 1)
+
+    assert len(backend) == 2
+    # "a" was evicted, so it starts from a full bucket again
+    assert backend.acquire("a", 1, 1) == 0
+    assert backend.acquire("c", 1, 1) > 0
+
+
+def test_sweep_evicts_only_idle_buckets(clock):
+    backend = LocalRateLimitBackend()
+    backend.acquire("old", 1, 1)
+    clock.now += 100
+    backend.acquire("new", 1, 1)
+
+    assert backend.sweep(idle_seconds=50) == 1
+    assert len(backend) == 1
+
+
+def test_user_over_limit_does_not_drain_ip(clock):
+    limiter = RateLimiter(LocalRateLimitBackend(), {("a", "user"): (2, 60), ("a", "ip"): (5, 60)})
+    assert [limiter.check("a", "10.0.0.1", 1) for _ in range(2)] == [0, 0]
+    assert all(limiter.check("a", "10.0.0.1", 1) for _ in range(10))
+
+    # Only the two allowed requests were charged to the shared IP, leaving three of its five
+    assert [limiter.check("a", "10.0.0.1", 2) for _ in range(2)] == [0, 0]
+    assert limiter.check("a", "10.0.0.1", 3) == 0
+    assert limiter.check("a", "10.0.0.1", 3) > 0
+
+
+def test_ip_rejection_does_not_spend_the_user_token(clock):
+    limiter = RateLimiter(LocalRateLimitBackend(), {("a", "user"): (2, 60), ("a", "ip"): (1, 60)})
+    assert limiter.check("a", "10.0.0.1", 1) == 0
+    assert limiter.check("a", "10.0.0.1", 1) > 0
+
+    # From another address the user still has their second token
+    assert limiter.check("a", "10.0.0.2", 1) == 0
+    assert limiter.check("a", "10.0.0.3", 1) > 0
+
+
+def test_check_many_is_one_backend_call(clock):
+    backend = LocalRateLimitBackend()
+    calls = []
+    acquire_many = backend.acquire_many
+    backend.acquire_many = lambda checks: calls.append(len(checks)) or acquire_many(checks)
+    limiter = RateLimiter(backend, {("a", "user"): (2, 60), ("a", "ip"): (3, 60)})
+
+    assert limiter.check_many("a", "10.0.0.1", [1, 1, 1, 2, 2]) == [0, 0, pytest.approx(30), 0, pytest.approx(20)]
+    assert calls == [5]
+
+
+def test_redis_backend_sends_a_batch_as_one_script_call():
+    backend = ratelimit.RedisRateLimitBackend.__new__(ratelimit.RedisRateLimitBackend)
+    backend.key_prefix = "p:"
+    calls = []
+    backend._script = lambda keys, args: calls.append((keys, args)) or ["0", "1.5"]
+    limiter = RateLimiter(backend, {("a", "user"): (2, 60), ("a", "ip"): (3, 60)})
+
+    assert limiter.check_many("a", "10.0.0.1", [1, 2]) == [0, 1.5]
+    assert calls == [(
+        ["p:a:user:1", "p:a:ip:10.0.0.1", "p:a:user:2"],
+        [2, 2, 1, 2, 1 / 30, 2, 3, 1 / 20, 2, 3, 2, 1 / 30, 2, 3, 1 / 20],
+    )]
+
+
+def test_disabled_limiter_allows_everything(clock):
+    limiter = RateLimiter(LocalRateLimitBackend(), {("a", "user"): (1, 60)}, enabled=False)
+    assert [limiter.check("a", None, 1) for _ in range(3)] == [0, 0, 0]
+
+
+def test_api_returns_429_with_retry_after(client, network):
+    payload = report(network["routes"][0], network["users"][0]).model_dump()
+    statuses = [client.post("/incidents", json=payload).status_code for _ in range(6)]
+
+    assert statuses == [201] * 5 + [429]
+    response = client.post("/incidents", json=payload)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    # Another user on the same address is unaffected
+    other = report(network["routes"][0], network["users"][1]).model_dump()
+    assert client.post("/incidents", json=other).status_code == 201
+
+
+def test_batch_has_its_own_budget(client, network):
+    route, user = network["routes"][0], network["users"][0]
+    for _ in range(5):
+        client.post("/incidents", json=report(route, user).model_dump())
+    assert client.post("/incidents", json=report(route, user).model_dump()).status_code == 429
+
+    reports = [report(route, user).model_dump() for _ in range(100)]
+    for _ in range(2):
+        body = client.post("/incidents/batch", json={"incidents": reports}).json()
+        assert body["created"] == 100
+
+
+def test_batch_limits_reports_individually(client, network, monkeypatch):
+    monkeypatch.setitem(ratelimit.rate_limiter.rules, ("incident_batches", "user"), (3, 300))
+    route, users = network["routes"][0], network["users"]
+    reports = [report(route, users[0]).model_dump() for _ in range(5)]
+    reports.insert(2, report(route, users[1]).model_dump())
+
+    body = client.post("/incidents/batch", json={"incidents": reports}).json()
+
+    assert [item["status"] for item in body["results"]] == ["created"] * 4 + ["error"] * 2
+    assert body["results"][-1]["error"].startswith("Rate limit exceeded")
+
+    # A batch with nothing left to accept is rejected as a whole
+    response = client.post("/incidents/batch", json={"incidents": reports[:1]})
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
@@ -0,0 +1,97 @@
+import zipfile
+
+import pytest
+
+import crud
+import gtfs_import
+from conftest import report
+from database import Route, Stop
+
+
+def write_feed(path, files):
+    with zipfile.ZipFile(path, "w") as feed:
+        for name, rows in files.items():
+            feed.writestr(name, "\n".join(",".join(row) for row in rows) + "\n")
+    return str(path)
+
+
+@pytest.fixture
+def two_way_route(tmp_path, db):
+    # Route L runs A-B-C-D and back; direction 1 has one extra short-working trip
+    stops = [("A", "50.00"), ("B", "50.01"), ("C", "50.02"), ("D", "50.03")]
+    stop_times = [("trip_id", "arrival_time", "departure_time", "stop_id", "stop_sequence")]
+    for trip_id, order in (("out", "ABCD"), ("back", "DCBA"), ("short", "DC")):
+        stop_times += [(trip_id, "08:00:00", "08:00:00", stop, str(i + 1)) for i, stop in enumerate(order)]
+    path = write_feed(tmp_path / "feed.zip", {
+        "routes.txt": [("route_id", "route_short_name", "route_long_name", "route_type"), ("L", "7", "Line 7", "3")],
+        "stops.txt": [("stop_id", "stop_name", "stop_lat", "stop_lon")] + [
+            (stop, f"Stop {stop}", latitude, "19.9") for stop, latitude in stops
+        ],
+        "trips.txt": [("route_id", "service_id", "trip_id", "direction_id"),
+                      ("L", "wk", "out", "0"), ("L", "wk", "back", "1"), ("L", "wk", "short", "1")],
+        "stop_times.txt": stop_times,
+    })
+    gtfs_import.import_feed(db, path)
+    route_id = db.query(Route.id).filter(Route.gtfs_id == "L").scalar()
+    return route_id, {gtfs_id: stop_id for stop_id, gtfs_id in db.query(Stop.id, Stop.gtfs_id)}
+
+
+def test_route_stops_follow_each_direction(client, two_way_route):
+    route_id, stops = two_way_route
+
+    def names(direction_id):
+        response = client.get(f"/routes/{route_id}/stops", params={"direction_id": direction_id})
+        return [stop["gtfs_id"] for stop in response.json()]
+
+    assert names(0) == ["A", "B", "C", "D"]
+    assert names(1) == ["D", "C", "B", "A"]
+    assert [stop["gtfs_id"] for stop in client.get(f"/routes/{route_id}/stops").json()] == ["A", "B", "C", "D"]
+
+
+def test_incident_affects_stops_in_both_directions(client, db, two_way_route):
+    route_id, stops = two_way_route
+    user = crud.create_user(db, "rider")
+    incident, _ = crud.create_incident(db, report(route_id, user.id, stops["C"]))
+
+    distances = {}
+    for name, stop_id in stops.items():
+        rows = client.get(f"/stops/{stop_id}/affecting-incidents").json()
+        distances[name] = [(row["id"], row["stops_away"]) for row in rows]
+
+    # Upstream of C: A and B travelling 0, D travelling 1
+    assert distances == {
+        "A": [(incident.id, 2)], "B": [(incident.id, 1)], "C": [(incident.id, 0)], "D": [(incident.id, 1)]
+    }
+
+
+def test_route_list_includes_gtfs_id(client, two_way_route):
+    route_id, _ = two_way_route
+    routes = {route["id"]: route for route in client.get("/routes").json()}
+    assert routes[route_id]["gtfs_id"] == "L"
+
+
+def test_expanded_lists_see_reference_changes(client, db, network):
+    route_id, stop_id = network["routes"][0], network["stops"][0]
+    crud.create_incident(db, report(route_id, network["users"][0], stop_id))
+    before = client.get("/incidents", params={"expand": "route,stop"}).json()[0]
+
+    db.get(Route, route_id).route_name = "Renamed"
+    db.get(Stop, stop_id).stop_name = "Renamed stop"
+    db.commit()
+    crud.invalidate_reference_caches()
+
+    after = client.get("/incidents", params={"expand": "route,stop"}).json()[0]
+    assert (before["route"]["route_name"], after["route"]["route_name"]) == ("Route 0", "Renamed")
+    assert after["stop"]["stop_name"] == "Renamed stop"
+
+
+def test_stop_index_refresh_picks_up_imported_stops(client, db):
+    import main
+
+    db.add(Stop(stop_name="Imported elsewhere", latitude=50.06, longitude=19.94, gtfs_id="X"))
+    db.commit()
+    params = {"lat": 50.06, "lon": 19.94, "radius_m": 100}
+    assert client.get("/stops/nearby", params=params).json() == []
+
+    assert main._stop_index_refresh_job() == {"stops": 1}
+    assert [stop["gtfs_id"] for stop in client.get("/stops/nearby", params=params).json()] == ["X"]
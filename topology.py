@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+
+class RouteTopology:
+    """Ordered stops per route and direction plus the open incidents on each route, held in memory.
+
+    affecting(stop_id) walks only the routes serving that stop and the open incidents on
+    them, so it never touches the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # route_id -> one {stop_id: position} per direction of travel
+        self._patterns: Dict[int, Tuple[Dict[int, int], ...]] = {}
+        self._stop_routes: Dict[int, Tuple[int, ...]] = {}  # stop_id -> route_ids serving it
+        self._route_incidents: Dict[int, Dict[int, Optional[int]]] = defaultdict(dict)  # route_id -> {incident_id: stop_id}
+        self._stop_incidents: Dict[int, Set[int]] = defaultdict(set)  # stop_id -> incident_ids reported there
+        self._incidents: Dict[int, Tuple[int, Optional[int]]] = {}  # incident_id -> (route_id, stop_id)
+        self.loaded_at: Optional[float] = None
+
+    def load(self, route_stops: Iterable[Tuple[int, int, int, int]],
+             incidents: Iterable[Tuple[int, int, Optional[int]]]):
+        # route_stops: (route_id, direction_id, stop_id, stop_sequence); incidents: open (incident_id, route_id, stop_id)
+        ordered = defaultdict(list)
+        for route_id, direction_id, stop_id, sequence in route_stops:
+            ordered[route_id, direction_id or 0].append((sequence or 0, stop_id))
+        patterns = defaultdict(list)
+        stop_routes = defaultdict(set)
+        for (route_id, _), stops in sorted(ordered.items()):
+            stops.sort()
+            patterns[route_id].append({stop_id: position for position, (_, stop_id) in enumerate(stops)})
+            for _, stop_id in stops:
+                stop_routes[stop_id].add(route_id)
+
+        with self._lock:
+            self._patterns = {route_id: tuple(directions) for route_id, directions in patterns.items()}
+            self._stop_routes = {stop_id: tuple(sorted(routes)) for stop_id, routes in stop_routes.items()}
+            self._route_incidents = defaultdict(dict)
+            self._stop_incidents = defaultdict(set)
+            self._incidents = {}
+            for incident_id, route_id, stop_id in incidents:
+                self._add(incident_id, route_id, stop_id)
+            self.loaded_at = time.monotonic()
+
+    def _add(self, incident_id: int, route_id: int, stop_id: Optional[int]):
+        self._incidents[incident_id] = (route_id, stop_id)
+        self._route_incidents[route_id][incident_id] = stop_id
+        if stop_id is not None:
+            self._stop_incidents[stop_id].add(incident_id)
+
+    def add_incident(self, incident_id: int, route_id: int, stop_id: Optional[int]):
+        if self.loaded_at is None:
+            return
+        with self._lock:
+            self._add(incident_id, route_id, stop_id)
+
+    def remove_incident(self, incident_id: int):
+        with self._lock:
+            location = self._incidents.pop(incident_id, None)
+            if location is None:
+                return
+            route_id, stop_id = location
+            self._route_incidents[route_id].pop(incident_id, None)
+            if stop_id is not None:
+                self._stop_incidents[stop_id].discard(incident_id)
+
+    def affecting(self, stop_id: int) -> Dict[int, Optional[int]]:
+        """Open incidents affecting ``stop_id``, mapped to how many stops upstream they are.
+
+        An incident counts if it is at the stop itself, or on a route serving the stop at or
+        before it in some direction of travel; the distance is the shortest over directions.
+        Route-wide incidents (no stop, or a stop the route does not list) map to None.
+        """
+        with self._lock:
+            result = {incident_id: 0 for incident_id in self._stop_incidents.get(stop_id, ())}
+            for route_id in self._stop_routes.get(stop_id, ()):
+                patterns = self._patterns[route_id]
+                for incident_id, incident_stop_id in self._route_incidents.get(route_id, {}).items():
+                    if result.get(incident_id) == 0:
+                        continue
+                    on_route = False
+                    distances = []
+                    for positions in patterns:
+                        position = positions.get(incident_stop_id) if incident_stop_id is not None else None
+                        if position is None:
+                            continue
+                        on_route = True
+                        target = positions.get(stop_id)
+                        if target is not None and position <= target:
+                            distances.append(target - position)
+                    if not on_route:
+                        result.setdefault(incident_id, None)
+                    elif distances:
+                        distance = min(distances)
+                        current = result.get(incident_id)
+                        if current is None or distance < current:
+                            result[incident_id] = distance
+            return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "routes": len(self._patterns),
+                "stops": len(self._stop_routes),
+                "open_incidents": len(self._incidents),
+            }
+
+
+route_topology = RouteTopology()